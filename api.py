@@ -4,46 +4,169 @@ from datetime import timedelta
 
 from dotenv import load_dotenv
 from flask import Flask
-from flask_jwt_extended import JWTManager
 from flask_restful import Api
 
+from helpers.aggregate_helper import check_aggregates_command, rebuild_aggregates_command
+from helpers.cache_helper import response_cache
+from helpers.change_helper import change_log
+from helpers.compression_helper import response_compression
+from helpers.counter_helper import reconcile_counts_command
+from helpers.job_helper import job_runner
+from helpers.json_helper import output_json
+from helpers.jwt_helper import CachingJWTManager
+from helpers.metrics_helper import request_metrics
+from helpers.password_helper import password_hasher
+from helpers.replica_helper import replica_router
+from helpers.single_flight_helper import single_flight
+from helpers.sqlite_helper import apply_sqlite_pragmas
+from migrations import upgrade
 from models import db
 from resources.author_books import AuthorBooks
-from resources.authors import AuthorsList, Author
-from resources.books import BooksList, Book
+from resources.authors import AuthorsBulk, AuthorsExport, AuthorsList, Author
+from resources.batch import Batch
+from resources.books import BooksBulk, BooksExport, BooksList, Book
+from resources.cache import CacheStats
+from resources.jobs import AuthorsBulkJob, BooksBulkJob, Job, JobsList
 from resources.users import UserSignUp, UserLogin
 
 
 def init_app():
     app = Flask(__name__)
     api = Api(app, prefix="/api")
+    api.representations['application/json'] = output_json
 
     env = os.environ.get('FLASK_ENV', 'dev')
     env_file = f'{os.path.dirname(os.path.abspath(__file__))}/.env.{env}'
     load_dotenv(env_file)
 
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URI')
+    app.config['SQLITE_PRAGMAS'] = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'cache_size': os.environ.get('SQLITE_CACHE_SIZE', '-20000'),
+        'mmap_size': os.environ.get('SQLITE_MMAP_SIZE', '268435456'),
+        'busy_timeout': os.environ.get('SQLITE_BUSY_TIMEOUT', '5000'),
+    }
+    app.config['REPLICA_DATABASE_URIS'] = [uri for uri in os.environ.get('REPLICA_DATABASE_URIS', '').split(',') if uri]
+    app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+    app.config['REPLICA_RETRY_SECONDS'] = int(os.environ.get('REPLICA_RETRY_SECONDS', 30))
+    app.config['ASYNC_DATABASE_URI'] = os.environ.get('ASYNC_DATABASE_URI')
+    app.config['ASYNC_POOL_SIZE'] = int(os.environ.get('ASYNC_POOL_SIZE', 20))
+    app.config['ASYNC_THREADS'] = int(os.environ.get('ASYNC_THREADS', 8))
+    app.config['SERVER_WORKERS'] = int(os.environ.get('SERVER_WORKERS', os.cpu_count() or 1))
+    app.config['SERVER_MAX_REQUESTS'] = int(os.environ.get('SERVER_MAX_REQUESTS', 0))
+    app.config['SERVER_MAX_REQUESTS_JITTER'] = int(os.environ.get('SERVER_MAX_REQUESTS_JITTER', 0))
+    app.config['SERVER_GRACEFUL_TIMEOUT_SECONDS'] = int(os.environ.get('SERVER_GRACEFUL_TIMEOUT_SECONDS', 30))
+    app.config['SHARED_CACHE_PATH'] = os.environ.get('SHARED_CACHE_PATH', '')
     db.init_app(app)
 
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY')
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=int(os.environ.get('JWT_ACCESS_TOKEN_EXPIRES_MINUTES')))
-    jwt = JWTManager(app)
+    app.config['JWT_VERIFIED_TOKEN_CACHE_SIZE'] = int(os.environ.get('JWT_VERIFIED_TOKEN_CACHE_SIZE', 10000))
+    jwt = CachingJWTManager(app)
+
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+    app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 32))
+    app.config['PASSWORD_HASH_TIMEOUT_SECONDS'] = int(os.environ.get('PASSWORD_HASH_TIMEOUT_SECONDS', 30))
+    password_hasher.init_app(app)
+
+    app.config['RESPONSE_CACHE_ENABLED'] = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE', 1024))
+    app.config['RESPONSE_CACHE_TTL_SECONDS'] = int(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', 300))
+    response_cache.init_app(app)
+    app.config['SINGLE_FLIGHT_ENABLED'] = os.environ.get('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+    app.config['SINGLE_FLIGHT_TIMEOUT_SECONDS'] = float(os.environ.get('SINGLE_FLIGHT_TIMEOUT_SECONDS', 5))
+    single_flight.init_app(app)
+
+    app.config['BULK_IMPORT_BATCH_SIZE'] = int(os.environ.get('BULK_IMPORT_BATCH_SIZE', 1000))
+    app.config['EXPORT_CHUNK_SIZE'] = int(os.environ.get('EXPORT_CHUNK_SIZE', 1000))
+    app.config['BATCH_MAX_IDS'] = int(os.environ.get('BATCH_MAX_IDS', 100))
+    app.config['BATCH_MAX_REQUESTS'] = int(os.environ.get('BATCH_MAX_REQUESTS', 20))
+    app.config['CHANGE_FEED_SETTLE_SECONDS'] = float(os.environ.get('CHANGE_FEED_SETTLE_SECONDS', 1))
+    change_log.init_app(app)
+    app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+    app.config['JOB_CHUNK_SIZE'] = int(os.environ.get('JOB_CHUNK_SIZE', 1000))
+    app.config['JOB_POLL_SECONDS'] = float(os.environ.get('JOB_POLL_SECONDS', 1))
+    app.config['JOB_LEASE_SECONDS'] = int(os.environ.get('JOB_LEASE_SECONDS', 60))
+    app.config['AUTHOR_DELETE_MAX_SYNC_BOOKS'] = int(os.environ.get('AUTHOR_DELETE_MAX_SYNC_BOOKS', 1000))
+
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    app.config['METRICS_SAMPLE_RATE'] = float(os.environ.get('METRICS_SAMPLE_RATE', 1.0))
+    app.config['METRICS_FLUSH_SECONDS'] = float(os.environ.get('METRICS_FLUSH_SECONDS', 1))
+    request_metrics.init_app(app)
+    request_metrics.add_collector(cache_metrics)
+    request_metrics.add_collector(single_flight_metrics)
+    request_metrics.add_collector(compression_metrics)
+    request_metrics.add_collector(job_metrics)
+
+    app.config['COMPRESSION_ENABLED'] = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    app.config['COMPRESSION_MIN_SIZE'] = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    app.config['COMPRESSION_LEVEL'] = int(os.environ.get('COMPRESSION_LEVEL', 6))
+    app.config['COMPRESSION_ZSTD_LEVEL'] = int(os.environ.get('COMPRESSION_ZSTD_LEVEL', 3))
+    app.config['COMPRESSION_CPU_BUDGET'] = float(os.environ.get('COMPRESSION_CPU_BUDGET', 1.0))
+    response_compression.init_app(app)
 
     with app.app_context():
-        db.create_all()
+        apply_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+        upgrade(db.engine)
+    replica_router.init_app(app)
+    job_runner.init_app(app)
+    app.cli.add_command(reconcile_counts_command)
+    app.cli.add_command(rebuild_aggregates_command)
+    app.cli.add_command(check_aggregates_command)
 
     api.add_resource(UserSignUp, '/signup')
     api.add_resource(UserLogin, '/login')
     api.add_resource(BooksList, '/books')
+    api.add_resource(BooksBulk, '/books/bulk')
+    api.add_resource(BooksExport, '/books/export')
     api.add_resource(Book, '/books/<id>')
     api.add_resource(AuthorsList, '/authors')
+    api.add_resource(AuthorsBulk, '/authors/bulk')
+    api.add_resource(AuthorsExport, '/authors/export')
     api.add_resource(Author, '/authors/<id>')
     api.add_resource(AuthorBooks, '/authors/<id>/books')
+    api.add_resource(Batch, '/batch')
+    api.add_resource(JobsList, '/jobs')
+    api.add_resource(Job, '/jobs/<id>')
+    api.add_resource(BooksBulkJob, '/books/bulk/jobs')
+    api.add_resource(AuthorsBulkJob, '/authors/bulk/jobs')
+    api.add_resource(CacheStats, '/cache/stats')
 
     return app
 
 
+def cache_metrics():
+    stats = response_cache.get_stats()
+    return [('response_cache_{}_total'.format(name), 'counter', 'Response cache {}.'.format(name.replace('_', ' ')),
+             stats[name]) for name in ('hits', 'misses', 'not_modified', 'invalidations')]
+
+
+def single_flight_metrics():
+    stats = single_flight.get_stats()
+    return [('single_flight_{}_total'.format(name), 'counter', 'Single-flight read {}.'.format(name), stats[name])
+            for name in ('leaders', 'coalesced', 'timeouts', 'errors')]
+
+
+def compression_metrics():
+    stats = response_compression.get_stats()
+    return [('response_compression_{}_total'.format(name), 'counter',
+             'Response compression {}.'.format(name.replace('_', ' ')), stats[name])
+            for name in ('responses', 'bytes_in', 'bytes_out', 'cpu_seconds', 'over_budget')]
+
+
+def job_metrics():
+    stats = job_runner.get_stats()
+    return [('jobs_{}_total'.format(name), 'counter', 'Background jobs {}.'.format(name), stats[name])
+            for name in ('enqueued', 'succeeded', 'failed', 'released')] + [
+        ('job_chunks_total', 'counter', 'Background job chunks committed.', stats['chunks'])]
+
+
 if __name__ == '__main__':
     os.environ['FLASK_ENV'] = 'dev'
     app = init_app()
+    # The reloader serves from a child process; only that one runs background jobs.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        job_runner.start()
     app.run(debug=True)
@@ -0,0 +1,238 @@
+"""ASGI entry point serving the same API with async database access.
+
+    uvicorn --factory asgi:create_app --port 5000
+
+Every request runs the regular Flask resources, schemas and JWT settings.
+Database-bound requests run inside ``AsyncSession.run_sync`` on the event
+loop: ``db.session`` is pointed at the async session's sync facade, so each
+statement is awaited through aiosqlite and the loop serves other clients
+while SQLite works. Thousands of idle or slow connections then cost a
+coroutine each instead of a thread.
+
+Endpoints that block on something other than the database (password
+hashing) or stream large bodies (bulk import, export) run on a small thread
+pool with the regular sync engine instead. Their ``wsgi.input`` receives the
+request body from the client as they read it, so a bulk import holds one
+batch in memory rather than the whole upload; other requests are small and
+get their body read up front.
+"""
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from werkzeug.exceptions import ClientDisconnected, HTTPException
+
+from api import init_app
+from helpers.job_helper import job_runner
+from helpers.metrics_helper import request_metrics
+from helpers.sqlite_helper import apply_sqlite_pragmas
+from models import db
+
+THREAD_ENDPOINTS = {'usersignup', 'userlogin', 'booksbulk', 'authorsbulk', 'booksbulkjob', 'authorsbulkjob',
+                    'booksexport', 'authorsexport'}
+
+
+class AsgiApp:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        config = flask_app.config
+        # aiosqlite defaults to NullPool, which would open a connection and thread per request.
+        self.engine = create_async_engine(async_database_url(flask_app), poolclass=AsyncAdaptedQueuePool,
+                                          pool_size=config['ASYNC_POOL_SIZE'], max_overflow=config['ASYNC_POOL_SIZE'])
+        apply_sqlite_pragmas(self.engine.sync_engine, config['SQLITE_PRAGMAS'])
+        if request_metrics.enabled:
+            request_metrics.instrument_engine(self.engine.sync_engine)
+        self.executor = ThreadPoolExecutor(config['ASYNC_THREADS'], thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return None
+
+        if self.endpoint(scope) in THREAD_ENDPOINTS:
+            return await self.call_in_thread(scope, receive, send)
+
+        environ = build_environ(scope, await read_body(receive))
+        messages = []
+        async with AsyncSession(self.engine) as session:
+            await session.run_sync(self.call_with_session, environ, messages.append)
+        for message in messages:
+            await send(message)
+
+    def endpoint(self, scope):
+        try:
+            endpoint, _ = self.flask_app.url_map.bind('').match(scope['path'], method=scope['method'])
+        except HTTPException:
+            return None
+        return endpoint
+
+    def call_with_session(self, session, environ, emit):
+        with self.flask_app.app_context():
+            db.session.registry.set(session)
+            call_wsgi(self.flask_app.wsgi_app, environ, emit)
+
+    async def call_in_thread(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        environ = build_environ(scope, io.BufferedReader(ReceiveStream(receive, loop)))
+        # A small queue makes a streaming response wait for the client instead of buffering.
+        queue = asyncio.Queue(maxsize=4)
+
+        def emit(message):
+            asyncio.run_coroutine_threadsafe(queue.put(message), loop).result()
+
+        def run():
+            try:
+                call_wsgi(self.flask_app.wsgi_app, environ, emit)
+            finally:
+                emit(None)
+
+        future = loop.run_in_executor(self.executor, run)
+        while True:
+            message = await queue.get()
+            if message is None:
+                break
+            await send(message)
+        await future
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                job_runner.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # Running jobs commit their current chunk and go back to the queue.
+                await asyncio.get_running_loop().run_in_executor(self.executor, job_runner.stop)
+                await self.engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def async_database_url(flask_app):
+    """``ASYNC_DATABASE_URI``, or the app's database through aiosqlite."""
+    if flask_app.config['ASYNC_DATABASE_URI']:
+        return flask_app.config['ASYNC_DATABASE_URI']
+    with flask_app.app_context():
+        # The engine's URL, so relative SQLite paths resolve against the instance folder as usual.
+        return db.engine.url.set(drivername='sqlite+aiosqlite')
+
+
+class ReceiveStream(io.RawIOBase):
+    """The body of an ASGI request as a blocking stream, for an app running on a thread off ``loop``."""
+
+    def __init__(self, receive, loop):
+        self.receive = receive
+        self.loop = loop
+        self.pending = memoryview(b'')
+        self.more_body = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending and self.more_body:
+            message = asyncio.run_coroutine_threadsafe(self.receive(), self.loop).result()
+            if message['type'] == 'http.disconnect':
+                raise ClientDisconnected()
+            self.pending = memoryview(message.get('body', b''))
+            self.more_body = message.get('more_body', False)
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+def build_environ(scope, body):
+    """WSGI environ for ``scope``; ``body`` is the whole request body, or a stream that reads it as it arrives."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if isinstance(body, bytes):
+        environ['CONTENT_LENGTH'] = str(len(body))
+        environ['wsgi.input'] = io.BytesIO(body)
+    else:
+        environ['wsgi.input'] = body
+        # The stream ends with the body, so it may be read without a Content-Length (chunked uploads).
+        environ['wsgi.input_terminated'] = True
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'CONTENT_LENGTH':
+            environ.setdefault('CONTENT_LENGTH', value)
+        else:
+            key = 'HTTP_' + name
+            environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+def call_wsgi(wsgi_app, environ, emit):
+    """Run ``wsgi_app`` and pass the response to ``emit`` as ASGI messages."""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+    def emit_start():
+        # Middleware may call start_response only once the body is being iterated.
+        if not started.get('sent'):
+            emit({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+            started['sent'] = True
+
+    iterable = wsgi_app(environ, start_response)
+    try:
+        for chunk in iterable:
+            if chunk:
+                emit_start()
+                emit({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        emit_start()
+        emit({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+
+
+def create_app():
+    return AsgiApp(init_app())
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    os.environ['FLASK_ENV'] = 'dev'
+    uvicorn.run(create_app(), port=5000)
@@ -0,0 +1,127 @@
+"""Sync (threaded WSGI) vs async (ASGI + aiosqlite) serving under many slow clients.
+
+Each client opens its own connection, sends the request headers in two
+parts with a pause in between, like a client on a slow network, and reads
+the response. The threaded server pins a thread per such connection while
+the ASGI server only keeps a coroutine per connection.
+
+    python -m benchmarks.bench_async --concurrency 100,1000 --slow-ms 200
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+
+from benchmarks.common import BackgroundServer, auth_headers, summarize
+from benchmarks.seed import seed
+
+PATHS = ('/api/books/{book}', '/api/authors/{author}/books?per_page=10', '/api/books?ids={book},{book2}')
+
+
+class UvicornServer:
+    """Serve an ASGI app with uvicorn from a thread, like ``BackgroundServer`` does for WSGI."""
+
+    def __init__(self, asgi_app, host='127.0.0.1', port=8765):
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(asgi_app, host=host, port=port, log_level='warning',
+                                                   backlog=4096, lifespan='on'))
+        self.url = 'http://{}:{}'.format(host, port)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+async def slow_request(host, port, path, authorization, slow_seconds):
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write('GET {} HTTP/1.1\r\nHost: {}:{}\r\n'.format(path, host, port).encode())
+        await writer.drain()
+        await asyncio.sleep(slow_seconds)
+        writer.write('Authorization: {}\r\nConnection: close\r\n\r\n'.format(authorization).encode())
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    status = int(response.split(b' ', 2)[1]) if response else 0
+    return status, (time.perf_counter() - started) * 1000
+
+
+async def drive(url, authorization, volumes, concurrency, requests, slow_seconds, seed_value=0):
+    host, port = url.rsplit('//', 1)[1].split(':')
+    rng = random.Random(seed_value)
+    paths = [rng.choice(PATHS).format(book=rng.randrange(volumes['books']) + 1,
+                                      book2=rng.randrange(volumes['books']) + 1,
+                                      author=rng.randrange(volumes['authors']) + 1) for _ in range(requests)]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(path):
+        async with semaphore:
+            try:
+                return await slow_request(host, int(port), path, authorization, slow_seconds)
+            except OSError:
+                return 0, 0.0
+
+    peak_threads = threading.active_count()
+
+    async def sample_threads():
+        nonlocal peak_threads
+        while True:
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.05)
+
+    sampler = asyncio.ensure_future(sample_threads())
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(path) for path in paths))
+    elapsed = time.perf_counter() - started
+    sampler.cancel()
+    statuses = [status for status, _ in results]
+    return {
+        **summarize([latency for status, latency in results if status]),
+        'throughput_rps': round(len(results) / elapsed, 1),
+        'peak_threads': peak_threads,
+        'statuses': {str(status): statuses.count(status) for status in sorted(set(statuses))},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default='bench_async.db')
+    parser.add_argument('--authors', type=int, default=1000)
+    parser.add_argument('--books', type=int, default=100000)
+    parser.add_argument('--concurrency', default='100,1000')
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--slow-ms', type=int, default=200)
+    args = parser.parse_args()
+
+    from asgi import AsgiApp
+    from helpers.cache_helper import response_cache
+
+    app, _ = seed(args.database, args.authors, args.books, 1)
+    # Every request should reach the database, not the response cache.
+    response_cache.enabled = False
+    authorization = auth_headers(app)['Authorization']
+    volumes = {'authors': args.authors, 'books': args.books}
+    servers = (('sync', lambda: BackgroundServer(app)), ('async', lambda: UvicornServer(AsgiApp(app))))
+
+    for concurrency in [int(value) for value in args.concurrency.split(',')]:
+        for name, server_factory in servers:
+            with server_factory() as server:
+                result = asyncio.run(drive(server.url, authorization, volumes, concurrency, args.requests,
+                                           args.slow_ms / 1000))
+            print(json.dumps({'server': name, 'concurrency': concurrency, 'slow_ms': args.slow_ms, **result}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Bytes saved against CPU cost of response compression, per endpoint and encoding.
+
+Fetches each endpoint uncompressed, then reports for every encoding and
+level the compressed size, the share of bytes saved, the time spent
+compressing the body and the end-to-end latency of the compressed request.
+
+    python -m benchmarks.bench_compression [per_page] [database path]
+"""
+import json
+import os
+import sys
+
+from benchmarks.common import auth_headers, create_app, measure, seed_authors, seed_books
+
+ENDPOINTS = ('/api/books?per_page={per_page}', '/api/authors?per_page={per_page}',
+             '/api/authors/1/books?per_page={per_page}', '/api/books/1',
+             '/api/books/export', '/api/books/export?format=csv')
+LEVELS = {'gzip': (1, 6, 9), 'deflate': (6,), 'zstd': (1, 3, 9)}
+
+
+def main():
+    per_page = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    database_path = sys.argv[2] if len(sys.argv) > 2 else 'bench_compression.db'
+    if os.path.exists(database_path):
+        os.remove(database_path)
+
+    app = create_app(database_path)
+    headers = auth_headers(app)
+    client = app.test_client()
+    from helpers.compression_helper import CpuBudget, make_compressor, response_compression
+    from models import db
+
+    with app.app_context():
+        seed_authors(db, 10)
+        seed_books(db, per_page * 10, 10)
+    response_compression.min_size = 0
+    response_compression.budget = CpuBudget(0)
+
+    for endpoint in ENDPOINTS:
+        url = endpoint.format(per_page=per_page)
+        body = client.get(url, headers=headers).data
+
+        def get_identity():
+            client.get(url, headers=headers)
+        print(json.dumps({'endpoint': url, 'encoding': 'identity', 'bytes': len(body),
+                          'request_ms': measure(get_identity, repeat=20)}))
+
+        for encoding in response_compression.encodings:
+            for level in LEVELS[encoding]:
+                def compress():
+                    compressor = make_compressor(encoding, level)
+                    return compressor.compress(body) + compressor.finish()
+
+                def get_compressed():
+                    response = client.get(url, headers={**headers, 'Accept-Encoding': encoding})
+                    assert response.headers.get('Content-Encoding') == encoding, response.headers
+
+                setattr(response_compression, 'zstd_level' if encoding == 'zstd' else 'level', level)
+                size = len(compress())
+                cost = measure(compress, repeat=20)
+                print(json.dumps({
+                    'endpoint': url, 'encoding': encoding, 'level': level, 'bytes': size,
+                    'saved_pct': round(100 * (1 - size / len(body)), 1),
+                    'compress_ms': cost,
+                    'compress_mb_per_s': round(len(body) / 1e6 / (cost['p50_ms'] / 1000), 1),
+                    'request_ms': measure(get_compressed, repeat=20),
+                }))
+
+
+if __name__ == '__main__':
+    main()
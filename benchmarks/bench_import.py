@@ -0,0 +1,81 @@
+"""Bulk import throughput and memory.
+
+Streams a generated NDJSON body of N books (1M by default) into
+``POST /api/books/bulk`` without ever holding it in memory and reports
+rows per second and the peak RSS of the process.
+
+    python -m benchmarks.bench_import [rows] [database path]
+"""
+import io
+import json
+import os
+import resource
+import sys
+import time
+
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+from benchmarks.common import auth_headers, create_app, seed_authors
+
+
+class NDJSONStream(io.RawIOBase):
+    def __init__(self, rows, author_count):
+        self.lines = (json.dumps({
+            'title': 'Imported book {}'.format(i),
+            'isbn': '979{:010d}'.format(i),
+            'publication_date': '2001-01-01',
+            'author_id': i % author_count + 1,
+        }).encode() + b'\n' for i in range(rows))
+        self.buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while len(self.buffer) < len(target):
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line
+        size = min(len(target), len(self.buffer))
+        target[:size], self.buffer = self.buffer[:size], self.buffer[size:]
+        return size
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    database_path = sys.argv[2] if len(sys.argv) > 2 else 'bench_import.db'
+    if os.path.exists(database_path):
+        os.remove(database_path)
+
+    app = create_app(database_path)
+    headers = auth_headers(app)
+    author_count = 1000
+    from models import db
+    with app.app_context():
+        seed_authors(db, author_count)
+
+    # The test client wants a seekable body, so build the environ by hand to
+    # feed the generated stream without a Content-Length.
+    environ = EnvironBuilder('/api/books/bulk', method='POST', headers=headers,
+                             content_type='application/x-ndjson').get_environ()
+    environ['wsgi.input'] = io.BufferedReader(NDJSONStream(rows, author_count))
+    environ['wsgi.input_terminated'] = True
+
+    started = time.perf_counter()
+    app_iter, status, _ = run_wsgi_app(app, environ)
+    result = json.loads(b''.join(app_iter))
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        'rows': rows,
+        'status': status,
+        'inserted': result['inserted'],
+        'failed': result['failed'],
+        'seconds': round(elapsed, 2),
+        'rows_per_second': round(rows / elapsed),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }))
+
+
+if __name__ == '__main__':
+    main()
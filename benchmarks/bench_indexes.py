@@ -0,0 +1,61 @@
+"""Author-books and ISBN lookup latency before and after the v001 indexes.
+
+Seeds a database, drops the author_id and isbn indexes to get the baseline
+schema, times both queries, then re-applies the migration and times them again.
+
+    python -m benchmarks.bench_indexes [books] [database path]
+"""
+import json
+import os
+import sys
+
+from sqlalchemy import text
+
+from benchmarks.common import create_app, measure, seed_authors, seed_books
+
+AUTHOR_BOOKS = "SELECT id, title, isbn, publication_date FROM books WHERE author_id = :author_id ORDER BY id LIMIT 10"
+BY_ISBN = "SELECT id, title, isbn, publication_date, author_id FROM books WHERE isbn = :isbn"
+
+
+def run_queries(connection, book_count, author_count):
+    counter = iter(range(10 ** 9))
+
+    def author_books():
+        connection.execute(text(AUTHOR_BOOKS), {'author_id': next(counter) % author_count + 1}).all()
+
+    def by_isbn():
+        connection.execute(text(BY_ISBN), {'isbn': '978{:010d}'.format(next(counter) * 7919 % book_count)}).all()
+
+    return {'author_books': measure(author_books, repeat=200), 'by_isbn': measure(by_isbn, repeat=200)}
+
+
+def main():
+    book_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    database_path = sys.argv[2] if len(sys.argv) > 2 else 'bench_indexes.db'
+    if os.path.exists(database_path):
+        os.remove(database_path)
+
+    app = create_app(database_path)
+    author_count = max(1, book_count // 100)
+    from migrations import v001_indexes_and_search
+    from models import db
+    with app.app_context():
+        seed_authors(db, author_count)
+        seed_books(db, book_count, author_count)
+
+        with db.engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_books_author_id"))
+            connection.execute(text("DROP INDEX ix_books_isbn"))
+            connection.execute(text("ANALYZE"))
+            before = run_queries(connection, book_count, author_count)
+
+        with db.engine.begin() as connection:
+            v001_indexes_and_search.upgrade(connection)
+            connection.execute(text("ANALYZE"))
+            after = run_queries(connection, book_count, author_count)
+
+    print(json.dumps({'books': book_count, 'before': before, 'after': after}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
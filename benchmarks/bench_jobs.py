@@ -0,0 +1,92 @@
+"""Deleting an author with many books inside a request against as a background job.
+
+Seeds two authors with about ``--books`` books each and, with the response
+cache off, keeps ``--readers`` clients reading books while each author is
+deleted: the first with ``DELETE /api/authors/<id>``, which detaches every
+book in one transaction, the second with a ``delete_author`` job, which does
+it ``JOB_CHUNK_SIZE`` books per transaction. Reports the latency of the
+write request, the time until the author is gone and the reader latencies
+meanwhile.
+
+    python -m benchmarks.bench_jobs --books 100000 --readers 8
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+from benchmarks.common import BackgroundServer, auth_headers, http_request, summarize
+from benchmarks.seed import seed
+
+
+class Readers:
+    """Clients reading random books until stopped."""
+
+    def __init__(self, url, headers, count, books):
+        self.url = url
+        self.headers = headers
+        self.books = books
+        self.latencies = []
+        self._stop = threading.Event()
+        self._threads = [threading.Thread(target=self._read, args=(random.Random(i),)) for i in range(count)]
+
+    def __enter__(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _read(self, rng):
+        while not self._stop.is_set():
+            _, latency, _ = http_request('{}/api/books/{}'.format(self.url, rng.randrange(self.books) + 1),
+                                         headers=self.headers)
+            self.latencies.append(latency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default='bench_jobs.db')
+    parser.add_argument('--books', type=int, default=100000, help='books per author')
+    parser.add_argument('--readers', type=int, default=8)
+    args = parser.parse_args()
+
+    app, _ = seed(args.database, 2, args.books * 2, 1)
+    headers = auth_headers(app)
+    from helpers.cache_helper import response_cache
+    from helpers.job_helper import job_runner
+    response_cache.enabled = False
+    job_runner.start()
+
+    with BackgroundServer(app) as server:
+        with Readers(server.url, headers, args.readers, args.books * 2) as readers:
+            started = time.perf_counter()
+            status, latency, _ = http_request(server.url + '/api/authors/1', 'DELETE', headers=headers)
+            elapsed = time.perf_counter() - started
+        print(json.dumps({'case': 'request', 'status': status, 'write_ms': round(latency, 1),
+                          'completed_s': round(elapsed, 2), 'reads': summarize(readers.latencies)}))
+
+        before = job_runner.get_stats()
+        with Readers(server.url, headers, args.readers, args.books * 2) as readers:
+            started = time.perf_counter()
+            status, latency, _ = http_request(server.url + '/api/jobs', 'POST', headers=headers,
+                                              body={'kind': 'delete_author', 'params': {'author_id': 2}})
+            while status == 202:
+                stats = job_runner.get_stats()
+                if stats['succeeded'] + stats['failed'] > before['succeeded'] + before['failed']:
+                    break
+                time.sleep(0.01)
+            elapsed = time.perf_counter() - started
+        stats = job_runner.get_stats()
+        print(json.dumps({'case': 'job', 'status': status, 'write_ms': round(latency, 1),
+                          'completed_s': round(elapsed, 2), 'failed': stats['failed'] - before['failed'],
+                          'chunks': stats['chunks'] - before['chunks'], 'reads': summarize(readers.latencies)}))
+    job_runner.stop()
+
+
+if __name__ == '__main__':
+    main()
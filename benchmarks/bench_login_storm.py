@@ -0,0 +1,76 @@
+"""Catalog GET latency during a burst of logins.
+
+Runs the app on a threaded HTTP server, measures ``GET /api/books`` alone,
+then again while ``login_clients`` threads hammer ``POST /api/login``. Runs
+once with inline hashing (``PASSWORD_HASH_WORKERS=0``) and once with the
+process pool, and prints p50/p95/p99 of the catalog reads for each.
+
+    python -m benchmarks.bench_login_storm [workers] [login clients] [database path]
+"""
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import BackgroundServer, auth_headers, create_app, http_request, seed_authors, seed_books, \
+    summarize
+
+READS = 300
+READ_CLIENTS = 4
+
+
+def catalog_latencies(server, headers):
+    with ThreadPoolExecutor(READ_CLIENTS) as pool:
+        results = list(pool.map(lambda _: http_request(server.url + '/api/books', headers=headers), range(READS)))
+    return summarize([latency for _, latency, _ in results])
+
+
+def run(workers, login_clients, database_path):
+    os.environ['PASSWORD_HASH_WORKERS'] = str(workers)
+    if os.path.exists(database_path):
+        os.remove(database_path)
+    app = create_app(database_path)
+    headers = auth_headers(app)
+    from models import db
+    with app.app_context():
+        seed_authors(db, 100)
+        seed_books(db, 1000, 100)
+
+    credentials = {'username': 'storm', 'password': 'stormpassword'}
+    with BackgroundServer(app) as server:
+        http_request(server.url + '/api/signup', 'POST', credentials)
+        idle = catalog_latencies(server, headers)
+
+        stop = threading.Event()
+        statuses = []
+
+        def login_loop():
+            while not stop.is_set():
+                statuses.append(http_request(server.url + '/api/login', 'POST', credentials)[0])
+
+        storm = [threading.Thread(target=login_loop) for _ in range(login_clients)]
+        for thread in storm:
+            thread.start()
+        during_storm = catalog_latencies(server, headers)
+        stop.set()
+        for thread in storm:
+            thread.join()
+
+    return {
+        'hash_workers': workers,
+        'idle': idle,
+        'during_login_storm': during_storm,
+        'logins': {str(status): statuses.count(status) for status in set(statuses)},
+    }
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else max(1, (os.cpu_count() or 2) // 2)
+    login_clients = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    database_path = sys.argv[3] if len(sys.argv) > 3 else 'bench_login_storm.db'
+    print(json.dumps([run(0, login_clients, database_path), run(workers, login_clients, database_path)], indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Per-request cost of parsing query arguments and loading request bodies.
+
+Compares, in microseconds per request, ``reqparse`` with the parser rebuilt
+on every request (as resources used to), ``reqparse`` with a shared parser
+and the compiled ``ArgsContract`` on a list GET query string, then
+marshmallow (forced by passing ``unknown``) with the compiled loader on book
+POST and PATCH bodies. Book POST bodies are loaded with and without the
+author check, the one database round trip left in loading them.
+
+    python -m benchmarks.bench_parsing [iterations] [database path]
+"""
+import json
+import os
+import sys
+import timeit
+
+from benchmarks.common import create_app, seed_authors
+
+QUERY = '/api/books?page=2&per_page=50&sort=-title&envelope=true&count=exact'
+BOOK = {'title': 'Book', 'isbn': '9780000000001', 'publication_date': '2020-03-03', 'author_id': 1}
+
+
+def per_call_us(fn, number):
+    samples = timeit.repeat(fn, number=number, repeat=15)
+    return {'best_us': round(min(samples) / number * 1e6, 2),
+            'median_us': round(sorted(samples)[len(samples) // 2] / number * 1e6, 2)}
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    database_path = sys.argv[2] if len(sys.argv) > 2 else 'bench_parsing.db'
+    if os.path.exists(database_path):
+        os.remove(database_path)
+
+    app = create_app(database_path)
+    from marshmallow import RAISE
+    from helpers.contract_helper import ArgsContract
+    from models import db
+    from resources.base_resource import list_parser
+    from schemas.book import book_import_schema, book_patch_schema, book_schema
+
+    contract = ArgsContract(list_parser)
+    with app.test_request_context(QUERY):
+        seed_authors(db, 1)
+        cases = (
+            ('list GET', 'reqparse, parser per request', lambda: list_parser.copy().parse_args()),
+            ('list GET', 'reqparse, shared parser', list_parser.parse_args),
+            ('list GET', 'compiled contract', contract.parse_args),
+            ('book POST', 'marshmallow', lambda: book_schema.load(BOOK, unknown=RAISE)),
+            ('book POST', 'compiled loader', lambda: book_schema.load(BOOK)),
+            ('book POST fields only', 'marshmallow', lambda: book_import_schema.load(BOOK, unknown=RAISE)),
+            ('book POST fields only', 'compiled loader', lambda: book_import_schema.load(BOOK)),
+            ('book PATCH', 'marshmallow', lambda: book_patch_schema.load({'title': 'New title'}, unknown=RAISE)),
+            ('book PATCH', 'compiled loader', lambda: book_patch_schema.load({'title': 'New title'})),
+        )
+        for request, path, fn in cases:
+            print(json.dumps({'request': request, 'path': path, **per_call_us(fn, number)}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Search latency as the catalog grows.
+
+Seeds the catalog in steps (10k, 100k, 1M books by default) and times
+``GET /api/books?q=...`` at each size. With the FTS5 index the latency
+depends on the number of matching rows, not on the table size, so the
+queries use words that stay selective as the catalog grows.
+
+    python -m benchmarks.bench_search [sizes] [database path]
+"""
+import json
+import os
+import sys
+
+from benchmarks.common import auth_headers, create_app, measure, seed_authors, seed_books
+
+QUERIES = ('kalomi', 'river rusati', 'vozebo', '9780000012345')
+
+
+def main():
+    sizes = [int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else '10000,100000,1000000').split(',')]
+    database_path = sys.argv[2] if len(sys.argv) > 2 else 'bench_search.db'
+    if os.path.exists(database_path):
+        os.remove(database_path)
+
+    app = create_app(database_path)
+    headers = auth_headers(app)
+    client = app.test_client()
+    from models import db
+
+    author_count = 10000
+    seeded = 0
+    results = []
+    with app.app_context():
+        seed_authors(db, author_count)
+    for size in sizes:
+        with app.app_context():
+            seed_books(db, size - seeded, author_count, start=seeded)
+        seeded = size
+        for q in QUERIES:
+            def search():
+                response = client.get('/api/books', query_string={'q': q, 'per_page': 20}, headers=headers)
+                assert response.status_code == 200, response.data
+            results.append({'books': size, 'q': q, **measure(search, repeat=30)})
+            print(json.dumps(results[-1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Dump + encode throughput of one list page of per_page=1000.
+
+Compares the marshmallow path (ORM instances, ``schema.dump``, stdlib
+``json``) with the compiled row serializer and orjson used by the list
+endpoints, for each list schema, and times ``GET /api/books?per_page=1000``
+end to end.
+
+    python -m benchmarks.bench_serialize [per_page] [database path]
+"""
+import json
+import os
+import sys
+
+from benchmarks.common import auth_headers, create_app, measure, seed_authors, seed_books
+
+
+def main():
+    per_page = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    database_path = sys.argv[2] if len(sys.argv) > 2 else 'bench_serialize.db'
+    if os.path.exists(database_path):
+        os.remove(database_path)
+
+    app = create_app(database_path)
+    headers = auth_headers(app)
+    client = app.test_client()
+    from helpers.json_helper import encode_json
+    from helpers.loading_helper import get_load_options
+    from helpers.serializer_helper import get_row_serializer
+    from models import Author, Book, db
+    from schemas.author import authors_schema
+    from schemas.book import book_list_schema, books_schema
+
+    with app.app_context():
+        seed_authors(db, per_page)
+        seed_books(db, per_page, per_page)
+
+        for name, model, schema in (('books', Book, books_schema), ('author books', Book, book_list_schema),
+                                    ('authors', Author, authors_schema)):
+            instances = model.query.options(*get_load_options(model, schema)).order_by(model.id).limit(per_page).all()
+            serializer = get_row_serializer(model, schema)
+            rows = serializer.select(model.query).order_by(model.id).limit(per_page).all()
+            assert serializer.dump(rows) == schema.dump(instances)
+
+            baseline = measure(lambda: json.dumps(schema.dump(instances)).encode())
+            compiled = measure(lambda: encode_json(serializer.dump(rows)))
+            print(json.dumps({
+                'schema': name, 'per_page': per_page, 'marshmallow_json_ms': baseline,
+                'compiled_orjson_ms': compiled,
+                'rows_per_second': round(per_page / compiled['p50_ms'] * 1000),
+                'speedup': round(baseline['p50_ms'] / compiled['p50_ms'], 1),
+            }))
+
+    def list_books():
+        response = client.get('/api/books', query_string={'per_page': per_page}, headers=headers)
+        assert response.status_code == 200, response.data
+    print(json.dumps({'endpoint': 'GET /api/books', 'per_page': per_page, **measure(list_books, repeat=30)}))
+
+
+if __name__ == '__main__':
+    main()
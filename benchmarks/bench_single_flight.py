@@ -0,0 +1,83 @@
+"""Database statements per request for concurrent identical hot reads, with and without single-flight.
+
+Many client threads read the same few hot paths with the response cache
+disabled, so every request that is not coalesced reaches the database. With
+single-flight the statement count should stay roughly flat as concurrency
+grows; without it it grows with the request count.
+
+    python -m benchmarks.bench_single_flight --concurrency 1,8,32,128
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+
+from benchmarks.common import BackgroundServer, auth_headers, http_request, summarize
+from benchmarks.seed import seed
+
+HOT_PATHS = ('/api/books/1', '/api/authors/1', '/api/authors/1/books?per_page=100')
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, 'before_cursor_execute', self._record)
+
+    def _record(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+def drive(server, headers, concurrency, requests):
+    paths = [HOT_PATHS[i % len(HOT_PATHS)] for i in range(requests)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda path: http_request(server.url + path, headers=headers), paths))
+    elapsed = time.perf_counter() - started
+    statuses = [status for status, _, _ in results]
+    return {
+        **summarize([latency for _, latency, _ in results]),
+        'throughput_rps': round(len(results) / elapsed, 1),
+        'statuses': {str(status): statuses.count(status) for status in sorted(set(statuses))},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default='bench_single_flight.db')
+    parser.add_argument('--authors', type=int, default=100)
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--concurrency', default='1,8,32,128')
+    parser.add_argument('--requests', type=int, default=1200)
+    args = parser.parse_args()
+
+    from helpers.cache_helper import response_cache
+    from helpers.single_flight_helper import single_flight
+    from models import db
+
+    app, _ = seed(args.database, args.authors, args.books, 1)
+    # Only concurrent requests may share a fill; nothing is served from earlier ones.
+    response_cache.enabled = False
+    headers = auth_headers(app)
+    with app.app_context():
+        counter = StatementCounter(db.engine)
+
+    with BackgroundServer(app) as server:
+        for concurrency in [int(value) for value in args.concurrency.split(',')]:
+            for enabled in (False, True):
+                single_flight.enabled = enabled
+                single_flight.reset_stats()
+                before = counter.count
+                result = drive(server, headers, concurrency, args.requests)
+                statements = counter.count - before
+                print(json.dumps({'single_flight': enabled, 'concurrency': concurrency, 'statements': statements,
+                                  'statements_per_request': round(statements / args.requests, 3),
+                                  'coalesced': single_flight.get_stats()['coalesced'], **result}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Cold start: import time plus ``init_app`` time in a fresh interpreter.
+
+Each run starts a new Python process that imports ``api`` and calls
+``init_app`` against a new database (schema created) or one already at the
+latest migration (version check only), and reports both phases. Then it
+times ``server.py`` from launch until its workers answer a first request.
+
+    python -m benchmarks.bench_startup [runs] [database path]
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.common import summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROBE = """
+import json, time
+started = time.perf_counter()
+import api
+imported = time.perf_counter()
+api.init_app()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'init_app_ms': (time.perf_counter() - imported) * 1000}))
+"""
+
+
+def remove_database(database_path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(database_path + suffix):
+            os.remove(database_path + suffix)
+
+
+def probe(env):
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def first_response_ms(env):
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'server.py', '--port', '0'], cwd=ROOT, env=env,
+                               stderr=subprocess.PIPE, text=True, start_new_session=True)
+    try:
+        url = re.search(r'http://[\d.]+:\d+', process.stderr.readline()).group(0)
+        while True:
+            try:
+                with urllib.request.urlopen(url + '/metrics', timeout=10):
+                    return (time.perf_counter() - started) * 1000
+            except urllib.error.URLError:
+                time.sleep(0.005)
+    finally:
+        os.killpg(process.pid, 9)
+        process.wait()
+        process.stderr.close()
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    database_path = os.path.abspath(sys.argv[2] if len(sys.argv) > 2 else 'bench_startup.db')
+    env = dict(os.environ, FLASK_ENV=os.environ.get('FLASK_ENV', 'dev'),
+               DATABASE_URI='sqlite:///{}'.format(database_path), PASSWORD_HASH_WORKERS='0')
+
+    fresh = []
+    for _ in range(runs):
+        remove_database(database_path)
+        fresh.append(probe(env))
+    current = [probe(env) for _ in range(runs)]
+    for name, samples in (('new database', fresh), ('current database', current)):
+        print(json.dumps({
+            'case': name,
+            'import_ms': summarize([sample['import_ms'] for sample in samples]),
+            'init_app_ms': summarize([sample['init_app_ms'] for sample in samples]),
+            'total_ms': summarize([sample['import_ms'] + sample['init_app_ms'] for sample in samples]),
+        }))
+    print(json.dumps({'case': 'server first response',
+                      'ms': summarize([first_response_ms(env) for _ in range(runs)])}))
+    remove_database(database_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+import datetime
+import json
+import os
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+WORDS = ('river', 'shadow', 'garden', 'empire', 'winter', 'silver', 'machine', 'ocean', 'forest', 'letter',
+         'night', 'stone', 'crown', 'fire', 'glass', 'house', 'road', 'storm', 'island', 'mirror',
+         'wolf', 'sun', 'harbor', 'dream', 'clock', 'voyage', 'tower', 'secret', 'song', 'ember')
+SYLLABLES = ('ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'da', 'fe', 'go', 'hu',
+             'ja', 'ke', 'li', 'mo', 'nu', 'pa', 're', 'si', 'to', 'va', 'ze', 'bo')
+# ~14k distinct title words, so a word matches a realistic share of a large catalog.
+VOCABULARY = tuple(a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES)
+NAMES = ('Anna', 'Boris', 'Clara', 'David', 'Elena', 'Felix', 'Greta', 'Hugo', 'Irene', 'Jonas',
+         'Karin', 'Leon', 'Maria', 'Nikolai', 'Olga', 'Pavel', 'Rosa', 'Simon', 'Tanja', 'Viktor')
+
+
+def create_app(database_path):
+    """Build the app against a dedicated SQLite file so benchmarks never touch dev data."""
+    os.environ.setdefault('FLASK_ENV', 'dev')
+    os.environ['DATABASE_URI'] = 'sqlite:///{}'.format(os.path.abspath(database_path))
+    from api import init_app
+    return init_app()
+
+
+def auth_headers(app, identity='bench'):
+    from flask_jwt_extended import create_access_token
+    with app.app_context():
+        return {'Authorization': 'Bearer {}'.format(create_access_token(identity=identity))}
+
+
+def seed_authors(db, count, start=0, chunk_size=10000):
+    from models import Author
+    rng = random.Random(start)
+    for chunk_start in range(start, start + count, chunk_size):
+        rows = [{
+            'first_name': rng.choice(NAMES),
+            'last_name': '{}{}'.format(rng.choice(NAMES), i),
+            'birth_date': datetime.date(1900, 1, 1) + datetime.timedelta(days=rng.randrange(36500)),
+            'biography': ' '.join(rng.choices(WORDS, k=12)),
+        } for i in range(chunk_start, min(chunk_start + chunk_size, start + count))]
+        db.session.execute(db.insert(Author), rows)
+        db.session.commit()
+
+
+def seed_books(db, count, author_count, start=0, chunk_size=10000):
+    from models import Book
+    rng = random.Random(start)
+    for chunk_start in range(start, start + count, chunk_size):
+        rows = [{
+            'title': '{} {} {}'.format(rng.choice(WORDS), *rng.choices(VOCABULARY, k=2)).title(),
+            'isbn': '978{:010d}'.format(i),
+            'publication_date': datetime.date(1950, 1, 1) + datetime.timedelta(days=rng.randrange(27000)),
+            'author_id': rng.randrange(author_count) + 1,
+        } for i in range(chunk_start, min(chunk_start + chunk_size, start + count))]
+        db.session.execute(db.insert(Book), rows)
+        db.session.commit()
+
+
+def measure(fn, repeat=50, warmup=5):
+    """Call ``fn`` repeatedly and return latency percentiles in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+def summarize(samples):
+    samples = sorted(samples)
+
+    def percentile(p):
+        return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(percentile(50), 3),
+        'p95_ms': round(percentile(95), 3),
+        'p99_ms': round(percentile(99), 3),
+    }
+
+
+class BackgroundServer:
+    """Serve ``app`` over HTTP from a thread so benchmarks can drive it with real clients."""
+
+    def __init__(self, app, host='127.0.0.1', port=0):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietRequestHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.server = make_server(host, port, app, threaded=True, request_handler=QuietRequestHandler)
+        self.url = 'http://{}:{}'.format(host, self.server.server_port)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.thread.join()
+
+
+def http_request(url, method='GET', body=None, headers=None, content_type='application/json'):
+    """Return ``(status, latency in ms, response size)`` for one HTTP request.
+
+    ``body`` is sent as JSON unless it is already ``bytes``.
+    """
+    data = body if body is None or isinstance(body, bytes) else json.dumps(body).encode()
+    request = urllib.request.Request(url, data=data, method=method, headers=dict(headers or {}))
+    if data is not None:
+        request.add_header('Content-Type', content_type)
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            status, size = response.status, len(response.read())
+    except urllib.error.HTTPError as e:
+        status, size = e.code, len(e.read())
+    return status, (time.perf_counter() - started) * 1000, size
+
+
+def seed_users(db, count, start=0, chunk_size=10000, password='benchpassword'):
+    """Seed ``bench<i>`` users; they share one hash since hashing 100k passwords would dominate seeding."""
+    from models import User
+    from werkzeug.security import generate_password_hash
+    password_hash = generate_password_hash(password)
+    for chunk_start in range(start, start + count, chunk_size):
+        rows = [{'username': 'bench{}'.format(i), 'password': password_hash}
+                for i in range(chunk_start, min(chunk_start + chunk_size, start + count))]
+        db.session.execute(db.insert(User), rows)
+        db.session.commit()
+
+
+def seed_jobs(db, count, chunk_size=10000):
+    """Seed finished jobs, so job status reads have rows to fetch."""
+    from models import Job
+    for chunk_start in range(0, count, chunk_size):
+        rows = [{'kind': 'rebuild_aggregates', 'status': 'succeeded', 'params': {},
+                 'state': {'summary': 1, 'after': 0}, 'done': 1000, 'total': 1000}
+                for _ in range(chunk_start, min(chunk_start + chunk_size, count))]
+        db.session.execute(db.insert(Job), rows)
+        db.session.commit()
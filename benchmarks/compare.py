@@ -0,0 +1,46 @@
+"""Compare two ``benchmarks.run`` result files and flag regressions.
+
+Exits with status 1 when any endpoint's p95 latency grew, or its throughput
+dropped, by more than ``--threshold`` percent.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+
+def compare(baseline, candidate, threshold):
+    rows, regressions = [], []
+    for name, new in candidate['endpoints'].items():
+        old = baseline['endpoints'].get(name)
+        if old is None:
+            continue
+        p95_change = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0.0
+        rps_change = (new['throughput_rps'] - old['throughput_rps']) / old['throughput_rps'] * 100 \
+            if old['throughput_rps'] else 0.0
+        regressed = p95_change > threshold or rps_change < -threshold
+        rows.append((name, old['p95_ms'], new['p95_ms'], p95_change, rps_change, regressed))
+        if regressed:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0, help='allowed change in percent')
+    args = parser.parse_args()
+
+    with open(args.baseline) as baseline, open(args.candidate) as candidate:
+        rows, regressions = compare(json.load(baseline), json.load(candidate), args.threshold)
+
+    for name, old_p95, new_p95, p95_change, rps_change, regressed in rows:
+        print('{:<40} p95 {:>8.2f} -> {:>8.2f} ms ({:+6.1f}%)  throughput {:+6.1f}%{}'.format(
+            name, old_p95, new_p95, p95_change, rps_change, '  REGRESSION' if regressed else ''))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""Drive every API route with concurrent clients and record latency per endpoint.
+
+Seeds a database (or reuses one with ``--no-seed``), serves the app on a
+threaded HTTP server, or targets a running server with ``--url``, then runs
+each route registered in ``api.init_app`` in turn and writes throughput and
+p50/p95/p99 latency per endpoint to a JSON file. Compare two result files
+with ``python -m benchmarks.compare``.
+
+    python -m benchmarks.run --authors 10000 --books 1000000 --users 100000 --concurrency 16
+"""
+import argparse
+import datetime
+import json
+import random
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import BackgroundServer, auth_headers, create_app, http_request, summarize
+from benchmarks.seed import seed
+
+ID_RANGES = (('/api/books/', 'books'), ('/api/authors/', 'authors'), ('/api/jobs/', 'jobs'))
+# Routes that process a whole collection or a large body per request, or queue such work, get fewer requests.
+HEAVY_ENDPOINTS = {'booksexport', 'authorsexport', 'booksbulk', 'authorsbulk', 'jobslist', 'booksbulkjob',
+                   'authorsbulkjob'}
+WRITE_ORDER = {'POST': 0, 'PUT': 1, 'PATCH': 2, 'DELETE': 3}
+
+
+class Scenarios:
+    """Request factories for routes that need more than a plain GET."""
+
+    def __init__(self, volumes, seed_value=0):
+        self.volumes = volumes
+        self.rng = random.Random(seed_value)
+        self.run_id = int(time.time())
+        self.deleted = {'books': volumes['books'], 'authors': volumes['authors']}
+
+    def random_id(self, collection):
+        return self.rng.randrange(max(self.volumes.get(collection, 0), 1)) + 1
+
+    def next_deleted_id(self, collection):
+        self.deleted[collection] -= 1
+        return self.deleted[collection] + 1
+
+    def book_body(self, i):
+        return {'title': 'Benchmark book {}'.format(i), 'isbn': '977{:010d}'.format(i),
+                'publication_date': '2010-01-01', 'author_id': self.random_id('authors')}
+
+    def author_body(self, i):
+        return {'first_name': 'Bench', 'last_name': 'Author{}'.format(i), 'birth_date': '1970-01-01'}
+
+    def build(self, endpoint, method, rule, i):
+        """Return ``(path, body, content type)`` for request ``i`` or None if there is no scenario."""
+        path = rule
+        for prefix, collection in ID_RANGES:
+            if rule.startswith(prefix) and '<id>' in rule:
+                if method == 'DELETE':
+                    path = rule.replace('<id>', str(self.next_deleted_id(collection)))
+                else:
+                    path = rule.replace('<id>', str(self.random_id(collection)))
+        if '<' in path:
+            return None
+
+        if method == 'GET':
+            return path, None, None
+        key = (endpoint, method)
+        if key == ('usersignup', 'POST'):
+            return path, {'username': 'n{}x{}'.format(self.run_id % 100000, i), 'password': 'benchpassword'}, None
+        if key == ('userlogin', 'POST'):
+            return path, {'username': 'bench{}'.format(self.random_id('users') - 1), 'password': 'benchpassword'}, None
+        if key in (('bookslist', 'POST'), ('book', 'PUT')):
+            return path, self.book_body(i), None
+        if key in (('authorslist', 'POST'), ('author', 'PUT')):
+            return path, self.author_body(i), None
+        if key == ('book', 'PATCH'):
+            return path, {'title': 'Patched book {}'.format(i)}, None
+        if key == ('author', 'PATCH'):
+            return path, {'biography': 'Patched {}'.format(i)}, None
+        if key == ('authorbooks', 'PATCH'):
+            return path, {'publication_date': '2011-01-01'}, None
+        if key == ('jobslist', 'POST'):
+            return path, {'kind': 'delete_author', 'params': {'author_id': self.next_deleted_id('authors')}}, None
+        if key in (('booksbulk', 'POST'), ('booksbulkjob', 'POST')):
+            lines = (json.dumps(self.book_body(i * 100 + n)) for n in range(100))
+            return path, '\n'.join(lines).encode(), 'application/x-ndjson'
+        if key in (('authorsbulk', 'POST'), ('authorsbulkjob', 'POST')):
+            rows = ('Bench,Bulk{},1970-01-01'.format(i * 100 + n) for n in range(100))
+            return path, ('first_name,last_name,birth_date\n' + '\n'.join(rows)).encode(), 'text/csv'
+        if key == ('batch', 'POST'):
+            return path, {'requests': [
+                '/api/books?ids={},{},{}'.format(*(self.random_id('books') for _ in range(3))),
+                '/api/authors/{}'.format(self.random_id('authors')),
+                '/api/authors/{}/books?per_page=5'.format(self.random_id('authors')),
+            ]}, None
+        if method == 'DELETE':
+            return path, None, None
+        return None
+
+
+def api_routes(app):
+    routes = []
+    for rule in app.url_map.iter_rules():
+        if not rule.rule.startswith('/api/'):
+            continue
+        for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+            routes.append((rule.endpoint, method, rule.rule))
+    # Reads first, then writes, deletes last so they do not skew the reads.
+    return sorted(routes, key=lambda route: (WRITE_ORDER.get(route[1], -1), route[2]))
+
+
+def run_endpoint(base_url, headers, scenarios, endpoint, method, rule, requests, concurrency):
+    jobs = []
+    for i in range(requests):
+        built = scenarios.build(endpoint, method, rule, i)
+        if built is None:
+            return None
+        jobs.append(built)
+
+    def call(job):
+        path, body, content_type = job
+        return http_request(base_url + path, method, body, headers, content_type or 'application/json')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(call, jobs))
+    elapsed = time.perf_counter() - started
+
+    statuses = [status for status, _, _ in results]
+    return {
+        **summarize([latency for _, latency, _ in results]),
+        'throughput_rps': round(len(results) / elapsed, 1),
+        'errors': sum(1 for status in statuses if status >= 500),
+        'statuses': {str(status): statuses.count(status) for status in sorted(set(statuses))},
+        'mean_bytes': round(sum(size for _, _, size in results) / len(results)),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default='bench.db')
+    parser.add_argument('--authors', type=int, default=10000)
+    parser.add_argument('--books', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--jobs', type=int, default=1000, help='finished jobs to seed for job status reads')
+    parser.add_argument('--no-seed', action='store_true', help='reuse an already seeded --database')
+    parser.add_argument('--url', help='benchmark a running server instead of starting one')
+    parser.add_argument('--requests', type=int, default=500, help='requests per endpoint')
+    parser.add_argument('--heavy-requests', type=int, default=5, help='requests per export/bulk endpoint')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--output', default='bench_results.json')
+    args = parser.parse_args()
+
+    volumes = {'authors': args.authors, 'books': args.books, 'users': args.users, 'jobs': args.jobs}
+    if args.no_seed or args.url:
+        app = create_app(args.database)
+    else:
+        app, _ = seed(args.database, args.authors, args.books, args.users, jobs=args.jobs)
+    headers = auth_headers(app)
+    scenarios = Scenarios(volumes)
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'volumes': volumes,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+        },
+        'endpoints': {},
+        'skipped': [],
+    }
+
+    def run_all(base_url):
+        for endpoint, method, rule in api_routes(app):
+            requests = args.heavy_requests if endpoint in HEAVY_ENDPOINTS else args.requests
+            result = run_endpoint(base_url, headers, scenarios, endpoint, method, rule, requests, args.concurrency)
+            name = '{} {}'.format(method, rule)
+            if result is None:
+                report['skipped'].append(name)
+                continue
+            report['endpoints'][name] = result
+            print('{:<40} {:>8.1f} req/s  p50 {:>8.2f} ms  p99 {:>8.2f} ms  {}'.format(
+                name, result['throughput_rps'], result['p50_ms'], result['p99_ms'], result['statuses']))
+
+    if args.url:
+        run_all(args.url.rstrip('/'))
+    else:
+        with BackgroundServer(app) as server:
+            run_all(server.url)
+
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    if report['skipped']:
+        print('no scenario for: {}'.format(', '.join(report['skipped'])))
+
+
+if __name__ == '__main__':
+    main()
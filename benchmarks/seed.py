@@ -0,0 +1,51 @@
+"""Seed a SQLite database with a configurable volume of authors, books, users and finished jobs.
+
+    python -m benchmarks.seed bench.db --authors 10000 --books 1000000 --users 100000 --jobs 1000
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks.common import create_app, seed_authors, seed_books, seed_jobs, seed_users
+
+
+def seed(database_path, authors, books, users, fresh=True, jobs=0):
+    if fresh:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(database_path + suffix):
+                os.remove(database_path + suffix)
+    app = create_app(database_path)
+    from models import db
+    timings = {}
+    with app.app_context():
+        for name, fn in (('authors', lambda: seed_authors(db, authors)),
+                         ('books', lambda: seed_books(db, books, max(authors, 1))),
+                         ('users', lambda: seed_users(db, users)),
+                         ('jobs', lambda: seed_jobs(db, jobs))):
+            started = time.perf_counter()
+            fn()
+            timings[name] = round(time.perf_counter() - started, 2)
+        # Seeding bypasses the ORM, so the row counters and author aggregates are set in one pass afterwards.
+        from helpers.aggregate_helper import aggregates
+        from helpers.counter_helper import counters
+        counters.reconcile(db.session)
+        aggregates.rebuild(db.session)
+        db.session.commit()
+    return app, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('database', nargs='?', default='bench.db')
+    parser.add_argument('--authors', type=int, default=10000)
+    parser.add_argument('--books', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--jobs', type=int, default=1000)
+    args = parser.parse_args()
+    _, timings = seed(args.database, args.authors, args.books, args.users, jobs=args.jobs)
+    print(json.dumps({'database': args.database, 'seconds': timings}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session
+
+from models import db
+
+
+class Aggregates:
+    """Summary columns on parent rows computed from their child rows, e.g. an author's book count.
+
+    ``track(parent, child, foreign_key, columns)`` maps parent attributes to
+    ``(aggregate function, child column)``. Whenever a flush inserts or
+    deletes children, moves them to another parent or changes an aggregated
+    column, the affected parents are recomputed by one ``UPDATE`` within the
+    same transaction, reading only their own children through the foreign key
+    index. Core inserts report their rows through ``add_rows``; other Core
+    writes report the parents they touched through ``refresh``.
+    """
+
+    def __init__(self):
+        self._summaries = {}
+
+    def track(self, parent, child, foreign_key, columns):
+        self._summaries[child] = Summary(parent, foreign_key, columns)
+
+    def add_rows(self, session, model, rows):
+        """Refresh the parents of plain ``rows`` (dicts of column values) inserted into ``model`` outside the ORM."""
+        summary = self._summaries.get(model)
+        if summary is not None:
+            summary.refresh(session, {row.get(summary.foreign_key.key) for row in rows})
+
+    def refresh(self, session, model, parent_ids):
+        """Refresh the parents with ``parent_ids`` after ``model`` rows were written outside the ORM."""
+        summary = self._summaries.get(model)
+        if summary is not None:
+            summary.refresh(session, parent_ids)
+
+    def rebuild(self, session):
+        for summary in self._summaries.values():
+            summary.refresh(session)
+
+    def rebuild_in_chunks(self, session, state, chunk_size):
+        """``rebuild`` as a job task: refresh ``chunk_size`` parents per step, resuming from ``state``."""
+        summaries = list(self._summaries.values())
+        index, after = state.get('summary', 0), state.get('after', 0)
+        while index < len(summaries):
+            summary = summaries[index]
+            parent_id = inspect(summary.parent).primary_key[0]
+            ids = session.scalars(select(parent_id).where(parent_id > after).order_by(parent_id)
+                                  .limit(chunk_size)).all()
+            if ids:
+                summary.refresh(session, ids)
+                after = ids[-1]
+            else:
+                index, after = index + 1, 0
+            yield {'summary': index, 'after': after}, len(ids)
+
+    def check(self, session):
+        """``[(parent table, id, stored, exact)]`` for every parent whose summary is out of date."""
+        return [problem for summary in self._summaries.values() for problem in summary.check(session)]
+
+    def _refresh_flush(self, session, flush_context):
+        parent_ids = {}
+        for instance in session.new:
+            summary = self._summaries.get(type(instance))
+            if summary is not None:
+                parent_ids.setdefault(summary, set()).add(getattr(instance, summary.foreign_key.key))
+        for instance in session.deleted:
+            summary = self._summaries.get(type(instance))
+            if summary is not None:
+                parent_ids.setdefault(summary, set()).update(summary.changed_parent_ids(instance, committed_only=True))
+        for instance in session.dirty:
+            summary = self._summaries.get(type(instance))
+            if summary is not None:
+                parent_ids.setdefault(summary, set()).update(summary.changed_parent_ids(instance))
+        for summary, ids in parent_ids.items():
+            summary.refresh(session, ids)
+
+    def listen(self):
+        event.listen(Session, 'after_flush', self._refresh_flush)
+
+
+class Summary:
+    def __init__(self, parent, foreign_key, columns):
+        self.parent = parent
+        self.foreign_key = foreign_key
+        self.columns = columns
+        self.source_keys = {foreign_key.key} | {column.key for _, column in columns.values()}
+
+    def exact_values(self, parent_id):
+        return {name: select(function(column)).where(self.foreign_key == parent_id).scalar_subquery()
+                for name, (function, column) in self.columns.items()}
+
+    def changed_parent_ids(self, instance, committed_only=False):
+        attrs = inspect(instance).attrs
+        foreign_key = attrs[self.foreign_key.key]
+        committed = foreign_key.history.deleted[0] if foreign_key.history.deleted else foreign_key.value
+        if committed_only:
+            return {committed}
+        if not any(attrs[key].history.has_changes() for key in self.source_keys):
+            return set()
+        return {committed, foreign_key.value}
+
+    def refresh(self, session, ids=None):
+        """Recompute the summary of the parents with ``ids``, or of all parents."""
+        parent_id = inspect(self.parent).primary_key[0]
+        statement = update(self.parent).values(self.exact_values(parent_id))
+        if ids is not None:
+            ids = {id for id in ids if id is not None}
+            if not ids:
+                return
+            statement = statement.where(parent_id.in_(ids))
+        session.execute(statement, execution_options={'synchronize_session': False})
+
+    def check(self, session):
+        parent_id = inspect(self.parent).primary_key[0]
+        stored = [getattr(self.parent, name) for name in self.columns]
+        exact = list(self.exact_values(parent_id).values())
+        rows = session.execute(select(parent_id, *stored, *exact)).all()
+        size = len(self.columns)
+        return [(self.parent.__table__.name, row[0], tuple(row[1:size + 1]), tuple(row[size + 1:]))
+                for row in rows if tuple(row[1:size + 1]) != tuple(row[size + 1:])]
+
+
+@click.command('rebuild-aggregates')
+@with_appcontext
+def rebuild_aggregates_command():
+    """Recompute every summary column from scratch."""
+    aggregates.rebuild(db.session)
+    db.session.commit()
+    click.echo('Aggregates rebuilt')
+
+
+@click.command('check-aggregates')
+@with_appcontext
+def check_aggregates_command():
+    """Compare every summary column with its exact value and fail if any is out of date."""
+    problems = aggregates.check(db.session)
+    for table_name, id, stored, exact in problems:
+        click.echo('{} {}: {} != {}'.format(table_name, id, stored, exact))
+    if problems:
+        raise click.ClickException('{} summaries out of date, run rebuild-aggregates'.format(len(problems)))
+    click.echo('Aggregates are up to date')
+
+
+aggregates = Aggregates()
+aggregates.listen()
@@ -0,0 +1,423 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from itertools import chain
+
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from helpers.json_helper import encode_json
+from helpers.single_flight_helper import single_flight
+
+CacheEntry = namedtuple('CacheEntry', ['body', 'etag', 'last_modified', 'changed_at', 'tag_versions'])
+
+
+class CacheBackend:
+    """Key/value storage used by ResponseCache.
+
+    The default backend is an in-process LRU; implement these methods over a
+    shared store to share cached responses and invalidations between processes.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        """Store ``value``; ``ttl=None`` uses the default TTL and ``ttl=0`` never expires."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def update(self, key, fn, ttl=None):
+        """Store ``fn(value)`` for the current value (None if missing) in one step no other writer can interleave."""
+        raise NotImplementedError
+
+    def dispose(self, close=True):
+        """Let go of what this process holds, around a fork; ``close=False`` leaves connections to the parent."""
+
+
+class LRUCacheBackend(CacheBackend):
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._items[key] = (value, expires_at)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def update(self, key, fn, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.monotonic()
+        with self._lock:
+            value, expires_at = self._items.get(key, (None, None))
+            if expires_at is not None and expires_at < now:
+                value = None
+            self._items[key] = (fn(value), now + ttl if ttl else None)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def delete_matching(self, predicate):
+        with self._lock:
+            for key in [key for key, (value, _) in self._items.items() if predicate(value)]:
+                del self._items[key]
+
+    def __len__(self):
+        return len(self._items)
+
+    def dispose(self, close=True):
+        # Entries copied into a forked worker would never hear of the writes other workers handle.
+        self.clear()
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """CacheBackend in a SQLite file that every process opening it shares, e.g. the workers of ``server.py``.
+
+    Values are pickled. Several caches can share one file under different
+    ``namespace`` names; each keeps about ``max_size`` entries, dropping the
+    ones written longest ago first, checked every ``PRUNE_EVERY`` writes.
+    Expiry uses wall-clock time, which all processes agree on.
+    """
+
+    PRUNE_EVERY = 256
+
+    def __init__(self, path, namespace, max_size=1024, ttl=300):
+        self.path = path
+        self.namespace = namespace
+        self.max_size = max_size
+        self.ttl = ttl
+        self._local = threading.local()
+        self._connections = []
+        # Connections inherited from the parent process, kept open so that they are not closed from here.
+        self._inherited = []
+        self._lock = threading.Lock()
+        self._writes = 0
+        connection = self._connection()
+        connection.execute('CREATE TABLE IF NOT EXISTS cache_entries (namespace TEXT NOT NULL, key BLOB NOT NULL, '
+                           'value BLOB NOT NULL, expires_at REAL, stored_at REAL NOT NULL, '
+                           'PRIMARY KEY (namespace, key))')
+        connection.execute('CREATE INDEX IF NOT EXISTS ix_cache_entries_stored_at '
+                           'ON cache_entries (namespace, stored_at)')
+
+    def get(self, key):
+        row = self._connection().execute('SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?',
+                                         (self.namespace, pickle.dumps(key))).fetchone()
+        if row is None or row[1] is not None and row[1] < time.time():
+            return None
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        self._connection().execute('INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?)',
+                                   (self.namespace, pickle.dumps(key), pickle.dumps(value),
+                                    now + ttl if ttl else None, now))
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM cache_entries WHERE namespace = ? AND key = ?',
+                                   (self.namespace, pickle.dumps(key)))
+
+    def update(self, key, fn, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        connection = self._connection()
+        # IMMEDIATE takes the write lock before reading, so no other process updates in between.
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?',
+                                     (self.namespace, pickle.dumps(key))).fetchone()
+            now = time.time()
+            value = None if row is None or row[1] is not None and row[1] < now else pickle.loads(row[0])
+            connection.execute('INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?)',
+                               (self.namespace, pickle.dumps(key), pickle.dumps(fn(value)),
+                                now + ttl if ttl else None, now))
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entries WHERE namespace = ?', (self.namespace,))
+
+    def delete_matching(self, predicate):
+        connection = self._connection()
+        rows = connection.execute('SELECT key, value FROM cache_entries WHERE namespace = ?', (self.namespace,))
+        keys = [(self.namespace, key) for key, value in rows.fetchall() if predicate(pickle.loads(value))]
+        connection.executemany('DELETE FROM cache_entries WHERE namespace = ? AND key = ?', keys)
+
+    def prune(self):
+        """Drop expired entries and the oldest beyond ``max_size``."""
+        connection = self._connection()
+        connection.execute('DELETE FROM cache_entries WHERE namespace = ? AND expires_at < ?',
+                           (self.namespace, time.time()))
+        connection.execute('DELETE FROM cache_entries WHERE namespace = ? AND key IN (SELECT key FROM cache_entries '
+                           'WHERE namespace = ? ORDER BY stored_at DESC LIMIT -1 OFFSET ?)',
+                           (self.namespace, self.namespace, self.max_size))
+
+    def dispose(self, close=True):
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+            if not close:
+                self._inherited.extend(connections)
+        if close:
+            for connection in connections:
+                connection.close()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # Losing the cache in a crash costs refills, nothing more.
+            connection.execute('PRAGMA synchronous=OFF')
+            with self._lock:
+                self._connections.append(connection)
+            self._local.connection = connection
+        return connection
+
+    def __len__(self):
+        return self._connection().execute(
+            'SELECT count(*) FROM cache_entries WHERE namespace = ? AND (expires_at IS NULL OR expires_at >= ?)',
+            (self.namespace, time.time())).fetchone()[0]
+
+
+def create_backend(app, namespace, max_size, ttl):
+    """A SQLiteCacheBackend in ``SHARED_CACHE_PATH`` (relative to the instance folder) if set, else an LRU.
+
+    State that the workers of ``server.py`` must agree on, such as which
+    responses a write invalidated, goes through here.
+    """
+    path = app.config.get('SHARED_CACHE_PATH')
+    if not path:
+        return LRUCacheBackend(max_size=max_size, ttl=ttl)
+    if not os.path.isabs(path):
+        os.makedirs(app.instance_path, exist_ok=True)
+        path = os.path.join(app.instance_path, path)
+    return SQLiteCacheBackend(path, namespace, max_size=max_size, ttl=ttl)
+
+
+class ResponseCache:
+    """Server-side cache of serialized GET responses with ETag/Last-Modified.
+
+    Entries are keyed by request path and query string and carry a set of tags
+    such as ``book:1``. Committed ORM writes invalidate the tags that the
+    registered ``tag_model`` rules return for every new, changed or deleted
+    object, which makes every entry that depends on them stale. Entries and
+    tag versions live in an in-process LRU, or with ``SHARED_CACHE_PATH`` in a
+    file shared by every worker process, see ``create_backend``.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.enabled = True
+        # Optional callable returning a context manager that fills run in, see ReplicaRouter.
+        self.fill_guard = None
+        self._tag_rules = {}
+        self._stats_lock = threading.Lock()
+        self._tag_lock = threading.Lock()
+        self.reset_stats()
+
+    def init_app(self, app, backend=None):
+        self.enabled = app.config.get('RESPONSE_CACHE_ENABLED', True)
+        self.backend = backend or create_backend(
+            app, 'responses',
+            max_size=app.config.get('RESPONSE_CACHE_SIZE', 1024),
+            ttl=app.config.get('RESPONSE_CACHE_TTL_SECONDS', 300),
+        )
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'invalidations': 0}
+
+    def tag_model(self, model, rule):
+        """Invalidate ``rule(instance)`` tags whenever a ``model`` instance is written."""
+        self._tag_rules[model] = rule
+
+    def respond(self, tags, fill):
+        """Serve the current request from cache or from ``fill``.
+
+        ``fill`` returns ``(data, extra_tags)``, or ``(data, extra_tags, version)``
+        for a single row so that its ETag starts with the row version, see
+        ``make_etag``. ``tags`` must be known before filling; their versions are
+        read first, so a write that commits while ``fill`` runs leaves the new
+        entry already stale. Concurrent identical misses are coalesced by
+        ``single_flight`` into one fill whose entry every request is served from.
+        """
+        key = request.full_path
+        entry = self._lookup(key) if self.enabled else None
+        if entry is None:
+            versions = {tag: self._tag_version(tag) for tag in tags}
+            # Identical misses share one fill; the tag versions are part of the key so a
+            # request made after a write never gets the result of a fill that started before it.
+            flight_key = (key, tuple(sorted(versions.items())))
+            entry = single_flight.do(flight_key, lambda: self._fill(key, versions, fill))
+        else:
+            self._count('hits')
+
+        response = Response(entry.body, mimetype='application/json')
+        response.set_etag(entry.etag)
+        response.last_modified = entry.last_modified
+        response.cache_control.no_cache = True
+        if_modified_since = request.if_modified_since
+        # Last-Modified has whole seconds: a copy dated the second a tag changed in may predate the change.
+        if if_modified_since is None or request.if_none_match or entry.changed_at < if_modified_since.timestamp():
+            response = response.make_conditional(request)
+        if response.status_code == 304:
+            self._count('not_modified')
+        return response
+
+    def _fill(self, key, versions, fill):
+        versions = dict(versions)
+        with self.fill_guard() if self.fill_guard else nullcontext():
+            data, extra_tags, *version = fill()
+        for tag in extra_tags:
+            versions.setdefault(tag, self._tag_version(tag))
+
+        body = encode_json(data)
+        entry = CacheEntry(
+            body=body,
+            etag=make_etag(body, *version),
+            last_modified=datetime.now(timezone.utc).replace(microsecond=0),
+            changed_at=max(map(tag_version_time, versions.values()), default=0.0),
+            tag_versions=versions,
+        )
+        if self.enabled:
+            self.backend.set(key, entry)
+            self._count('misses')
+        return entry
+
+    def invalidate_on_commit(self, session, *tags):
+        """Invalidate ``tags`` once ``session`` commits, for writes that bypass the ORM."""
+        session.info.setdefault('response_cache_tags', set()).update(tags)
+
+    def invalidate(self, *tags):
+        if self.backend is None:
+            return
+        for tag in tags:
+            self.backend.set('tag:{}'.format(tag), new_tag_version(), ttl=0)
+            self._count('invalidations')
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+        if isinstance(self.backend, LRUCacheBackend):
+            stats['size'] = len(self.backend)
+            stats['max_size'] = self.backend.max_size
+        return stats
+
+    def _lookup(self, key):
+        entry = self.backend.get(key)
+        if entry is None:
+            return None
+        for tag, version in entry.tag_versions.items():
+            if self.backend.get('tag:{}'.format(tag)) != version:
+                self.backend.delete(key)
+                return None
+        return entry
+
+    def _tag_version(self, tag):
+        tag_key = 'tag:{}'.format(tag)
+        version = self.backend.get(tag_key)
+        if version is None:
+            # Concurrent first reads of a tag must agree on its version to share a fill.
+            with self._tag_lock:
+                version = self.backend.get(tag_key)
+                if version is None:
+                    version = new_tag_version()
+                    self.backend.set(tag_key, version, ttl=0)
+        return version
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _collect_tags(self, session, flush_context):
+        tags = session.info.setdefault('response_cache_tags', set())
+        for instance in chain(session.new, session.dirty, session.deleted):
+            rule = self._tag_rules.get(type(instance))
+            if rule is not None:
+                tags.update(rule(instance))
+
+    def _invalidate_collected(self, session):
+        tags = session.info.pop('response_cache_tags', None)
+        if tags:
+            self.invalidate(*tags)
+
+    def _discard_collected(self, session):
+        session.info.pop('response_cache_tags', None)
+
+    def listen(self):
+        event.listen(Session, 'after_flush', self._collect_tags)
+        event.listen(Session, 'after_commit', self._invalidate_collected)
+        event.listen(Session, 'after_rollback', self._discard_collected)
+
+
+def new_tag_version():
+    """A unique tag version that records when it was made, e.g. ``1718000000.123456-9f86d081...``."""
+    return '{:.6f}-{}'.format(time.time(), uuid.uuid4().hex)
+
+
+def tag_version_time(version):
+    return float(version.partition('-')[0])
+
+
+def make_etag(body, version=None):
+    """ETag of ``body``, prefixed with the row ``version`` it was dumped from, e.g. ``3-9f86d081...``."""
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    return digest if version is None else '{}-{}'.format(version, digest)
+
+
+def etag_version(etag):
+    """The row version an ETag from ``make_etag`` was made for, or None."""
+    version, _, digest = etag.partition('-')
+    return int(version) if version.isdigit() and digest else None
+
+
+response_cache = ResponseCache()
+response_cache.listen()
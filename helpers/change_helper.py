@@ -0,0 +1,86 @@
+import datetime
+
+from sqlalchemy import event, false, select, true, tuple_, union_all
+from sqlalchemy.orm import Session
+
+from models import Tombstone
+
+# Timestamps have millisecond resolution, so a transaction committing after a row the feed already
+# returned can carry the same timestamp and a lower id. Holding back changes younger than the settle
+# window lets such transactions commit first, provided they commit within it.
+MIN_SETTLE_SECONDS = 1.0
+
+
+class ChangeLog:
+    """Rows of tracked models that changed or were deleted, in commit order.
+
+    Tracked models have an indexed ``updated_at`` column that SQLite sets on
+    every insert and update; deleting one through the ORM (or reporting it to
+    ``record_deletes``) leaves a row in ``tombstones``. ``changes`` merges both into one feed ordered by
+    ``(changed_at, id)``, so a client can resume after the last change it saw
+    and a sync reads only what changed since then.
+    """
+
+    def __init__(self):
+        self._models = {}
+
+    def init_app(self, app):
+        settle_seconds = app.config.get('CHANGE_FEED_SETTLE_SECONDS', MIN_SETTLE_SECONDS)
+        if settle_seconds < MIN_SETTLE_SECONDS:
+            raise ValueError('CHANGE_FEED_SETTLE_SECONDS must be at least {}, not {}'.format(MIN_SETTLE_SECONDS,
+                                                                                          settle_seconds))
+
+    def track(self, model):
+        self._models[model.__table__.name] = model
+
+    def is_tracked(self, model):
+        return self._models.get(model.__table__.name) is model
+
+    def changes(self, session, model, after=None, until=None, limit=100):
+        """Up to ``limit`` ``(changed_at, id, deleted)`` rows of ``model`` after the ``(changed_at, id)`` position ``after``.
+
+        ``until`` leaves out changes newer than that time.
+        """
+        table_name = model.__table__.name
+        changed = (select(model.updated_at.label('changed_at'), model.id.label('id'), false().label('deleted'))
+                   .order_by(model.updated_at, model.id))
+        deleted = (select(Tombstone.deleted_at, Tombstone.row_id, true())
+                   .where(Tombstone.table_name == table_name)
+                   .order_by(Tombstone.deleted_at, Tombstone.row_id))
+        if after is not None:
+            changed = changed.where(tuple_(model.updated_at, model.id) > tuple_(*after))
+            deleted = deleted.where(tuple_(Tombstone.deleted_at, Tombstone.row_id) > tuple_(*after))
+        if until is not None:
+            changed = changed.where(model.updated_at <= until)
+            deleted = deleted.where(Tombstone.deleted_at <= until)
+        # Each side is limited on its own index before merging, so a page costs the same at any position.
+        feed = union_all(select(changed.limit(limit).subquery()),
+                         select(deleted.limit(limit).subquery())).subquery()
+        statement = select(feed).order_by(feed.c.changed_at, feed.c.id).limit(limit)
+        return session.execute(statement).all()
+
+    def record_deletes(self, session, model, ids):
+        """Leave tombstones for rows of ``model`` deleted outside the ORM."""
+        if ids and self.is_tracked(model):
+            session.execute(Tombstone.__table__.insert(), [{'table_name': model.__table__.name, 'row_id': id}
+                                                            for id in ids])
+
+    def _record_deletes(self, session, flush_context):
+        rows = [{'table_name': type(instance).__table__.name, 'row_id': instance.id}
+                for instance in session.deleted if self.is_tracked(type(instance))]
+        if rows:
+            session.execute(Tombstone.__table__.insert(), rows)
+
+    def listen(self):
+        event.listen(Session, 'after_flush', self._record_deletes)
+
+
+def utc_naive(value):
+    """``value`` as a naive UTC datetime, the way timestamps are stored."""
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+change_log = ChangeLog()
+change_log.listen()
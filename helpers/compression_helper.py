@@ -0,0 +1,228 @@
+import threading
+import time
+import zlib
+
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header, quote_etag, unquote_etag
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    import zstandard
+except ImportError:  # zstd is offered only when the optional zstandard package is installed
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/csv', 'text/plain'}
+GZIP_WBITS = zlib.MAX_WBITS | 16
+
+
+class ResponseCompression:
+    """Compresses responses with the best encoding the client accepts.
+
+    Wraps the WSGI app. JSON, NDJSON, CSV and text responses of at least
+    ``COMPRESSION_MIN_SIZE`` bytes are sent with ``Content-Encoding`` zstd
+    (when ``zstandard`` is installed), gzip or deflate, whichever the
+    ``Accept-Encoding`` header prefers. Responses with a known length are
+    compressed in one go; streamed ones chunk by chunk, each chunk flushed to
+    the client as it is produced, so nothing is buffered beyond the size
+    threshold. Compression stops while it has used more than
+    ``COMPRESSION_CPU_BUDGET`` CPU seconds per second, and resumes as the
+    budget refills.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.min_size = 1024
+        self.level = 6
+        self.zstd_level = 3
+        self.budget = CpuBudget(1.0)
+        self.encodings = available_encodings()
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('COMPRESSION_ENABLED', True)
+        self.min_size = app.config.get('COMPRESSION_MIN_SIZE', 1024)
+        self.level = app.config.get('COMPRESSION_LEVEL', 6)
+        self.zstd_level = app.config.get('COMPRESSION_ZSTD_LEVEL', 3)
+        self.budget = CpuBudget(app.config.get('COMPRESSION_CPU_BUDGET', 1.0))
+        self.reset_stats()
+        if self.enabled:
+            app.wsgi_app = CompressionMiddleware(app.wsgi_app, self)
+
+    def reset_stats(self):
+        self.stats = {'responses': 0, 'bytes_in': 0, 'bytes_out': 0, 'cpu_seconds': 0.0, 'over_budget': 0}
+
+    def get_stats(self):
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def negotiate(self, environ):
+        """The encoding to compress the response to ``environ`` with, or None."""
+        accept_encoding = environ.get('HTTP_ACCEPT_ENCODING')
+        if not accept_encoding or environ['REQUEST_METHOD'] == 'HEAD':
+            return None
+        return parse_accept_header(accept_encoding).best_match(self.encodings)
+
+    def compressor(self, encoding):
+        return make_compressor(encoding, self.zstd_level if encoding == 'zstd' else self.level)
+
+    def compress(self, compressor, chunk, flush):
+        """Compress ``chunk`` (``flush`` ends the stream) and charge the CPU time to the budget."""
+        started = time.thread_time()
+        data = compressor.compress(chunk) + (compressor.finish() if flush else compressor.flush())
+        spent = time.thread_time() - started
+        self.budget.spend(spent)
+        self._count(bytes_in=len(chunk), bytes_out=len(data), cpu_seconds=spent)
+        return data
+
+    def _count(self, **amounts):
+        with self._stats_lock:
+            for name, amount in amounts.items():
+                self.stats[name] += amount
+
+
+class CompressionMiddleware:
+    def __init__(self, wsgi_app, compression):
+        self.wsgi_app = wsgi_app
+        self.compression = compression
+
+    def __call__(self, environ, start_response):
+        encoding = self.compression.negotiate(environ)
+        if encoding is None:
+            return self.wsgi_app(environ, start_response)
+
+        started = {}
+
+        def capture(status, headers, exc_info=None):
+            started.update(status=status, headers=headers, exc_info=exc_info)
+
+        iterable = self.wsgi_app(environ, capture)
+        return ClosingIterator(self._respond(iterable, encoding, started, start_response),
+                               getattr(iterable, 'close', None))
+
+    def _respond(self, iterable, encoding, started, start_response):
+        compression = self.compression
+        status, headers, exc_info = started['status'], Headers(started['headers']), started['exc_info']
+        if not is_compressible(status, headers):
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            yield from iterable
+            return
+
+        headers.add('Vary', 'Accept-Encoding')
+        length = headers.get('Content-Length', type=int)
+        chunks = iter(iterable)
+        buffered = []
+        if length is None:
+            # A streamed body: read just enough of it to know whether it reaches the threshold.
+            size = 0
+            for chunk in chunks:
+                buffered.append(chunk)
+                size += len(chunk)
+                if size >= compression.min_size:
+                    break
+            else:
+                length = size
+                headers['Content-Length'] = str(size)
+
+        small = length is not None and length < compression.min_size
+        if small or not compression.budget.available():
+            if not small:
+                compression._count(over_budget=1)
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            yield from buffered
+            yield from chunks
+            return
+
+        compression._count(responses=1)
+        compressor = compression.compressor(encoding)
+        headers['Content-Encoding'] = encoding
+        etag = headers.get('ETag')
+        if etag:
+            # The compressed bytes differ from the identity ones; a weak ETag still revalidates and matches If-Match.
+            headers['ETag'] = quote_etag(unquote_etag(etag)[0], weak=True)
+        if length is not None:
+            body = compression.compress(compressor, b''.join(buffered + list(chunks)), flush=True)
+            headers['Content-Length'] = str(len(body))
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            yield body
+            return
+
+        headers.remove('Content-Length')
+        start_response(status, headers.to_wsgi_list(), exc_info)
+        pending = b''.join(buffered)
+        for chunk in chunks:
+            if pending:
+                yield compression.compress(compressor, pending, flush=False)
+            pending = chunk
+        yield compression.compress(compressor, pending, flush=True)
+
+
+class CpuBudget:
+    """Token bucket of CPU seconds refilled at ``rate`` per second; a rate of 0 means no limit."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def available(self):
+        if not self.rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            return self._tokens > 0
+
+    def spend(self, seconds):
+        if self.rate:
+            with self._lock:
+                self._tokens -= seconds
+
+
+class ZlibCompressor:
+    def __init__(self, level, wbits):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class ZstdCompressor:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+def available_encodings():
+    """Supported content codings, most preferred first."""
+    return (('zstd',) if zstandard is not None else ()) + ('gzip', 'deflate')
+
+
+def make_compressor(encoding, level):
+    if encoding == 'zstd':
+        return ZstdCompressor(level)
+    return ZlibCompressor(level, GZIP_WBITS if encoding == 'gzip' else zlib.MAX_WBITS)
+
+
+def is_compressible(status, headers):
+    return (status.startswith('200') and 'Content-Encoding' not in headers
+            and headers.get('Content-Type', '').split(';')[0].strip() in COMPRESSIBLE_MIMETYPES)
+
+
+response_compression = ResponseCompression()
@@ -0,0 +1,177 @@
+from collections.abc import Mapping
+
+import flask_restful
+from flask import current_app, request
+from flask_restful import inputs, reqparse
+from marshmallow import ValidationError, fields, missing
+from marshmallow.decorators import VALIDATES
+from marshmallow.utils import EXCLUDE, RAISE
+
+# Converters reqparse calls with the value and the argument name.
+NAMED_TYPES = (inputs.positive, inputs.natural)
+# Converters reqparse ends up calling with the value alone.
+PLAIN_TYPES = (int, inputs.boolean)
+
+
+class ArgsContract:
+    """Query string arguments of ``parser``, checked by converters compiled once.
+
+    ``reqparse`` re-reads every ``Argument`` setting and tries up to three
+    call signatures per value on each request; the contract resolves all of
+    that when it is built, at import. ``parse_args`` returns the same
+    ``Namespace`` and aborts with the same ``{"message": {name: help}}``
+    400 body. Parsers using anything beyond query string arguments with a
+    ``store`` action, ``choices`` and the converters above keep going
+    through ``parser.parse_args``.
+    """
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.arguments = compile_arguments(parser)
+
+    def parse_args(self):
+        if self.arguments is None or current_app.config.get('BUNDLE_ERRORS', False):
+            return self.parser.parse_args()
+
+        source = request.args
+        result = reqparse.Namespace()
+        for name, convert, choices, default, required, help in self.arguments:
+            values = source.getlist(name)
+            if not values:
+                if required:
+                    abort_argument(name, help, 'Missing required parameter in the query string')
+                result[name] = default() if callable(default) else default
+                continue
+            for index, value in enumerate(values):
+                if convert is not None:
+                    try:
+                        value = convert(value)
+                    except Exception as error:
+                        abort_argument(name, help, error)
+                if choices and value not in choices:
+                    abort_argument(name, help, '{0} is not a valid choice'.format(value))
+                if index == 0:
+                    result[name] = value
+        return result
+
+
+def compile_arguments(parser):
+    """Per-argument ``(name, convert, choices, default, required, help)``, or None if not supported."""
+    if parser.bundle_errors or parser.namespace_class is not reqparse.Namespace:
+        return None
+    arguments = []
+    for argument in parser.args:
+        if (argument.location not in ('args', ('args',)) or argument.action != 'store'
+                or tuple(argument.operators) != ('=',) or argument.dest or argument.ignore or argument.trim
+                or not argument.case_sensitive or not argument.store_missing):
+            return None
+        convert = compile_converter(argument)
+        if convert is False:
+            return None
+        arguments.append((argument.name, convert, argument.choices, argument.default, argument.required,
+                          argument.help))
+    return tuple(arguments)
+
+
+def compile_converter(argument):
+    """A one-argument converter for ``argument.type``, None for strings kept as they are, or False."""
+    converter = argument.type
+    if converter is str:
+        return None
+    if converter in NAMED_TYPES:
+        name = argument.name
+        return lambda value: converter(value, name)
+    if converter in PLAIN_TYPES or isinstance(converter, inputs.int_range):
+        return converter
+    return False
+
+
+def abort_argument(name, help, error):
+    error = str(error)
+    flask_restful.abort(400, message={name: help.format(error_msg=error) if help else error})
+
+
+class SchemaLoader:
+    """Loads one object the way ``schema.load`` does, without its per-call setup.
+
+    Marshmallow works out the partial, unknown and hook settings, and builds
+    an error store, on every load. The loader reads them from the schema once:
+    each call just deserializes the load fields in order, reports unknown keys
+    and runs the ``@validates`` hooks, raising the same ``ValidationError``.
+    """
+
+    def __init__(self, fields, validators, partial, raise_unknown, error_messages):
+        self.fields = fields
+        self.validators = validators
+        self.partial = partial
+        self.raise_unknown = raise_unknown
+        self.known_keys = frozenset(key for key, _, _ in fields)
+        self.type_error = error_messages['type']
+        self.unknown_error = error_messages['unknown']
+
+    def __call__(self, data):
+        if not isinstance(data, Mapping):
+            raise ValidationError({'_schema': [self.type_error]}, data=data, valid_data={})
+
+        result = {}
+        errors = {}
+        partial = self.partial
+        for key, attribute, deserialize in self.fields:
+            value = data.get(key, missing)
+            if value is missing and partial:
+                continue
+            try:
+                value = deserialize(value, key, data)
+            except ValidationError as error:
+                errors[key] = error.messages
+                continue
+            if value is not missing:
+                result[attribute] = value
+        if self.raise_unknown:
+            known_keys = self.known_keys
+            for key in data:
+                if key not in known_keys:
+                    errors[key] = [self.unknown_error]
+        for key, attribute, validate in self.validators:
+            if attribute in result:
+                try:
+                    validate(result[attribute])
+                except ValidationError as error:
+                    errors[key] = error.messages
+                    del result[attribute]
+        if errors:
+            raise ValidationError(errors, data=data, valid_data=result)
+        return result
+
+
+def compile_loader(schema):
+    """Compile a ``SchemaLoader`` for ``schema``, or None if it cannot be compiled.
+
+    Single-object schemas, partial as a whole or not at all, with ``unknown``
+    RAISE or EXCLUDE and no hooks other than ``@validates`` are supported;
+    nested fields, dotted attributes, pre/post-load hooks and schema-level
+    validation keep the regular marshmallow path.
+    """
+    if schema.many or schema.partial not in (None, False, True) or schema.unknown not in (RAISE, EXCLUDE):
+        return None
+    if any(names for tag, names in schema._hooks.items() if tag != VALIDATES):
+        return None
+
+    load_fields = []
+    for name, field in schema.load_fields.items():
+        attribute = field.attribute or name
+        if '.' in attribute or isinstance(field, fields.Nested) or isinstance(getattr(field, 'inner', None),
+                                                                                fields.Nested):
+            return None
+        load_fields.append((field.data_key or name, attribute, field.deserialize))
+
+    validators = []
+    for attr_name in schema._hooks[VALIDATES]:
+        method = getattr(schema, attr_name)
+        field_name = method.__marshmallow_hook__[VALIDATES]['field_name']
+        field = schema.load_fields.get(field_name)
+        if field is not None:
+            validators.append((field.data_key or field_name, field.attribute or field_name, method))
+
+    return SchemaLoader(tuple(load_fields), tuple(validators), bool(schema.partial), schema.unknown == RAISE,
+                        schema.error_messages)
@@ -0,0 +1,124 @@
+import time
+from collections import Counter as Tally
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from models import Counter, db
+
+
+class Counters:
+    """Row counts kept in the ``counters`` table, e.g. ``books`` or ``authors``.
+
+    ``track(model, rule, recount)`` registers which counters a row of ``model``
+    counts towards: ``rule(get)`` returns counter names given ``get(attribute)``.
+    ORM inserts, deletes and updates that move a row between counters adjust
+    them within the flush, so they commit or roll back with the rows.
+    Core inserts and deletes report their rows through ``add_rows`` and
+    ``remove_rows``. ``recount()`` returns a statement of exact
+    ``(name, count)`` rows that ``reconcile`` compares the stored values against.
+    """
+
+    def __init__(self):
+        self._rules = {}
+
+    def track(self, model, rule, recount):
+        self._rules[model] = (rule, recount)
+
+    def get(self, session, name):
+        return session.scalar(select(Counter.value).where(Counter.name == name)) or 0
+
+    def add(self, session, deltas):
+        """Add ``{name: delta}`` to the stored counters within the session's transaction."""
+        rows = [{'name': name, 'value': delta} for name, delta in deltas.items() if delta]
+        if not rows:
+            return
+        statement = insert(Counter)
+        statement = statement.on_conflict_do_update(index_elements=['name'],
+                                                    set_={'value': Counter.value + statement.excluded.value})
+        session.execute(statement, rows)
+
+    def add_rows(self, session, model, rows):
+        """Count plain ``rows`` (dicts of column values) inserted into ``model`` outside the ORM."""
+        tracked = self._rules.get(model)
+        if tracked is None:
+            return
+        deltas = Tally()
+        for row in rows:
+            deltas.update(tracked[0](row.get))
+        self.add(session, deltas)
+
+    def remove_rows(self, session, model, rows):
+        """Uncount plain ``rows`` deleted from ``model`` outside the ORM."""
+        tracked = self._rules.get(model)
+        if tracked is None:
+            return
+        deltas = Tally()
+        for row in rows:
+            deltas.subtract(tracked[0](row.get))
+        self.add(session, deltas)
+
+    def reconcile(self, session):
+        """Reset every counter to its exact value and return ``{name: (stored, exact)}`` for those that drifted."""
+        exact = {}
+        for _, recount in self._rules.values():
+            exact.update(session.execute(recount()).all())
+        stored = dict(session.execute(select(Counter.name, Counter.value)).all())
+        drift = {name: (stored.get(name, 0), exact.get(name, 0)) for name in set(stored) | set(exact)
+                 if stored.get(name, 0) != exact.get(name, 0)}
+        self.add(session, {name: exact_value - stored_value for name, (stored_value, exact_value) in drift.items()})
+        return drift
+
+    def _count_flush(self, session, flush_context):
+        deltas = Tally()
+        for instance in session.new:
+            tracked = self._rules.get(type(instance))
+            if tracked is not None:
+                deltas.update(tracked[0](lambda key: getattr(instance, key)))
+        for instance in session.deleted:
+            tracked = self._rules.get(type(instance))
+            if tracked is not None:
+                deltas.subtract(tracked[0](_committed_getter(instance)))
+        for instance in session.dirty:
+            tracked = self._rules.get(type(instance))
+            if tracked is None or not session.is_modified(instance):
+                continue
+            deltas.subtract(tracked[0](_committed_getter(instance)))
+            deltas.update(tracked[0](lambda key: getattr(instance, key)))
+        if any(deltas.values()):
+            self.add(session, deltas)
+
+    def listen(self):
+        event.listen(Session, 'after_flush', self._count_flush)
+
+
+def _committed_getter(instance):
+    attrs = inspect(instance).attrs
+
+    def get(key):
+        history = attrs[key].history
+        return history.deleted[0] if history.deleted else attrs[key].value
+    return get
+
+
+@click.command('reconcile-counts')
+@click.option('--interval', type=float, default=0, help='Repeat every INTERVAL seconds instead of running once.')
+@with_appcontext
+def reconcile_counts_command(interval):
+    """Recompute the stored row counters and report the ones that drifted."""
+    while True:
+        drift = counters.reconcile(db.session)
+        db.session.commit()
+        for name, (stored, exact) in sorted(drift.items()):
+            click.echo('{}: {} -> {}'.format(name, stored, exact))
+        click.echo('{} counters reconciled'.format(len(drift)))
+        if not interval:
+            return
+        time.sleep(interval)
+
+
+counters = Counters()
+counters.listen()
@@ -0,0 +1,60 @@
+import csv
+import datetime
+import io
+
+from flask import Response, stream_with_context
+from flask_restful import reqparse
+
+from helpers.json_helper import encode_json
+
+EXPORT_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+export_parser = reqparse.RequestParser()
+export_parser.add_argument('format', type=str, location='args', required=False, default='ndjson',
+                           choices=tuple(EXPORT_MIMETYPES), help='Export format')
+
+
+def export_response(db_session, statement, export_format, serialize, chunk_size):
+    """Stream the rows of ``statement`` as NDJSON (``serialize(row)`` per line) or CSV.
+
+    Rows are fetched ``chunk_size`` at a time from an open cursor and each chunk
+    is written out before the next one is read, so memory does not grow with
+    the table and the first chunk is sent as soon as it is fetched.
+    """
+    result = db_session.execute(statement.execution_options(yield_per=chunk_size))
+    if export_format == 'csv':
+        chunks = _csv_chunks(result)
+    else:
+        chunks = _ndjson_chunks(result, serialize)
+    return Response(stream_with_context(chunks), mimetype=EXPORT_MIMETYPES[export_format])
+
+
+def _ndjson_chunks(result, serialize):
+    for rows in result.partitions():
+        yield b''.join(encode_json(serialize(row)) for row in rows)
+
+
+def _csv_chunks(result):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(result.keys())
+    for rows in result.partitions():
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def isoformat(value):
+    return value.isoformat() if value is not None else None
@@ -0,0 +1,28 @@
+from functools import lru_cache
+
+from flask import abort
+
+
+def get_fieldset_schema(schema, fields):
+    """Return ``schema`` restricted to the comma separated ``fields``, e.g. ``id,title``.
+
+    Unknown field names abort with 400; the schema's ``optional_fields`` are
+    known but only dumped when listed. The narrowed schema is built once per
+    distinct fieldset, so the derived loader options and row serializers that
+    are cached per schema are reused across requests too.
+    """
+    if not fields:
+        return schema
+    names = frozenset(name.strip() for name in fields.split(',') if name.strip())
+    unknown = names - set(schema.dump_fields) - set(getattr(schema, 'optional_fields', ()))
+    if unknown:
+        return abort(400, description="Unknown fields: {}".format(', '.join(sorted(unknown))))
+    if not names or names == set(schema.dump_fields):
+        return schema
+    return _build_fieldset_schema(schema, names)
+
+
+# Keys are subsets of a schema's dump fields, so the cache stays bounded.
+@lru_cache(maxsize=None)
+def _build_fieldset_schema(schema, names):
+    return type(schema)(only=names, many=schema.many)
@@ -0,0 +1,157 @@
+import csv
+import io
+import json
+import os
+import shutil
+import uuid
+from contextlib import suppress
+from itertools import islice
+
+from marshmallow import ValidationError
+
+from helpers.aggregate_helper import aggregates
+from helpers.counter_helper import counters
+
+MAX_REPORTED_ERRORS = 1000
+SPOOL_BUFFER_SIZE = 1 << 20
+CSV_MIMETYPES = ('text/csv',)
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/json-lines')
+
+
+def iter_records(stream, mimetype):
+    """Yield ``(line, record, error)`` from an NDJSON or CSV byte stream, one row at a time.
+
+    Returns None for unsupported content types.
+    """
+    if mimetype in CSV_MIMETYPES:
+        return _iter_csv(io.TextIOWrapper(stream, encoding='utf-8', newline=''))
+    if mimetype in NDJSON_MIMETYPES:
+        return _iter_ndjson(io.TextIOWrapper(stream, encoding='utf-8'))
+    return None
+
+
+def _iter_ndjson(text):
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, None, {'_schema': ['Invalid JSON.']}
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, {'_schema': ['Invalid input type.']}
+            continue
+        yield line_number, record, None
+
+
+def _iter_csv(text):
+    reader = csv.DictReader(text)
+    for record in reader:
+        # Empty cells mean "not provided", not an empty string.
+        yield reader.line_num, {key: value for key, value in record.items() if key and value not in ('', None)}, None
+
+
+def import_records(db_session, records, schema, model, batch_size, validate_batch=None, after_insert=None):
+    """Validate and insert ``records`` in batches of ``batch_size``.
+
+    Each batch is validated row by row with ``schema``, then as a whole with
+    ``validate_batch(rows)`` (which returns ``{line: errors}`` for rows to reject),
+    inserted with a single executemany and committed on its own together with
+    the row counters and author aggregates, so a bad row only costs itself and
+    memory stays bounded by the batch size.
+    """
+    result = new_import_result()
+    for _, _, values in import_batches(db_session, records, schema, model, batch_size, validate_batch, result):
+        if values:
+            db_session.commit()
+            if after_insert is not None:
+                after_insert(values)
+    return result
+
+
+def new_import_result():
+    return {'inserted': 0, 'failed': 0, 'errors': []}
+
+
+def import_batches(db_session, records, schema, model, batch_size, validate_batch, result):
+    """Write the batches of ``import_records`` without committing them.
+
+    Yields ``(last line, records read, inserted values)`` after each batch and
+    adds its outcome to ``result``; the caller commits before asking for more.
+    """
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+
+        rows = []
+        for line, record, errors in batch:
+            if errors is None:
+                try:
+                    rows.append((line, schema.load(record)))
+                    continue
+                except ValidationError as e:
+                    errors = e.messages
+            _add_error(result, line, errors)
+
+        if rows and validate_batch is not None:
+            rejected = validate_batch(rows)
+            for line, errors in rejected.items():
+                _add_error(result, line, errors)
+            rows = [(line, data) for line, data in rows if line not in rejected]
+
+        values = [data for _, data in rows]
+        if values:
+            db_session.execute(model.__table__.insert(), values)
+            counters.add_rows(db_session, model, values)
+            aggregates.add_rows(db_session, model, values)
+            result['inserted'] += len(values)
+        yield batch[-1][0], len(batch), values
+
+
+def spool_records(stream, directory, mimetype):
+    """Save an uploaded CSV or NDJSON body in ``directory`` for ``import_job`` and return its file name."""
+    os.makedirs(directory, exist_ok=True)
+    name = uuid.uuid4().hex + ('.csv' if mimetype in CSV_MIMETYPES else '.ndjson')
+    with open(os.path.join(directory, name), 'wb') as spooled:
+        shutil.copyfileobj(stream, spooled, SPOOL_BUFFER_SIZE)
+    return name
+
+
+def import_job(db_session, directory, params, state, batch_size, schema, model, validate_batch=None,
+               after_insert=None):
+    """Job task body importing a file saved by ``spool_records``, one committed batch per step.
+
+    ``state`` holds the last line imported and the result so far, so a
+    resumed job skips the lines it already imported. The file is removed
+    once the job ends.
+    """
+    path = os.path.join(directory, params['file'])
+    result = state.get('result') or new_import_result()
+    done_line = state.get('line', 0)
+    try:
+        with open(path, 'rb') as stream:
+            records = (record for record in iter_records(stream, params['mimetype']) if record[0] > done_line)
+            for line, read, values in import_batches(db_session, records, schema, model, batch_size,
+                                                     validate_batch, result):
+                yield {'line': line, 'result': result}, read
+                if values and after_insert is not None:
+                    after_insert(values)
+    except Exception:
+        _remove(path)
+        raise
+    _remove(path)
+    return result
+
+
+def _remove(path):
+    with suppress(FileNotFoundError):
+        os.remove(path)
+
+
+def _add_error(result, line, errors):
+    result['failed'] += 1
+    if len(result['errors']) < MAX_REPORTED_ERRORS:
+        result['errors'].append({'line': line, 'errors': errors})
@@ -0,0 +1,206 @@
+import os
+import socket
+import threading
+import uuid
+
+from sqlalchemy import or_, select, update
+
+from models import Job, current_timestamp, db
+
+# Job statuses; the last two are final.
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+
+
+class Task:
+    def __init__(self, kind, run, params_schema=None, total=None):
+        self.kind = kind
+        self.run = run
+        self.params_schema = params_schema
+        self.total = total
+
+
+class JobRunner:
+    """Runs long catalog operations in the background, on ``JOB_WORKERS`` threads.
+
+    Jobs are rows of the ``jobs`` table, so they outlive the process that
+    queued them. A task is a generator ``run(session, params, state,
+    chunk_size)`` that does one chunk of work per step and yields ``(state,
+    processed)``: the runner then commits the chunk together with ``state``
+    and the progress, so nothing is held open between chunks and a job
+    restarts from its last ``state``. Code after a ``yield`` runs once the
+    chunk is committed. The generator's return value is the job's result.
+
+    A worker claims the oldest queued job with one ``UPDATE``. While running,
+    the job belongs to this runner (``owner``) and each chunk renews its lease;
+    every process can run jobs, and one whose owner stopped reporting for
+    ``JOB_LEASE_SECONDS`` (e.g. it crashed) is claimed again. A stopping runner
+    finishes the chunk in progress and queues its jobs again.
+
+    ``init_app`` only configures the runner: the processes that serve requests
+    call ``start`` and ``stop``, so CLI commands and test apps run no workers.
+    """
+
+    def __init__(self):
+        self.workers = 0
+        self.chunk_size = 1000
+        self.poll_seconds = 1.0
+        self.lease_seconds = 60
+        self.tasks = {}
+        self.app = None
+        self.owner = None
+        self._threads = []
+        self._stopping = False
+        self._signals = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self.reset_stats()
+
+    def task(self, kind, params_schema=None, total=None):
+        """Register the decorated generator as the task run for jobs of ``kind``.
+
+        ``params_schema`` loads the params a client passes when queueing the
+        job and ``total(session, params)`` estimates the units of work, if known.
+        """
+        def register(run):
+            self.tasks[kind] = Task(kind, run, params_schema, total)
+            return run
+        return register
+
+    def init_app(self, app):
+        self.stop()
+        self.app = app
+        self.workers = app.config.get('JOB_WORKERS', 0)
+        self.chunk_size = app.config.get('JOB_CHUNK_SIZE', 1000)
+        self.poll_seconds = app.config.get('JOB_POLL_SECONDS', 1.0)
+        self.lease_seconds = app.config.get('JOB_LEASE_SECONDS', 60)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {'enqueued': 0, 'chunks': 0, 'succeeded': 0, 'failed': 0, 'released': 0}
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def start(self):
+        """Start the worker threads, which pick up queued jobs, including those left by an earlier run."""
+        with self._lock:
+            if self._threads or not self.workers:
+                return
+            self._stopping = False
+            self.owner = '{}:{}:{}'.format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+            self._threads = [threading.Thread(target=self._work, name='job-worker-{}'.format(i), daemon=True)
+                             for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the workers once their current chunks are committed; their jobs are queued again."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+            self._stopping = True
+            self._wakeup.notify_all()
+        for thread in threads:
+            thread.join(timeout)
+
+    def after_fork(self):
+        """Forget the parent's workers in a forked child; ``start`` gives it its own."""
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._threads = []
+
+    def enqueue(self, session, kind, params=None, total=None):
+        """Queue a job of ``kind``, commit it and return it; the response should point at ``GET /api/jobs/<id>``."""
+        job = Job(kind=kind, status=QUEUED, params=params or {}, done=0, total=total)
+        session.add(job)
+        session.commit()
+        with self._lock:
+            self.stats['enqueued'] += 1
+            self._signals += 1
+            self._wakeup.notify()
+        return job
+
+    def _work(self):
+        while True:
+            with self._lock:
+                self._wakeup.wait_for(lambda: self._signals or self._stopping, timeout=self.poll_seconds)
+                if self._stopping:
+                    return
+                self._signals = max(self._signals - 1, 0)
+            # Keep going while there is work, then wait for a signal or the next poll.
+            while not self._stopping:
+                try:
+                    with self.app.app_context():
+                        job_id = self._claim(db.session)
+                        if job_id is None:
+                            break
+                        self._run(db.session, job_id)
+                except Exception:
+                    self.app.logger.exception('Job worker failed')
+                    break
+
+    def _claim(self, session):
+        stale = db.func.strftime('%Y-%m-%d %H:%M:%f000', 'now', '-{} seconds'.format(self.lease_seconds))
+        claimable = (select(Job.id)
+                     .where(or_(Job.status == QUEUED, (Job.status == RUNNING) & (Job.heartbeat_at < stale)))
+                     .order_by(Job.id).limit(1).scalar_subquery())
+        statement = (update(Job).where(Job.id == claimable)
+                     .values(status=RUNNING, owner=self.owner, heartbeat_at=current_timestamp())
+                     .returning(Job.id))
+        job_id = session.scalar(statement, execution_options={'synchronize_session': False})
+        session.commit()
+        return job_id
+
+    def _run(self, session, job_id):
+        job = session.get(Job, job_id)
+        task = self.tasks.get(job.kind)
+        if task is None:
+            self._finish(session, job_id, FAILED, error='Unknown job kind {}'.format(job.kind))
+            return
+        kind, state, done = job.kind, job.state or {}, job.done
+        steps = task.run(session, dict(job.params), dict(state), self.chunk_size)
+        try:
+            while True:
+                try:
+                    state, processed = next(steps)
+                except StopIteration as finished:
+                    self._finish(session, job_id, SUCCEEDED, state=state, done=done, result=finished.value)
+                    return
+                done += processed
+                if not self._checkpoint(session, job_id, state=state, done=done):
+                    # Another runner took the job over; this chunk was rolled back.
+                    steps.close()
+                    return
+                if self._stopping:
+                    steps.close()
+                    self._release(session, job_id)
+                    return
+        except Exception as error:
+            session.rollback()
+            self._finish(session, job_id, FAILED, error='{}: {}'.format(type(error).__name__, error))
+            self.app.logger.exception('Job %s (%s) failed', job_id, kind)
+
+    def _checkpoint(self, session, job_id, **values):
+        """Commit the work done since the last checkpoint with ``values``, if the job is still ours."""
+        statement = (update(Job).where(Job.id == job_id, Job.owner == self.owner)
+                     .values({'heartbeat_at': current_timestamp(), **values}))
+        if session.execute(statement, execution_options={'synchronize_session': False}).rowcount != 1:
+            session.rollback()
+            return False
+        session.commit()
+        with self._lock:
+            self.stats['chunks'] += 1
+        return True
+
+    def _finish(self, session, job_id, status, **values):
+        if self._checkpoint(session, job_id, status=status, owner=None, finished_at=current_timestamp(), **values):
+            with self._lock:
+                self.stats[status] += 1
+
+    def _release(self, session, job_id):
+        if self._checkpoint(session, job_id, status=QUEUED, owner=None, heartbeat_at=None):
+            with self._lock:
+                self.stats['released'] += 1
+
+
+job_runner = JobRunner()
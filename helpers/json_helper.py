@@ -0,0 +1,22 @@
+import json
+
+from flask import make_response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+def encode_json(data):
+    """Encode ``data`` as a newline-terminated JSON document, with orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(data) + '\n').encode()
+
+
+def output_json(data, code, headers=None):
+    """Flask-RESTful representation for ``application/json`` using ``encode_json``."""
+    response = make_response(encode_json(data), code)
+    response.headers.extend(headers or {})
+    return response
@@ -0,0 +1,63 @@
+import hashlib
+import time
+
+from flask_jwt_extended import JWTManager
+
+from helpers.cache_helper import create_backend
+from helpers.metrics_helper import request_metrics
+
+
+class CachingJWTManager(JWTManager):
+    """JWTManager that verifies each distinct token once.
+
+    Decoded claims of verified tokens are kept in a bounded LRU keyed by the
+    token's SHA-256 digest until the token's ``exp``, so clients reusing a token
+    skip signature verification. Type, freshness and blocklist checks still run
+    on every request; call ``revoke`` to drop cached entries early, e.g. when a
+    token is revoked or the signing key rotates. With ``SHARED_CACHE_PATH`` the
+    cache is shared by every worker process, so a revocation reaches them all.
+    """
+
+    def __init__(self, app=None, add_context_processor=False):
+        self.token_cache = None
+        super(CachingJWTManager, self).__init__(app, add_context_processor)
+
+    def init_app(self, app, add_context_processor=False):
+        super(CachingJWTManager, self).init_app(app, add_context_processor)
+        cache_size = app.config.get('JWT_VERIFIED_TOKEN_CACHE_SIZE', 10000)
+        self.token_cache = create_backend(app, 'verified_tokens', max_size=cache_size, ttl=0) if cache_size else None
+
+    def revoke(self, encoded_token=None, jti=None):
+        """Forget cached verifications of ``encoded_token``, of tokens with ``jti``, or of every token."""
+        if self.token_cache is None:
+            return
+        if encoded_token is not None:
+            self.token_cache.delete(_token_key(encoded_token))
+        elif jti is not None:
+            self.token_cache.delete_matching(lambda claims: claims.get('jti') == jti)
+        else:
+            self.token_cache.clear()
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        with request_metrics.timer('auth'):
+            return self._decode_cached(encoded_token, csrf_value, allow_expired)
+
+    def _decode_cached(self, encoded_token, csrf_value, allow_expired):
+        if self.token_cache is None or csrf_value is not None or allow_expired:
+            return super(CachingJWTManager, self)._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        key = _token_key(encoded_token)
+        claims = self.token_cache.get(key)
+        if claims is not None:
+            return dict(claims)
+
+        claims = super(CachingJWTManager, self)._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        if 'exp' in claims:
+            ttl = claims['exp'] - time.time()
+            if ttl > 0:
+                self.token_cache.set(key, dict(claims), ttl=ttl)
+        return claims
+
+
+def _token_key(encoded_token):
+    return hashlib.sha256(encoded_token.encode()).digest()
@@ -0,0 +1,51 @@
+from functools import lru_cache
+
+from marshmallow import fields
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, load_only, selectinload
+
+
+@lru_cache(maxsize=None)
+def get_load_options(model, schema):
+    """Eager-load options for exactly the relationships ``schema`` serializes.
+
+    Every ``Nested`` field backed by a relationship of ``model`` gets a joined
+    load (many-to-one) or a select-in load (collections), restricted to the
+    columns the nested schema dumps, so dumping never falls back to lazy loads.
+    """
+    mapper = inspect(model)
+    options = []
+    for name, field in schema.dump_fields.items():
+        if not isinstance(field, fields.Nested):
+            continue
+        relationship = mapper.relationships.get(field.attribute or name)
+        if relationship is None:
+            continue
+
+        related_model = relationship.mapper.class_
+        loader = selectinload if relationship.uselist else joinedload
+        option = loader(getattr(model, relationship.key))
+
+        nested_schema = field.schema
+        columns = [nested_field.attribute or nested_name for nested_name, nested_field in nested_schema.dump_fields.items()]
+        if all(column in relationship.mapper.column_attrs for column in columns):
+            option = option.load_only(*[getattr(related_model, column) for column in columns])
+        options.append(option.options(*get_load_options(related_model, nested_schema)))
+    return tuple(options)
+
+
+@lru_cache(maxsize=None)
+def get_column_options(model, schema):
+    """``get_load_options`` plus a ``load_only`` on the columns of ``model`` that ``schema`` dumps.
+
+    The version column is always loaded too, as ETags are built from it.
+    """
+    mapper = inspect(model)
+    columns = [field.attribute or name for name, field in schema.dump_fields.items()
+               if not isinstance(field, fields.Nested)]
+    if mapper.version_id_col is not None:
+        columns.append(mapper.get_property_by_column(mapper.version_id_col).key)
+    options = get_load_options(model, schema)
+    if all(column in mapper.column_attrs for column in columns):
+        options = (load_only(*[getattr(model, column) for column in columns]),) + options
+    return options
@@ -0,0 +1,238 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from helpers.cache_helper import create_backend
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BREAKDOWN = (
+    ('sql', 'app_sql_duration_seconds_total', 'Time spent executing SQL statements.'),
+    ('serialize', 'app_serialize_duration_seconds_total', 'Time spent in marshmallow dump.'),
+    ('deserialize', 'app_deserialize_duration_seconds_total', 'Time spent in marshmallow load.'),
+    ('auth', 'app_auth_duration_seconds_total', 'Time spent decoding and verifying JWTs.'),
+    ('hash', 'app_password_hash_duration_seconds_total', 'Time spent waiting for password hashing.'),
+)
+SNAPSHOT_KEY = 'counts'
+
+
+class RequestMetrics:
+    """Per-request timing breakdown and per-endpoint latency histograms.
+
+    Every request updates its endpoint's latency histogram. A sampled share of
+    requests (``METRICS_SAMPLE_RATE``) also times its SQL statements, schema
+    load/dump, JWT verification and password hashing, reports them in a
+    ``Server-Timing`` header and adds them to per-endpoint totals. Everything
+    is served in Prometheus text format at ``/metrics``.
+
+    Each process adds what it counted to a snapshot in ``store`` (shared by
+    every worker with ``SHARED_CACHE_PATH``, see ``create_backend``) at most
+    every ``METRICS_FLUSH_SECONDS``, before it serves ``/metrics`` and when a
+    ``server.py`` worker exits. A scrape thus reports every worker's counts,
+    but those of a worker that has been idle since its last flush only once
+    it flushes again.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.sample_rate = 1.0
+        self.flush_seconds = 1.0
+        self.store = None
+        self._lock = threading.Lock()
+        self._pending = empty_counts()
+        # Last value flushed of every collector sample, which report totals of their own process.
+        self._collected = {}
+        self._flush_at = 0.0
+        self._collectors = []
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        self.sample_rate = app.config.get('METRICS_SAMPLE_RATE', 1.0)
+        self.flush_seconds = app.config.get('METRICS_FLUSH_SECONDS', 1.0)
+        with self._lock:
+            self._pending = empty_counts()
+            self._collected = {}
+        self._collectors = []
+        self.store = None
+        if not self.enabled:
+            return
+
+        self.store = create_backend(app, 'metrics', max_size=1, ttl=0)
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view)
+        with app.app_context():
+            self.instrument_engine(app.extensions['sqlalchemy'].engine)
+
+    def instrument_engine(self, engine):
+        """Count and time the statements ``engine`` runs during sampled requests."""
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def add_collector(self, collector):
+        """Register ``collector()`` returning ``[(name, type, help, value)]`` extra samples for /metrics."""
+        self._collectors.append(collector)
+
+    @contextmanager
+    def timer(self, name):
+        """Add the time spent in the block to ``name``; nested timers of the same name count once."""
+        timings = g.get('request_timings') if has_request_context() else None
+        if timings is None or timings['depth'].get(name):
+            yield
+            return
+        timings['depth'][name] = 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+            timings['depth'][name] = 0
+
+    def _start_request(self):
+        g.request_started = time.perf_counter()
+        if self.sample_rate >= 1 or random.random() < self.sample_rate:
+            g.request_timings = {'depth': {}, 'sql_statements': 0}
+
+    def _finish_request(self, response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        duration = time.perf_counter() - started
+        key = (request.endpoint or 'unmatched', request.method)
+        timings = g.pop('request_timings', None)
+
+        with self._lock:
+            histogram = self._pending['histograms'].get(key)
+            if histogram is None:
+                histogram = self._pending['histograms'][key] = new_histogram()
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += duration
+            histogram['count'] += 1
+
+            if timings is not None:
+                totals = self._pending['totals'].setdefault(key, {'sampled': 0, 'sql_statements': 0})
+                totals['sampled'] += 1
+                totals['sql_statements'] += timings['sql_statements']
+                for name, _, _ in BREAKDOWN:
+                    totals[name] = totals.get(name, 0.0) + timings.get(name, 0.0)
+            flush = time.monotonic() >= self._flush_at
+
+        if flush:
+            try:
+                self.flush()
+            except Exception:
+                current_app.logger.exception('Could not flush request metrics')
+        if timings is not None:
+            parts = ['{};dur={:.3f}'.format(name, timings[name] * 1000) + (
+                ';desc="{} queries"'.format(timings['sql_statements']) if name == 'sql' else '')
+                     for name, _, _ in BREAKDOWN if name in timings]
+            parts.append('total;dur={:.3f}'.format(duration * 1000))
+            response.headers['Server-Timing'] = ', '.join(parts)
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and g.get('request_timings') is not None:
+            context._metrics_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        if started is None:
+            return
+        timings = g.get('request_timings')
+        if timings is not None:
+            timings['sql'] = timings.get('sql', 0.0) + time.perf_counter() - started
+            timings['sql_statements'] += 1
+
+    def _metrics_view(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def flush(self):
+        """Add what this process counted since its last flush to the snapshot in ``store``."""
+        if self.store is None:
+            return
+        samples = [sample for collector in self._collectors for sample in collector()]
+        with self._lock:
+            pending, self._pending = self._pending, empty_counts()
+            for name, metric_type, description, value in samples:
+                last = self._collected.get(name, 0)
+                # A total below the last one was reset, e.g. by init_app; it all counts as new.
+                pending['counters'][name] = (metric_type, description, value - last if value >= last else value)
+                self._collected[name] = value
+            self._flush_at = time.monotonic() + self.flush_seconds
+        try:
+            self.store.update(SNAPSHOT_KEY, lambda counts: combine_counts(counts or empty_counts(), pending))
+        except BaseException:
+            with self._lock:
+                self._pending = combine_counts(pending, self._pending)
+            raise
+
+    def clear(self):
+        """Start counting from zero, in this process and in ``store``."""
+        if self.store is None:
+            return
+        self.flush()
+        self.store.delete(SNAPSHOT_KEY)
+
+    def render(self):
+        self.flush()
+        counts = self.store.get(SNAPSHOT_KEY) or empty_counts()
+        histograms, totals = counts['histograms'], counts['totals']
+
+        lines = ['# HELP http_request_duration_seconds Request latency by endpoint and method.',
+                 '# TYPE http_request_duration_seconds histogram']
+        for (endpoint, method), histogram in sorted(histograms.items()):
+            labels = 'endpoint="{}",method="{}"'.format(endpoint, method)
+            for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+                lines.append('http_request_duration_seconds_bucket{{{},le="{}"}} {}'.format(labels, bound, count))
+            lines.append('http_request_duration_seconds_bucket{{{},le="+Inf"}} {}'.format(labels, histogram['count']))
+            lines.append('http_request_duration_seconds_sum{{{}}} {:.6f}'.format(labels, histogram['sum']))
+            lines.append('http_request_duration_seconds_count{{{}}} {}'.format(labels, histogram['count']))
+
+        counters = [('sampled', 'app_sampled_requests_total', 'Requests with a timing breakdown.'),
+                    ('sql_statements', 'app_sql_statements_total', 'SQL statements executed by sampled requests.')]
+        for field, name, description in counters + list(BREAKDOWN):
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} counter'.format(name))
+            for (endpoint, method), total in sorted(totals.items()):
+                lines.append('{}{{endpoint="{}",method="{}"}} {}'.format(name, endpoint, method, total.get(field, 0)))
+
+        for name, (metric_type, description, value) in counts['counters'].items():
+            lines.extend(['# HELP {} {}'.format(name, description), '# TYPE {} {}'.format(name, metric_type),
+                          '{} {}'.format(name, value)])
+        return '\n'.join(lines) + '\n'
+
+
+def empty_counts():
+    return {'histograms': {}, 'totals': {}, 'counters': {}}
+
+
+def new_histogram():
+    return {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0}
+
+
+def combine_counts(*counts):
+    """New counts, shaped like ``empty_counts()``, holding the sums of ``counts``."""
+    combined = empty_counts()
+    for part in counts:
+        for key, histogram in part['histograms'].items():
+            target = combined['histograms'].setdefault(key, new_histogram())
+            target['buckets'] = [a + b for a, b in zip(target['buckets'], histogram['buckets'])]
+            target['sum'] += histogram['sum']
+            target['count'] += histogram['count']
+        for key, totals in part['totals'].items():
+            target = combined['totals'].setdefault(key, {})
+            for field, value in totals.items():
+                target[field] = target.get(field, 0) + value
+        for name, (metric_type, description, value) in part['counters'].items():
+            total = combined['counters'].get(name, (metric_type, description, 0))[2]
+            combined['counters'][name] = (metric_type, description, total + value)
+    return combined
+
+
+request_metrics = RequestMetrics()
@@ -1,6 +1,93 @@
-def get_paginated_items(query, page, per_page):
+import base64
+import datetime
+import json
+
+from flask import abort
+from sqlalchemy import and_, or_
+
+
+def get_paginated_items(query, page, per_page, lookahead=0):
     offset = (page - 1) * per_page
-    limited_query = query.offset(offset).limit(per_page)
+    limited_query = query.offset(offset).limit(per_page + lookahead)
     paginated_items = limited_query.all()
 
     return paginated_items
+
+
+def get_ordered_query(query, sort, sort_column, id_column):
+    if sort.startswith('-'):
+        order = [sort_column.desc(), id_column.desc()]
+    else:
+        order = [sort_column.asc(), id_column.asc()]
+    if sort_column is id_column:
+        order = order[1:]
+    return query.order_by(*order)
+
+
+def get_keyset_items(query, sort, sort_column, id_column, per_page, cursor=None):
+    """Return one page after ``cursor`` plus the cursor of the next page.
+
+    Rows are ordered by ``(sort_column, id_column)``, so the cursor only has to
+    remember the last row's sort value and id and the database can seek straight
+    to it through an index instead of skipping rows like ``OFFSET`` does.
+    """
+    descending = sort.startswith('-')
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        query = query.filter(_after_filter(sort_column, id_column, _from_json(sort_column, value), last_id, descending))
+
+    items = get_ordered_query(query, sort, sort_column, id_column).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        last_item = items[-1]
+        next_cursor = encode_cursor(sort, getattr(last_item, sort_column.key), getattr(last_item, id_column.key))
+
+    return items, next_cursor
+
+
+def encode_cursor(sort, value, id):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        value = value.isoformat()
+    payload = json.dumps([sort, value, id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, value, id = json.loads(payload)
+    except (ValueError, TypeError):
+        return abort(400, description="Invalid cursor")
+    if cursor_sort != sort:
+        return abort(400, description="Cursor was issued for sort {}".format(cursor_sort))
+    return value, id
+
+
+def _from_json(column, value):
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type in (datetime.date, datetime.datetime):
+        try:
+            return python_type.fromisoformat(value)
+        except (TypeError, ValueError):
+            return abort(400, description="Invalid cursor")
+    return value
+
+
+def _after_filter(sort_column, id_column, value, last_id, descending):
+    # SQLite sorts NULLs first in ascending order and last in descending order.
+    if descending:
+        if value is None:
+            return and_(sort_column.is_(None), id_column < last_id)
+        return or_(sort_column < value,
+                   and_(sort_column == value, id_column < last_id),
+                   sort_column.is_(None))
+    if value is None:
+        return or_(and_(sort_column.is_(None), id_column > last_id), sort_column.isnot(None))
+    return or_(sort_column > value, and_(sort_column == value, id_column > last_id))
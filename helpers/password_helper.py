@@ -0,0 +1,104 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+from helpers.metrics_helper import request_metrics
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full or a hash timed out; callers should answer 429."""
+
+
+class PasswordHasher:
+    """Runs password hashing on a bounded process pool.
+
+    Hashing is deliberately CPU-heavy; running it in worker processes keeps a
+    login burst from starving request threads of the GIL. At most
+    ``max_pending`` hashes may be queued or running at once, further calls
+    raise HasherBusy immediately instead of piling up. A caller that waited
+    ``timeout`` seconds gets HasherBusy too, while its hash keeps its slot
+    until the pool is done with it. ``workers=0`` hashes inline in the
+    calling thread.
+    """
+
+    def __init__(self):
+        self.method = 'scrypt'
+        self.workers = 0
+        self.max_pending = 0
+        self.timeout = None
+        self._slots = None
+        self._executor = None
+        self._method_prefix = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.shutdown()
+        self.method = app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 0)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', 4 * max(self.workers, 1))
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT_SECONDS', 30)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._method_prefix = expand_method(self.method)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """Whether ``pwhash`` was made with other parameters than the configured method."""
+        return pwhash.split('$', 1)[0] != self._method_prefix
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def after_fork(self):
+        """Forget the pool in a forked child; its processes belong to the parent."""
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            with request_metrics.timer('hash'):
+                return fn(*args)
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            with request_metrics.timer('hash'):
+                return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HasherBusy() from None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: the app process already runs threads.
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+
+def expand_method(method):
+    """``method`` with the defaults werkzeug fills in, as hashes start with it, e.g. ``scrypt:32768:8:1``."""
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        return 'scrypt:{}:8:1'.format(2 ** 15)
+    if name == 'pbkdf2' and len(args) < 2:
+        return 'pbkdf2:{}:{}'.format(args[0] if args else 'sha256', DEFAULT_PBKDF2_ITERATIONS)
+    return method
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,204 @@
+import hashlib
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import click
+from flask import g, has_app_context, request
+from flask.cli import with_appcontext
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+
+from helpers.cache_helper import create_backend, response_cache
+from helpers.metrics_helper import request_metrics
+from helpers.sqlite_helper import apply_sqlite_pragmas
+
+READ_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+
+def create_replica_engine(app, uri):
+    """Engine for ``uri``, resolving relative SQLite paths against the instance folder like ``DATABASE_URI``."""
+    url = make_url(uri)
+    if url.drivername.startswith('sqlite') and url.database not in (None, '', ':memory:') \
+            and not os.path.isabs(url.database):
+        os.makedirs(app.instance_path, exist_ok=True)
+        url = url.set(database=os.path.join(app.instance_path, url.database))
+    return create_engine(url)
+
+
+class ReplicaRouter:
+    """Routes read requests to read replicas and everything else to the primary.
+
+    Each GET request picks a healthy replica round-robin; writes, flushes and
+    DML always use the primary. A client that wrote something reads from the
+    primary for ``REPLICA_STICKY_SECONDS`` afterwards (clients are told apart
+    by their Authorization header, or address). Response cache fills always
+    read the primary: a cached body is served to every client until a write
+    invalidates it, so it must not carry a replica's lag. Recent writers are
+    kept in ``writers``, which ``SHARED_CACHE_PATH`` shares between worker
+    processes. A replica that fails a health check or a query is skipped for
+    ``REPLICA_RETRY_SECONDS``; a query that failed on it runs again on the
+    primary.
+    """
+
+    def __init__(self):
+        self.replicas = []
+        self.sticky_seconds = 0
+        self.retry_seconds = 0
+        self.writers = None
+        self._cycle = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        for replica in self.replicas:
+            replica.engine.dispose()
+        self.replicas = [Replica(create_replica_engine(app, uri)) for uri in app.config.get('REPLICA_DATABASE_URIS', [])]
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 5)
+        self.retry_seconds = app.config.get('REPLICA_RETRY_SECONDS', 30)
+        self.writers = create_backend(app, 'replica_writers', max_size=100000, ttl=self.sticky_seconds)
+        self._cycle = itertools.cycle(self.replicas)
+        app.cli.add_command(replicate_command)
+        if not self.replicas:
+            response_cache.fill_guard = None
+            return
+
+        pragmas = dict(app.config.get('SQLITE_PRAGMAS', {}), query_only='1')
+        for replica in self.replicas:
+            apply_sqlite_pragmas(replica.engine, pragmas)
+            if request_metrics.enabled:
+                request_metrics.instrument_engine(replica.engine)
+        app.before_request(self._route_request)
+        app.after_request(self._record_write)
+        response_cache.fill_guard = self.primary
+
+    def read_engine(self):
+        """The replica engine the current request reads from, or None for the primary."""
+        return g.get('read_engine') if has_app_context() else None
+
+    @contextmanager
+    def primary(self):
+        """Read from the primary within the block."""
+        engine = g.pop('read_engine', None)
+        try:
+            yield
+        finally:
+            if engine is not None:
+                g.read_engine = engine
+
+    def mark_down(self, engine):
+        """Skip the replica of ``engine`` for ``REPLICA_RETRY_SECONDS``."""
+        for replica in self.replicas:
+            if replica.engine is engine:
+                replica.down_until = time.monotonic() + self.retry_seconds
+
+    def _route_request(self):
+        replica = None
+        if request.method in READ_METHODS and self.writers.get(self._client_key()) is None:
+            replica = self._pick()
+        g.read_engine = replica.engine if replica is not None else None
+
+    def _record_write(self, response):
+        if request.method not in READ_METHODS and response.status_code < 400:
+            self.writers.set(self._client_key(), True)
+        return response
+
+    def _client_key(self):
+        client = request.headers.get('Authorization') or request.remote_addr or ''
+        return hashlib.sha256(client.encode()).digest()
+
+    def _pick(self):
+        with self._lock:
+            candidates = [next(self._cycle) for _ in self.replicas]
+        for replica in candidates:
+            if replica.is_healthy(self.retry_seconds):
+                return replica
+        return None
+
+
+class Replica:
+    def __init__(self, engine):
+        self.engine = engine
+        self.down_until = 0.0
+        self.checked_at = float('-inf')
+
+    def is_healthy(self, retry_seconds):
+        now = time.monotonic()
+        if now < self.down_until:
+            return False
+        if now - self.checked_at < retry_seconds:
+            return True
+        self.checked_at = now
+        try:
+            with self.engine.connect() as connection:
+                connection.exec_driver_sql('SELECT 1 FROM schema_version LIMIT 1')
+        except Exception:
+            self.down_until = now + retry_seconds
+            return False
+        return True
+
+
+class RoutingSession(Session):
+    """Session that sends the reads of a routed request to its replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False):
+            engine = replica_router.read_engine()
+            if engine is not None:
+                return engine
+        return super(RoutingSession, self).get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def fall_back_to_primary(orm_execute_state):
+    """Run a read that fails on its replica again on the primary, as does the rest of the request."""
+    engine = replica_router.read_engine()
+    if engine is None or not orm_execute_state.is_select:
+        return None
+    try:
+        return orm_execute_state.invoke_statement()
+    except DBAPIError:
+        replica_router.mark_down(engine)
+        g.pop('read_engine', None)
+        return orm_execute_state.invoke_statement()
+
+
+def copy_sqlite_database(source_path, target_path):
+    """Copy a live SQLite database into ``target_path`` with the online backup API.
+
+    The copy goes through SQLite's locking, so readers of the target see either
+    the old or the new contents, never a torn file.
+    """
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+@click.command('replicate')
+@click.option('--interval', type=float, default=0, help='Repeat every INTERVAL seconds instead of copying once.')
+@with_appcontext
+def replicate_command(interval):
+    """Copy the primary SQLite database over every configured replica."""
+    from models import db
+
+    if not replica_router.replicas:
+        raise click.ClickException('No REPLICA_DATABASE_URIS configured.')
+    source_path = db.engine.url.database
+    while True:
+        for replica in replica_router.replicas:
+            copy_sqlite_database(source_path, replica.engine.url.database)
+            click.echo('{} -> {}'.format(source_path, replica.engine.url.database))
+        if not interval:
+            return
+        time.sleep(interval)
+
+
+replica_router = ReplicaRouter()
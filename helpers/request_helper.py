@@ -1,8 +1,8 @@
 from flask import abort
 
 
-def get_entity_or_404(db_session, model, id):
-    entity = db_session.get(model, id)
+def get_entity_or_404(db_session, model, id, options=None):
+    entity = db_session.get(model, id, options=options)
     if not entity:
         return abort(404, description="Entity {} doesn't exist".format(id))
     return entity
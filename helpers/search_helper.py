@@ -0,0 +1,71 @@
+import re
+
+from sqlalchemy import DDL, column, event, table
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchIndex:
+    """SQLite FTS5 index over some text columns of a model table.
+
+    The index is an external-content FTS5 table, so it stores only the inverted
+    index; triggers on the model table keep it in sync with every insert, update
+    and delete, whether it goes through the ORM or a bulk Core statement.
+    """
+
+    def __init__(self, model_table, columns, id_column='id'):
+        self.model_table = model_table
+        self.columns = columns
+        self.id_column = id_column
+        self.name = '{}_fts'.format(model_table.name)
+        self.table = table(self.name, column('rowid'), column('rank'), column(self.name))
+
+    def create_statements(self):
+        source = self.model_table.name
+        columns = ', '.join(self.columns)
+        new_values = ', '.join('new.{}'.format(c) for c in self.columns)
+        old_values = ', '.join('old.{}'.format(c) for c in self.columns)
+        insert_new = "INSERT INTO {0}(rowid, {1}) VALUES (new.{2}, {3});".format(
+            self.name, columns, self.id_column, new_values)
+        delete_old = "INSERT INTO {0}({0}, rowid, {1}) VALUES ('delete', old.{2}, {3});".format(
+            self.name, columns, self.id_column, old_values)
+        return [
+            "CREATE VIRTUAL TABLE IF NOT EXISTS {0} USING fts5({1}, content='{2}', content_rowid='{3}', "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')".format(self.name, columns, source, self.id_column),
+            "CREATE TRIGGER IF NOT EXISTS {0}_ai AFTER INSERT ON {1} BEGIN {2} END".format(
+                self.name, source, insert_new),
+            "CREATE TRIGGER IF NOT EXISTS {0}_ad AFTER DELETE ON {1} BEGIN {2} END".format(
+                self.name, source, delete_old),
+            "CREATE TRIGGER IF NOT EXISTS {0}_au AFTER UPDATE OF {1} ON {2} BEGIN {3} {4} END".format(
+                self.name, columns, source, delete_old, insert_new),
+        ]
+
+    def rebuild_statement(self):
+        return "INSERT INTO {0}({0}) VALUES ('rebuild')".format(self.name)
+
+    def drop_statement(self):
+        return "DROP TABLE IF EXISTS {}".format(self.name)
+
+    def register(self):
+        """Create and drop the index together with its model table."""
+        for statement in self.create_statements():
+            event.listen(self.model_table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+        event.listen(self.model_table, 'after_drop', DDL(self.drop_statement()).execute_if(dialect='sqlite'))
+
+    def matches(self, q):
+        """Subquery of ``(id, search_rank)`` for rows matching ``q``, or None for an empty query."""
+        expression = build_match_expression(q)
+        if expression is None:
+            return None
+        return (self.table.select()
+                .with_only_columns(self.table.c.rowid.label('id'), self.table.c.rank.label('search_rank'))
+                .where(self.table.c[self.name].match(expression))
+                .subquery('search'))
+
+
+def build_match_expression(q):
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    tokens = TOKEN_RE.findall(q or '')
+    if not tokens:
+        return None
+    return ' '.join('"{}"*'.format(token) for token in tokens)
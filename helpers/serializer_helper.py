@@ -0,0 +1,103 @@
+from functools import lru_cache
+
+from marshmallow import fields
+from sqlalchemy import inspect
+from sqlalchemy.orm import aliased
+
+from helpers.metrics_helper import request_metrics
+
+# Fields whose dumped value is the column value itself.
+PASSTHROUGH_FIELDS = (fields.Integer, fields.String, fields.Boolean)
+
+
+class RowSerializer:
+    """Dumps result rows the way ``schema.dump`` dumps model instances.
+
+    The list of ``columns`` to select and a plain function turning one row
+    tuple into the output dict are generated once from the schema, so a page
+    is serialized without building ORM instances or walking marshmallow fields.
+    Many-to-one ``Nested`` fields are read through an outer join.
+    """
+
+    def __init__(self, columns, joins, dump_row):
+        self.columns = columns
+        self.joins = joins
+        self.dump_row = dump_row
+
+    def select(self, query, *extra_columns):
+        """Turn an entity ``query`` into one selecting just the serialized columns."""
+        for target, on in self.joins:
+            query = query.outerjoin(target, on)
+        return query.with_entities(*self.columns, *extra_columns)
+
+    def dump(self, rows):
+        with request_metrics.timer('serialize'):
+            dump_row = self.dump_row
+            return [dump_row(row) for row in rows]
+
+
+@lru_cache(maxsize=None)
+def get_row_serializer(model, schema):
+    """Compile a ``RowSerializer`` for ``schema`` over ``model``, or None if it cannot be compiled.
+
+    Only columns dumped as-is, ``Date``/``DateTime`` fields and many-to-one
+    nested schemas made of those are supported; anything else (methods,
+    functions, collections, custom fields) keeps the regular marshmallow path.
+    """
+    compiler = _Compiler()
+    body = compiler.compile_schema(model, schema, prefix='')
+    if body is None:
+        return None
+    source = 'def dump_row(row):\n    return {}\n'.format(body)
+    namespace = {}
+    exec(compile(source, '<row serializer {}>'.format(model.__name__), 'exec'), namespace)
+    return RowSerializer(compiler.columns, compiler.joins, namespace['dump_row'])
+
+
+class _Compiler:
+    def __init__(self):
+        self.columns = []
+        self.joins = []
+
+    def add_column(self, column, label):
+        self.columns.append(column.label(label))
+        return 'row[{}]'.format(len(self.columns) - 1)
+
+    def compile_schema(self, model, schema, prefix):
+        mapper = inspect(model).mapper
+        items = []
+        for name, field in schema.dump_fields.items():
+            attribute = field.attribute or name
+            if isinstance(field, fields.Nested):
+                expression = self.compile_nested(model, mapper, attribute, field, prefix)
+            else:
+                expression = self.compile_field(model, mapper, attribute, field, prefix)
+            if expression is None:
+                return None
+            items.append('{!r}: {}'.format(field.data_key or name, expression))
+        return '{' + ', '.join(items) + '}'
+
+    def compile_field(self, model, mapper, attribute, field, prefix):
+        if attribute not in mapper.column_attrs:
+            return None
+        value = self.add_column(getattr(model, attribute), prefix + attribute)
+        if type(field) in PASSTHROUGH_FIELDS:
+            return value
+        if type(field) in (fields.Date, fields.DateTime) and field.format in (None, 'iso'):
+            return '(None if {0} is None else {0}.isoformat())'.format(value)
+        return None
+
+    def compile_nested(self, model, mapper, attribute, field, prefix):
+        relationship = mapper.relationships.get(attribute)
+        if relationship is None or relationship.uselist or field.many:
+            return None
+        related = aliased(relationship.mapper.class_)
+        self.joins.append((related, getattr(model, relationship.key).of_type(related)))
+
+        # A missing related row shows up as a NULL primary key.
+        primary_key = relationship.mapper.primary_key[0]
+        present = self.add_column(getattr(related, primary_key.key), '{}{}__{}'.format(prefix, attribute, primary_key.key))
+        body = self.compile_schema(related, field.schema, '{}{}__'.format(prefix, attribute))
+        if body is None:
+            return None
+        return '(None if {} is None else {})'.format(present, body)
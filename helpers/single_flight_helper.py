@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs concurrent calls with the same key once and hands the result to every caller.
+
+    The first caller of ``do(key, fn)`` runs ``fn``; callers arriving with the
+    same key while it runs wait for it and get the same result, or the same
+    exception. A caller that waits longer than ``SINGLE_FLIGHT_TIMEOUT_SECONDS``
+    gives up and runs ``fn`` itself. Calls made on an event loop thread (the
+    ASGI server) never wait, since blocking there would stall the leader too.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.timeout = 5.0
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SINGLE_FLIGHT_ENABLED', True)
+        self.timeout = app.config.get('SINGLE_FLIGHT_TIMEOUT_SECONDS', 5.0)
+        with self._lock:
+            self._flights = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {'leaders': 0, 'coalesced': 0, 'timeouts': 0, 'errors': 0}
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self._flights)
+        return stats
+
+    def do(self, key, fn):
+        if not self.enabled or on_event_loop():
+            return fn()
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+                self.stats['leaders'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            if not flight.done.wait(self.timeout):
+                self._count('timeouts')
+                return fn()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            self._count('errors')
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+
+def on_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,22 @@
+import re
+
+from sqlalchemy import event
+
+PRAGMA_VALUE_RE = re.compile(r'^-?\w+$')
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run ``PRAGMA name = value`` for every configured pragma on each new connection."""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = {name: value for name, value in pragmas.items() if value not in (None, '')}
+    for name, value in pragmas.items():
+        if not PRAGMA_VALUE_RE.match(str(value)):
+            raise ValueError('Invalid value {!r} for PRAGMA {}'.format(value, name))
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+        cursor.close()
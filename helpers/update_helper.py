@@ -0,0 +1,51 @@
+from flask import abort, request
+from sqlalchemy import select, update
+
+from helpers.cache_helper import etag_version
+
+
+def get_expected_version(data):
+    """``(version, status)`` a write must find, or ``(None, None)`` for an unconditional write.
+
+    The version comes from a ``version`` in the body ``data`` (removed from it),
+    answered with 409 on a mismatch, or from an ``If-Match`` ETag made by
+    ``make_etag``, answered with 412 like any failed precondition.
+    """
+    if isinstance(data, dict) and 'version' in data:
+        version = data.pop('version')
+        if not isinstance(version, int) or isinstance(version, bool):
+            return abort(400, description="version must be an integer")
+        return version, 409
+    if not request.if_match or request.if_match.star_tag:
+        return None, None
+    versions = {etag_version(etag) for etag in request.if_match.as_set(include_weak=True)}
+    if len(versions) != 1 or None in versions:
+        return abort(412, description="If-Match must name one version of the entity")
+    return versions.pop(), 412
+
+
+def update_or_abort(session, model, id, values, expected=(None, None), where=(), returning=()):
+    """Update one row with a single ``UPDATE ... WHERE id = ? AND version = ? RETURNING ...``.
+
+    ``values`` are set and the version is bumped. The ``returning`` columns of
+    the updated row are returned. If nothing matched, one more query tells
+    apart a missing row (404), a version conflict (``expected`` status) and a
+    failed extra ``where`` criterion, which the caller handles (None).
+    """
+    table = model.__table__
+    version, status = expected
+    criteria = [table.c.id == id, *where]
+    if version is not None:
+        criteria.append(table.c.version == version)
+    statement = (update(table).where(*criteria).values({**values, 'version': table.c.version + 1})
+                 .returning(*returning))
+    row = session.execute(statement).first()
+    if row is not None:
+        return row
+
+    current = session.scalar(select(table.c.version).where(table.c.id == id))
+    if current is None:
+        return abort(404, description="Entity {} doesn't exist".format(id))
+    if version is not None and current != version:
+        return abort(status, description="Entity {} is at version {}, not {}".format(id, current, version))
+    return None
@@ -0,0 +1,69 @@
+"""Versioned schema migrations.
+
+Every migration is a ``vNNN_<name>.py`` module with an ``upgrade(connection)``
+function and is listed in ``MIGRATIONS``. ``upgrade(engine)`` creates a fresh
+database straight from the models and stamps it with the latest version; an
+existing database gets every migration newer than its ``schema_version``
+applied in order, in a single transaction. A database already at ``HEAD``
+costs a single query, without schema introspection.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import func, inspect, select
+from sqlalchemy.exc import OperationalError
+
+from migrations import (v001_indexes_and_search, v002_counters, v003_change_feed, v004_author_aggregates,
+                        v005_versions, v006_jobs)
+from models import Book, SchemaVersion, db
+
+MIGRATIONS = [
+    (1, v001_indexes_and_search.upgrade),
+    (2, v002_counters.upgrade),
+    (3, v003_change_feed.upgrade),
+    (4, v004_author_aggregates.upgrade),
+    (5, v005_versions.upgrade),
+    (6, v006_jobs.upgrade),
+]
+HEAD = MIGRATIONS[-1][0]
+
+
+def upgrade(engine):
+    """Bring the database behind ``engine`` to ``HEAD`` and return the versions applied."""
+    if is_current(engine):
+        return []
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        if not inspector.has_table(Book.__tablename__):
+            db.metadata.create_all(connection)
+            _stamp(connection, [version for version, _ in MIGRATIONS])
+            return []
+
+        if not inspector.has_table(SchemaVersion.__tablename__):
+            SchemaVersion.__table__.create(connection)
+        current = get_version(connection)
+
+        pending = [(version, migration) for version, migration in MIGRATIONS if version > current]
+        for version, migration in pending:
+            migration(connection)
+            _stamp(connection, [version])
+        return [version for version, _ in pending]
+
+
+def is_current(engine):
+    """Whether the database behind ``engine`` is already at ``HEAD``."""
+    try:
+        with engine.connect() as connection:
+            return get_version(connection) == HEAD
+    except OperationalError:
+        # No schema_version table yet.
+        return False
+
+
+def get_version(connection):
+    return connection.scalar(select(func.coalesce(func.max(SchemaVersion.version), 0)))
+
+
+def _stamp(connection, versions):
+    applied_at = datetime.now(timezone.utc)
+    connection.execute(SchemaVersion.__table__.insert(),
+                       [{'version': version, 'applied_at': applied_at} for version in versions])
@@ -0,0 +1,21 @@
+"""Index the columns list endpoints filter and sort by, and add the FTS5 search indexes."""
+from sqlalchemy import text
+
+from models import author_search_index, book_search_index
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_books_author_id ON books (author_id)",
+    "CREATE INDEX IF NOT EXISTS ix_books_isbn ON books (isbn)",
+    "CREATE INDEX IF NOT EXISTS ix_books_title ON books (title)",
+    "CREATE INDEX IF NOT EXISTS ix_books_publication_date ON books (publication_date)",
+    "CREATE INDEX IF NOT EXISTS ix_author_last_name ON author (last_name)",
+]
+
+
+def upgrade(connection):
+    for statement in INDEXES:
+        connection.execute(text(statement))
+    for search_index in (author_search_index, book_search_index):
+        for statement in search_index.create_statements():
+            connection.execute(text(statement))
+        connection.execute(text(search_index.rebuild_statement()))
@@ -0,0 +1,17 @@
+"""Add the counters table behind list totals and fill it from the current rows."""
+from sqlalchemy import text
+
+from models import Counter
+
+BACKFILL = [
+    "INSERT INTO counters (name, value) SELECT 'books', COUNT(*) FROM books",
+    "INSERT INTO counters (name, value) SELECT 'authors', COUNT(*) FROM author",
+    "INSERT INTO counters (name, value) SELECT 'author_books:' || author_id, COUNT(*) FROM books "
+    "WHERE author_id IS NOT NULL GROUP BY author_id",
+]
+
+
+def upgrade(connection):
+    Counter.__table__.create(connection, checkfirst=True)
+    for statement in BACKFILL:
+        connection.execute(text(statement))
@@ -0,0 +1,19 @@
+"""Add created_at/updated_at to authors and books and the tombstones table behind the change feed."""
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from models import Tombstone
+
+TABLES = ('author', 'books')
+
+
+def upgrade(connection):
+    # SQLite only adds NOT NULL columns with a constant default; existing rows count as changed now.
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S.%f')
+    for table in TABLES:
+        for column in ('created_at', 'updated_at'):
+            connection.execute(text("ALTER TABLE {0} ADD COLUMN {1} DATETIME NOT NULL DEFAULT '{2}'".format(
+                table, column, now)))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS ix_{0}_{1} ON {0} ({1})".format(table, column)))
+    Tombstone.__table__.create(connection, checkfirst=True)
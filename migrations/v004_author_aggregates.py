@@ -0,0 +1,17 @@
+"""Add the book summary columns to authors, fill them, and drop the per-author counters they replace."""
+from sqlalchemy import text
+
+STATEMENTS = [
+    "ALTER TABLE author ADD COLUMN book_count INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE author ADD COLUMN first_publication_date DATE",
+    "ALTER TABLE author ADD COLUMN last_publication_date DATE",
+    "UPDATE author SET book_count = (SELECT COUNT(*) FROM books WHERE books.author_id = author.id), "
+    "first_publication_date = (SELECT MIN(publication_date) FROM books WHERE books.author_id = author.id), "
+    "last_publication_date = (SELECT MAX(publication_date) FROM books WHERE books.author_id = author.id)",
+    "DELETE FROM counters WHERE name LIKE 'author_books:%'",
+]
+
+
+def upgrade(connection):
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
@@ -0,0 +1,12 @@
+"""Add the version column that optimistic concurrency checks compare against."""
+from sqlalchemy import text
+
+STATEMENTS = [
+    "ALTER TABLE author ADD COLUMN version INTEGER NOT NULL DEFAULT 1",
+    "ALTER TABLE books ADD COLUMN version INTEGER NOT NULL DEFAULT 1",
+]
+
+
+def upgrade(connection):
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
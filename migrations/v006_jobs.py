@@ -0,0 +1,6 @@
+"""Add the jobs table behind the background job runner."""
+from models import Job
+
+
+def upgrade(connection):
+    Job.__table__.create(connection, checkfirst=True)
@@ -1,24 +1,77 @@
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from helpers.replica_helper import RoutingSession
+from helpers.search_helper import SearchIndex
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def current_timestamp():
+    """SQL for the current UTC time, stored like SQLAlchemy stores a DateTime.
+
+    It is evaluated by SQLite inside the writing statement, i.e. while the
+    transaction holds the write lock, so timestamps follow commit order.
+    """
+    return db.func.strftime('%Y-%m-%d %H:%M:%f000', 'now')
 
 
 class Author(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(50), nullable=False)
-    last_name = db.Column(db.String(50), nullable=False)
+    last_name = db.Column(db.String(50), nullable=False, index=True)
     birth_date = db.Column(db.Date)
     biography = db.Column(db.Text)
+    # Summary of the author's books, kept up to date by helpers.aggregate_helper.
+    book_count = db.Column(db.Integer, nullable=False, default=0)
+    first_publication_date = db.Column(db.Date)
+    last_publication_date = db.Column(db.Date)
+    created_at = db.Column(db.DateTime, nullable=False, default=current_timestamp(), index=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=current_timestamp(), onupdate=current_timestamp(),
+                           index=True)
+    # Bumped by every ORM update; PATCH and set-based updates bump it themselves.
+    version = db.Column(db.Integer, nullable=False, default=1)
+    search_rank = db.query_expression()
+
+    __mapper_args__ = {'version_id_col': version}
 
 
 class Book(db.Model):
     __tablename__ = 'books'
     id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(255), nullable=False)
-    isbn = db.Column(db.String(20), nullable=False)
-    publication_date = db.Column(db.Date)
-    author_id = db.Column(db.Integer, db.ForeignKey('author.id'))
+    title = db.Column(db.String(255), nullable=False, index=True)
+    isbn = db.Column(db.String(20), nullable=False, index=True)
+    publication_date = db.Column(db.Date, index=True)
+    author_id = db.Column(db.Integer, db.ForeignKey('author.id'), index=True)
     author = db.relationship('Author', backref='books')
+    created_at = db.Column(db.DateTime, nullable=False, default=current_timestamp(), index=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=current_timestamp(), onupdate=current_timestamp(),
+                           index=True)
+    # Bumped by every ORM update; PATCH and set-based updates bump it themselves.
+    version = db.Column(db.Integer, nullable=False, default=1)
+    search_rank = db.query_expression()
+
+    __mapper_args__ = {'version_id_col': version}
+
+
+author_search_index = SearchIndex(Author.__table__, ['first_name', 'last_name'])
+author_search_index.register()
+book_search_index = SearchIndex(Book.__table__, ['title', 'isbn'])
+book_search_index.register()
+
+
+class Counter(db.Model):
+    __tablename__ = 'counters'
+    name = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Tombstone(db.Model):
+    __tablename__ = 'tombstones'
+    __table_args__ = (db.Index('ix_tombstones_table_name_deleted_at', 'table_name', 'deleted_at', 'row_id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=current_timestamp())
 
 
 class User(db.Model):
@@ -27,3 +80,31 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     password = db.Column(db.String(120), nullable=False)
 
+
+class Job(db.Model):
+    """A background job run by ``helpers.job_helper.job_runner``, with its progress checkpoint."""
+    __tablename__ = 'jobs'
+    __table_args__ = (db.Index('ix_jobs_status_id', 'status', 'id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    # queued, running, succeeded or failed.
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    params = db.Column(db.JSON, nullable=False, default=dict)
+    # Where the job resumes after a restart; written in the same transaction as each chunk of work.
+    state = db.Column(db.JSON)
+    done = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    # The runner holding the job while it is running, and when it last reported progress.
+    owner = db.Column(db.String(100))
+    heartbeat_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, nullable=False, default=current_timestamp())
+    updated_at = db.Column(db.DateTime, nullable=False, default=current_timestamp(), onupdate=current_timestamp())
+    finished_at = db.Column(db.DateTime)
+
+
+class SchemaVersion(db.Model):
+    __tablename__ = 'schema_version'
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    applied_at = db.Column(db.DateTime, nullable=False)
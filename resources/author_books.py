@@ -1,20 +1,79 @@
+from flask import request
 from flask_jwt_extended import jwt_required
+from marshmallow import ValidationError
 
-from helpers.pagination_helper import get_paginated_items
+from helpers.aggregate_helper import aggregates
+from helpers.cache_helper import response_cache
+from helpers.change_helper import change_log
+from helpers.counter_helper import counters
 from helpers.request_helper import get_entity_or_404
-from models import db, Author as AuthorModel, Book as BookModel
+from models import db, Author as AuthorModel, Book as BookModel, book_search_index
 from resources.base_resource import BaseResource
-from schemas.book import book_list_schema
+from schemas.book import book_list_schema, book_patch_schema
 
 
 class AuthorBooks(BaseResource):
+    sort_fields = {
+        'id': BookModel.id,
+        'title': BookModel.title,
+        'publication_date': BookModel.publication_date,
+    }
+    search_index = book_search_index
+
     @jwt_required()
     def get(self, id):
+        args = self.reqparse.parse_args()
+
+        def fill():
+            author = get_entity_or_404(db.session, AuthorModel, id)
+            data, _ = self.paginate(BookModel.query.filter_by(author_id=author.id), book_list_schema, args,
+                                    counter=lambda: author.book_count)
+            return data, ['author:{}'.format(author.id), 'author_books:{}'.format(author.id)]
+
+        return response_cache.respond(['author_books:{}'.format(id)], fill)
+
+    @jwt_required()
+    def patch(self, id):
+        """Change the same fields of all of an author's books with one ``UPDATE``, e.g. ``{"author_id": 2}``."""
         author = get_entity_or_404(db.session, AuthorModel, id)
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return {'message': 'Expected a JSON object'}, 400
+        try:
+            values = book_patch_schema.load(data)
+        except ValidationError as e:
+            return {'message': 'Validation error', 'errors': e.messages}, 400
+        values.pop('id', None)
+        if not values:
+            return {'message': 'Nothing to update'}, 400
+        if 'author_id' in values and not db.session.get(AuthorModel, values['author_id']):
+            return {'message': 'Validation error', 'errors': {
+                'author_id': ['Author id {} does not exist.'.format(values['author_id'])]}}, 400
+
+        books = BookModel.__table__
+        statement = (books.update().where(books.c.author_id == author.id)
+                     .values({**values, 'version': books.c.version + 1}).returning(books.c.id))
+        ids = db.session.scalars(statement).all()
+        author_ids = {author.id, values.get('author_id', author.id)}
+        aggregates.refresh(db.session, BookModel, author_ids)
+        invalidate_books(ids, author_ids)
+        db.session.commit()
+        return {'updated': len(ids)}, 200
+
+    @jwt_required()
+    def delete(self, id):
+        """Delete all of an author's books with one ``DELETE``."""
+        author = get_entity_or_404(db.session, AuthorModel, id)
+        books = BookModel.__table__
+        ids = db.session.scalars(books.delete().where(books.c.author_id == author.id).returning(books.c.id)).all()
+        change_log.record_deletes(db.session, BookModel, ids)
+        counters.remove_rows(db.session, BookModel, [{'author_id': author.id}] * len(ids))
+        aggregates.refresh(db.session, BookModel, {author.id})
+        invalidate_books(ids, {author.id})
+        db.session.commit()
+        return {'deleted': len(ids)}, 200
 
-        args = self.reqparse.parse_args()
-        page = args['page']
-        per_page = args['per_page']
 
-        books = get_paginated_items(BookModel.query.filter_by(author_id=author.id), page, per_page)
-        return book_list_schema.dump(books), 200
\ No newline at end of file
+def invalidate_books(ids, author_ids):
+    response_cache.invalidate_on_commit(db.session, *['book:{}'.format(id) for id in ids],
+                                        *['author_books:{}'.format(author_id) for author_id in author_ids])
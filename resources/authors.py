@@ -1,25 +1,57 @@
 from datetime import datetime
-from flask import request
+from flask import abort, current_app, request
 from flask_jwt_extended import jwt_required
 from flask_restful import Resource
+from sqlalchemy.orm.exc import StaleDataError
+from werkzeug.http import quote_etag
 
-from helpers.pagination_helper import get_paginated_items
+from helpers.cache_helper import make_etag, response_cache
+from helpers.change_helper import change_log
+from helpers.contract_helper import ArgsContract
+from helpers.counter_helper import counters
+from helpers.export_helper import export_parser, export_response, isoformat
+from helpers.fieldset_helper import get_fieldset_schema
+from helpers.import_helper import import_records, iter_records
+from helpers.job_helper import job_runner
+from helpers.json_helper import encode_json
+from helpers.loading_helper import get_column_options
 from helpers.request_helper import get_entity_or_404
-from models import Author as AuthorModel, db
+from helpers.update_helper import get_expected_version, update_or_abort
+from models import Author as AuthorModel, db, author_search_index
 from resources.base_resource import BaseResource
-from schemas.author import authors_schema, author_schema
+from resources.jobs import accepted
+from schemas.author import AuthorSchema, author_import_schema, author_patch_schema, authors_schema, author_schema
 from marshmallow import ValidationError
 
 
 class Author(Resource):
     @jwt_required()
     def get(self, id):
-        author = get_entity_or_404(db.session, AuthorModel, id)
-        return author_schema.dump(author)
+        schema = get_fieldset_schema(author_schema, request.args.get('fields'))
+
+        tags = ['author:{}'.format(id)]
+        if set(schema.dump_fields) & set(AuthorSchema.optional_fields):
+            # The book aggregates change with the author's books.
+            tags.append('author_books:{}'.format(id))
+
+        def fill():
+            author = get_entity_or_404(db.session, AuthorModel, id, options=get_column_options(AuthorModel, schema))
+            return schema.dump(author), ['author:{}'.format(author.id)], author.version
+
+        return response_cache.respond(tags, fill)
 
     @jwt_required()
     def delete(self, id):
+        """Delete the author and detach its books.
+
+        Beyond ``AUTHOR_DELETE_MAX_SYNC_BOOKS`` books, rewriting them all in one
+        transaction would hold up other writers, so the ``delete_author`` job
+        detaches them in chunks and this answers 202 with the job instead.
+        """
         author = get_entity_or_404(db.session, AuthorModel, id)
+        if author.book_count > current_app.config['AUTHOR_DELETE_MAX_SYNC_BOOKS']:
+            return accepted(job_runner.enqueue(db.session, 'delete_author', {'author_id': author.id},
+                                               total=author.book_count))
         db.session.delete(author)
         db.session.commit()
         return '', 204
@@ -27,7 +59,10 @@ class Author(Resource):
     @jwt_required()
     def put(self, id):
         data = request.get_json()
+        version, status = get_expected_version(data)
         author = get_entity_or_404(db.session, AuthorModel, id)
+        if version is not None and author.version != version:
+            return abort(status, description="Entity {} is at version {}, not {}".format(id, author.version, version))
         try:
             schema_data = author_schema.load(data)
         except ValidationError as e:
@@ -37,19 +72,49 @@ class Author(Resource):
         author.last_name = schema_data.get('last_name', author.last_name)
         author.birth_date = schema_data.get('birth_date', author.birth_date)
         author.biography = schema_data.get('biography', author.biography)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            return abort(409, description="Entity {} was changed concurrently".format(id))
         return author_schema.dump(author), 201
 
+    @jwt_required()
+    def patch(self, id):
+        """Change some fields of an author with a single conditional ``UPDATE ... RETURNING``, see ``Book.patch``."""
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return {'message': 'Expected a JSON object'}, 400
+        expected = get_expected_version(data)
+        try:
+            values = author_patch_schema.load(data)
+        except ValidationError as e:
+            return {'message': 'Validation error', 'errors': e.messages}, 400
+        values.pop('id', None)
+        if not values:
+            return {'message': 'Nothing to update'}, 400
+
+        columns = [getattr(AuthorModel, name) for name in author_schema.dump_fields] + [AuthorModel.version]
+        row = update_or_abort(db.session, AuthorModel, id, values, expected, returning=columns)
+        response_cache.invalidate_on_commit(db.session, 'author:{}'.format(id))
+        db.session.commit()
+
+        data = author_schema.dump(row)
+        return data, 200, {'ETag': quote_etag(make_etag(encode_json(data), row.version))}
+
 
 class AuthorsList(BaseResource):
+    sort_fields = {
+        'id': AuthorModel.id,
+        'last_name': AuthorModel.last_name,
+    }
+    search_index = author_search_index
+    change_feed = True
+
     @jwt_required()
     def get(self):
         args = self.reqparse.parse_args()
-        page = args['page']
-        per_page = args['per_page']
-
-        authors = get_paginated_items(AuthorModel.query, page, per_page)
-        return authors_schema.dump(authors), 200
+        return self.paginate(AuthorModel.query, authors_schema, args, counter='authors')
 
     @jwt_required()
     def post(self):
@@ -63,4 +128,48 @@ class AuthorsList(BaseResource):
         db.session.add(new_author)
         db.session.commit()
 
-        return author_schema.dump(new_author), 201
\ No newline at end of file
+        return author_schema.dump(new_author), 201
+
+
+class AuthorsBulk(Resource):
+    @jwt_required()
+    def post(self):
+        records = iter_records(request.stream, request.mimetype)
+        if records is None:
+            return {'message': 'Unsupported content type, send text/csv or application/x-ndjson'}, 415
+
+        result = import_records(db.session, records, author_import_schema, AuthorModel,
+                                current_app.config['BULK_IMPORT_BATCH_SIZE'])
+        return result, 200
+
+
+class AuthorsExport(Resource):
+    reqparse = ArgsContract(export_parser)
+
+    @jwt_required()
+    def get(self):
+        args = self.reqparse.parse_args()
+        statement = (db.select(AuthorModel.id, AuthorModel.first_name, AuthorModel.last_name,
+                               AuthorModel.birth_date, AuthorModel.biography)
+                     .order_by(AuthorModel.id))
+        return export_response(db.session, statement, args['format'], serialize_author_row,
+                               current_app.config['EXPORT_CHUNK_SIZE'])
+
+
+def serialize_author_row(row):
+    """Same output as ``author_schema.dump`` for a row of AuthorsExport's statement."""
+    return {'id': row.id, 'first_name': row.first_name, 'last_name': row.last_name,
+            'birth_date': isoformat(row.birth_date), 'biography': row.biography}
+
+
+def author_cache_tags(author):
+    return ['author:{}'.format(author.id), 'author_books:{}'.format(author.id)]
+
+
+def author_counts():
+    return db.select(db.literal('authors'), db.func.count()).select_from(AuthorModel)
+
+
+response_cache.tag_model(AuthorModel, author_cache_tags)
+counters.track(AuthorModel, lambda get: ['authors'], author_counts)
+change_log.track(AuthorModel)
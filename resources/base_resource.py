@@ -1,11 +1,213 @@
-from flask_restful import Resource, reqparse
+import datetime
+
+from flask import abort, current_app, request, url_for
+from flask_restful import Resource, inputs, reqparse
+from sqlalchemy import func
+from sqlalchemy.orm import with_expression
+
+from helpers.change_helper import change_log, utc_naive
+from helpers.contract_helper import ArgsContract
+from helpers.counter_helper import counters
+from helpers.fieldset_helper import get_fieldset_schema
+from helpers.loading_helper import get_column_options
+from helpers.pagination_helper import (decode_cursor, encode_cursor, get_keyset_items, get_ordered_query,
+                                       get_paginated_items)
+from helpers.serializer_helper import get_row_serializer
+
+# Largest page a list returns; bounds the rows and the dump work a single request can ask for.
+MAX_PER_PAGE = 1000
+
+list_parser = reqparse.RequestParser()
+list_parser.add_argument('page', type=inputs.positive, location='args', required=False, default=1, help='Page number')
+list_parser.add_argument('per_page', type=inputs.int_range(1, MAX_PER_PAGE), location='args', required=False,
+                         default=10, help='Items per page, from 1 to {}'.format(MAX_PER_PAGE))
+list_parser.add_argument('q', type=str, location='args', required=False, default=None, help='Search query')
+list_parser.add_argument('cursor', type=str, location='args', required=False, default=None, help='Pagination cursor')
+list_parser.add_argument('sort', type=str, location='args', required=False, default=None, help='Sort field')
+list_parser.add_argument('fields', type=str, location='args', required=False, default=None,
+                         help='Comma separated fields to return')
+list_parser.add_argument('ids', type=str, location='args', required=False, default=None,
+                         help='Comma separated ids to fetch')
+list_parser.add_argument('envelope', type=inputs.boolean, location='args', required=False, default=False,
+                         help='Wrap offset pages in an envelope with pagination metadata')
+list_parser.add_argument('count', type=str, location='args', required=False, default=None,
+                         choices=('approximate', 'exact'), help='How to count the total')
+list_parser.add_argument('updated_since', type=str, location='args', required=False, default=None,
+                         help='Change feed cursor or ISO 8601 time')
 
 
 class BaseResource(Resource):
-    def __init__(self):
-        self.reqparse = reqparse.RequestParser()
-        self.reqparse.add_argument('page', type=int, location='args', required=False, default=1, help='Page number')
-        self.reqparse.add_argument('per_page', type=int, location='args', required=False, default=10, help='Items per page')
-        self.reqparse.add_argument('q', type=str, location='args', required=False, default=None,
-                                   help='Search query')
-        super(BaseResource, self).__init__()
+    # Fields a list can be sorted by, mapped to their columns; must contain 'id'.
+    sort_fields = {}
+    # SearchIndex backing the q argument, if the list is searchable.
+    search_index = None
+    # Whether updated_since pages through the changes of the whole collection; the model must be tracked by change_log.
+    change_feed = False
+    # Compiled once here rather than per request: Flask-RESTful builds a resource instance for every request.
+    reqparse = ArgsContract(list_parser)
+
+    def paginate(self, query, schema, args, counter=None):
+        """Dump one page of ``query``.
+
+        Without a ``cursor`` argument the classic page/per_page offset paging is
+        used and a bare list is returned, or with ``envelope=true`` ``items``
+        plus ``total``, ``page``, ``per_page``, ``has_next`` and a ``next`` link.
+        Passing ``cursor`` (empty for the first page) switches to keyset paging
+        and returns ``items`` with ``next_cursor``, ``has_next`` and ``next``.
+
+        ``count=approximate`` (the default in an envelope) takes ``total`` from
+        the maintained ``counter`` (a name in ``counters`` or a function returning
+        the count) instead of counting rows; ``count=exact`` and searches count
+        the matching rows.
+
+        A ``q`` argument restricts the list to full-text matches, ordered by
+        relevance unless another ``sort`` is requested. ``fields`` narrows the
+        dumped fields and with them the selected columns and joins.
+
+        ``updated_since`` (empty, an ISO 8601 time or a previous ``next_cursor``)
+        returns the rows changed since then as ``items`` and the ids of rows
+        deleted since then as ``deleted``, oldest change first, see ``fetch_changes``.
+
+        ``ids`` fetches just those entities with one ``IN`` query and returns
+        ``items`` in the requested order, with ``null`` and an entry in
+        ``missing`` for ids that do not exist.
+
+        Schemas ``get_row_serializer`` can compile are dumped straight from
+        selected columns; others go through ORM instances and ``schema.dump``.
+        """
+        sort_fields = self.sort_fields
+        id_column = sort_fields['id']
+        sort = args['sort']
+        schema = get_fieldset_schema(schema, args['fields'])
+        serializer = get_row_serializer(id_column.class_, schema)
+
+        matches = self.search_index.matches(args['q']) if self.search_index is not None else None
+        if matches is not None:
+            query = query.join(matches, matches.c.id == id_column)
+            sort_fields = dict(sort_fields, relevance=matches.c.search_rank)
+            sort = sort or 'relevance'
+            counter = None
+        count_query = query
+
+        if serializer is None:
+            query = query.options(*get_column_options(id_column.class_, schema))
+            if matches is not None:
+                query = query.options(with_expression(id_column.class_.search_rank, matches.c.search_rank))
+
+        sort = sort or 'id'
+        sort_column = sort_fields.get(sort.lstrip('-'))
+        if sort_column is None:
+            return abort(400, description="Unknown sort field {}".format(sort.lstrip('-')))
+
+        dump = schema.dump
+        if serializer is not None:
+            # Keyset paging reads the sort value and id back from the last row.
+            selected = {column.key for column in serializer.columns}
+            extra_columns = {column.key: column.label(column.key) for column in (id_column, sort_column)
+                             if column.key not in selected}
+            query = serializer.select(query, *extra_columns.values())
+            dump = serializer.dump
+
+        if args['ids'] is not None:
+            return self.fetch_ids(query, dump, id_column, args['ids'])
+        if args['updated_since'] is not None:
+            if not self.change_feed or matches is not None:
+                return abort(400, description="updated_since isn't supported here")
+            return self.fetch_changes(query, dump, id_column, args['updated_since'], args['per_page'])
+
+        count = args['count'] or ('approximate' if args['envelope'] else None)
+        if args['cursor'] is None:
+            ordered_query = get_ordered_query(query, sort, sort_column, id_column)
+            if not args['envelope'] and count is None:
+                items = get_paginated_items(ordered_query, args['page'], args['per_page'])
+                return dump(items), 200
+
+            items = get_paginated_items(ordered_query, args['page'], args['per_page'], lookahead=1)
+            has_next = len(items) > args['per_page']
+            return {
+                'items': dump(items[:args['per_page']]),
+                'total': self.count_total(count_query, id_column, count, counter),
+                'page': args['page'],
+                'per_page': args['per_page'],
+                'has_next': has_next,
+                'next': self.next_link(page=args['page'] + 1) if has_next else None,
+            }, 200
+
+        items, next_cursor = get_keyset_items(query, sort, sort_column, id_column, args['per_page'], args['cursor'])
+        envelope = {
+            'items': dump(items),
+            'next_cursor': next_cursor,
+            'has_next': next_cursor is not None,
+            'next': self.next_link(cursor=next_cursor) if next_cursor is not None else None,
+        }
+        if count is not None:
+            envelope['total'] = self.count_total(count_query, id_column, count, counter)
+        return envelope, 200
+
+    @staticmethod
+    def count_total(query, id_column, count, counter):
+        if count == 'approximate' and counter is not None:
+            return counter() if callable(counter) else counters.get(query.session, counter)
+        return query.with_entities(func.count(id_column)).order_by(None).scalar()
+
+    @staticmethod
+    def next_link(**params):
+        return url_for(request.endpoint, **request.view_args, **dict(request.args.items(), **params))
+
+    def fetch_ids(self, query, dump, id_column, ids):
+        try:
+            ids = [int(id) for id in ids.split(',') if id.strip()]
+        except ValueError:
+            return abort(400, description="ids must be comma separated integers")
+        max_ids = current_app.config['BATCH_MAX_IDS']
+        if len(ids) > max_ids:
+            return abort(400, description="At most {} ids can be fetched at once".format(max_ids))
+
+        found = {getattr(item, id_column.key): item for item in query.filter(id_column.in_(set(ids))).all()}
+        dumped = dict(zip(found, dump(list(found.values()))))
+        return {'items': [dumped.get(id) for id in ids], 'missing': [id for id in ids if id not in found]}, 200
+
+    def fetch_changes(self, query, dump, id_column, updated_since, per_page):
+        """One page of the change feed after ``updated_since``.
+
+        The returned ``next_cursor`` is always set: pass it as ``updated_since``
+        to get the next page now, or the next changes later. Apply ``deleted``
+        before ``items``, as an id may be deleted and later reused. Changes
+        younger than ``CHANGE_FEED_SETTLE_SECONDS`` are left for the next call,
+        so a transaction committing right now is never skipped.
+        """
+        model = id_column.class_
+        after = None
+        if updated_since:
+            try:
+                after = (utc_naive(datetime.datetime.fromisoformat(updated_since)), 0)
+            except ValueError:
+                value, last_id = decode_cursor(updated_since, 'updated_since')
+                try:
+                    after = (datetime.datetime.fromisoformat(value), last_id)
+                except (TypeError, ValueError):
+                    return abort(400, description="Invalid cursor")
+
+        until = None
+        settle_seconds = current_app.config['CHANGE_FEED_SETTLE_SECONDS']
+        if settle_seconds:
+            until = utc_naive(datetime.datetime.now(datetime.timezone.utc)) - datetime.timedelta(seconds=settle_seconds)
+        changes = change_log.changes(query.session, model, after, until, per_page + 1)
+        has_next = len(changes) > per_page
+        changes = changes[:per_page]
+
+        changed_ids = [id for _, id, deleted in changes if not deleted]
+        found = {getattr(item, id_column.key): item for item in query.filter(id_column.in_(changed_ids)).all()}
+        dumped = dict(zip(found, dump(list(found.values()))))
+        if changes:
+            changed_at, last_id, _ = changes[-1]
+            next_cursor = encode_cursor('updated_since', changed_at, last_id)
+        else:
+            next_cursor = encode_cursor('updated_since', after[0], after[1]) if after else updated_since
+        return {
+            'items': [dumped[id] for id in changed_ids if id in dumped],
+            'deleted': [id for _, id, deleted in changes if deleted],
+            'next_cursor': next_cursor,
+            'has_next': has_next,
+            'next': self.next_link(updated_since=next_cursor) if has_next else None,
+        }, 200
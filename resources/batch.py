@@ -0,0 +1,47 @@
+from urllib.parse import urlsplit
+
+from flask import current_app, request
+from flask_jwt_extended import jwt_required
+from flask_restful import Resource
+from werkzeug.exceptions import HTTPException
+
+# Read endpoints a batch may call.
+BATCH_ENDPOINTS = {'bookslist', 'book', 'authorslist', 'author', 'authorbooks'}
+
+
+class Batch(Resource):
+    @jwt_required()
+    def post(self):
+        """Run several GET sub-requests and return their statuses and bodies in order.
+
+        Sub-requests are dispatched in-process within this request's app
+        context, so they share its database session, and the forwarded token
+        is found in the verified-token cache instead of being decoded again.
+        """
+        data = request.get_json(silent=True)
+        sub_requests = data.get('requests') if isinstance(data, dict) else None
+        if not isinstance(sub_requests, list) or not all(isinstance(path, str) for path in sub_requests):
+            return {'message': 'Expected {"requests": ["/api/...", ...]}'}, 400
+        max_requests = current_app.config['BATCH_MAX_REQUESTS']
+        if len(sub_requests) > max_requests:
+            return {'message': 'At most {} requests can be batched'.format(max_requests)}, 400
+
+        return {'responses': [self.dispatch_get(path) for path in sub_requests]}, 200
+
+    @staticmethod
+    def dispatch_get(path):
+        adapter = current_app.url_map.bind('')
+        try:
+            endpoint, view_args = adapter.match(urlsplit(path).path, method='GET')
+        except HTTPException as e:
+            return {'status': e.code, 'body': {'message': e.description}}
+        if endpoint not in BATCH_ENDPOINTS:
+            return {'status': 400, 'body': {'message': "{} can't be batched".format(path)}}
+
+        headers = {'Authorization': request.headers.get('Authorization', '')}
+        with current_app.test_request_context(path, headers=headers):
+            try:
+                response = current_app.view_functions[endpoint](**view_args)
+            except HTTPException as e:
+                return {'status': e.code, 'body': {'message': e.description}}
+        return {'status': response.status_code, 'body': response.get_json()}
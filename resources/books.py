@@ -1,20 +1,41 @@
-from flask import request
+from flask import abort, current_app, request
 from flask_restful import Resource
 from marshmallow import ValidationError
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import inspect
+from sqlalchemy.orm.exc import StaleDataError
+from werkzeug.http import quote_etag
 
-from helpers.pagination_helper import get_paginated_items
+from helpers.aggregate_helper import aggregates
+from helpers.cache_helper import make_etag, response_cache
+from helpers.change_helper import change_log
+from helpers.contract_helper import ArgsContract
+from helpers.counter_helper import counters
+from helpers.export_helper import export_parser, export_response, isoformat
+from helpers.fieldset_helper import get_fieldset_schema
+from helpers.import_helper import import_records, iter_records
+from helpers.json_helper import encode_json
+from helpers.loading_helper import get_column_options
 from helpers.request_helper import get_entity_or_404
-from models import Book as BookModel, db
+from helpers.update_helper import get_expected_version, update_or_abort
+from models import Author as AuthorModel, Book as BookModel, db, book_search_index
 from resources.base_resource import BaseResource
-from schemas.book import book_schema, books_schema
+from schemas.book import book_import_schema, book_patch_schema, book_schema, books_schema
 
 
 class Book(Resource):
     @jwt_required()
     def get(self, id):
-        book = get_entity_or_404(db.session, BookModel, id)
-        return book_schema.dump(book)
+        schema = get_fieldset_schema(book_schema, request.args.get('fields'))
+
+        def fill():
+            book = get_entity_or_404(db.session, BookModel, id, options=get_column_options(BookModel, schema))
+            tags = ['book:{}'.format(book.id)]
+            if 'author' in schema.dump_fields and book.author is not None:
+                tags.append('author:{}'.format(book.author.id))
+            return schema.dump(book), tags, book.version
+
+        return response_cache.respond(['book:{}'.format(id)], fill)
 
     @jwt_required()
     def delete(self, id):
@@ -26,7 +47,10 @@ class Book(Resource):
     @jwt_required()
     def put(self, id):
         data = request.get_json()
+        version, status = get_expected_version(data)
         book = get_entity_or_404(db.session, BookModel, id)
+        if version is not None and book.version != version:
+            return abort(status, description="Entity {} is at version {}, not {}".format(id, book.version, version))
         try:
             schema_data = book_schema.load(data)
         except ValidationError as e:
@@ -36,19 +60,73 @@ class Book(Resource):
         book.isbn = schema_data.get('isbn', book.isbn)
         book.publication_date = schema_data.get('publication_date', book.publication_date)
         book.author_id = schema_data.get('author_id', book.author_id)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            return abort(409, description="Entity {} was changed concurrently".format(id))
         return book_schema.dump(book), 201
 
+    @jwt_required()
+    def patch(self, id):
+        """Change some fields of a book with a single conditional ``UPDATE``.
+
+        Nothing is read first: the author check and the optional version check
+        (``version`` in the body or an ``If-Match`` ETag) are criteria of the
+        ``UPDATE``, and ``RETURNING`` yields the response. Moving the book to
+        another author reads the current author first, so both summaries can be
+        refreshed; the ``UPDATE`` then only applies if it is still that author.
+        """
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return {'message': 'Expected a JSON object'}, 400
+        expected = get_expected_version(data)
+        try:
+            values = book_patch_schema.load(data)
+        except ValidationError as e:
+            return {'message': 'Validation error', 'errors': e.messages}, 400
+        values.pop('id', None)
+        if not values:
+            return {'message': 'Nothing to update'}, 400
+
+        where = []
+        author_ids = set()
+        if 'author_id' in values:
+            where.append(db.exists().where(AuthorModel.id == values['author_id']))
+            previous_author_id = db.session.scalar(db.select(BookModel.author_id).where(BookModel.id == id))
+            where.append(BookModel.author_id.is_(previous_author_id))
+            author_ids.add(previous_author_id)
+        row = update_or_abort(db.session, BookModel, id, values, expected, where, book_returning_columns())
+        if row is None:
+            if 'author_id' in values and not db.session.get(AuthorModel, values['author_id']):
+                return {'message': 'Validation error', 'errors': {
+                    'author_id': ['Author id {} does not exist.'.format(values['author_id'])]}}, 400
+            return abort(409, description="Entity {} was changed concurrently".format(id))
+
+        author_ids.add(row.author_id)
+        if {'author_id', 'publication_date'} & set(values):
+            aggregates.refresh(db.session, BookModel, author_ids)
+        response_cache.invalidate_on_commit(db.session, 'book:{}'.format(id), *[
+            'author_books:{}'.format(author_id) for author_id in author_ids if author_id is not None])
+        db.session.commit()
+
+        data = serialize_book_row(row)
+        return data, 200, {'ETag': quote_etag(make_etag(encode_json(data), row.version))}
+
 
 class BooksList(BaseResource):
+    sort_fields = {
+        'id': BookModel.id,
+        'title': BookModel.title,
+        'publication_date': BookModel.publication_date,
+    }
+    search_index = book_search_index
+    change_feed = True
+
     @jwt_required()
     def get(self):
         args = self.reqparse.parse_args()
-        page = args['page']
-        per_page = args['per_page']
-
-        books = get_paginated_items(BookModel.query, page, per_page)
-        return books_schema.dump(books), 200
+        return self.paginate(BookModel.query, books_schema, args, counter='books')
 
     @jwt_required()
     def post(self):
@@ -62,4 +140,83 @@ class BooksList(BaseResource):
         db.session.add(new_book)
         db.session.commit()
 
-        return book_schema.dump(new_book), 201
\ No newline at end of file
+        return book_schema.dump(new_book), 201
+
+
+class BooksBulk(Resource):
+    @jwt_required()
+    def post(self):
+        records = iter_records(request.stream, request.mimetype)
+        if records is None:
+            return {'message': 'Unsupported content type, send text/csv or application/x-ndjson'}, 415
+
+        result = import_records(db.session, records, book_import_schema, BookModel,
+                                current_app.config['BULK_IMPORT_BATCH_SIZE'],
+                                validate_batch=validate_book_authors, after_insert=invalidate_author_books)
+        return result, 200
+
+
+class BooksExport(Resource):
+    reqparse = ArgsContract(export_parser)
+
+    @jwt_required()
+    def get(self):
+        args = self.reqparse.parse_args()
+        statement = (db.select(BookModel.id, BookModel.title, BookModel.isbn, BookModel.publication_date,
+                               BookModel.author_id, AuthorModel.first_name.label('author_first_name'),
+                               AuthorModel.last_name.label('author_last_name'))
+                     .outerjoin(AuthorModel, BookModel.author_id == AuthorModel.id)
+                     .order_by(BookModel.id))
+        return export_response(db.session, statement, args['format'], serialize_book_row,
+                               current_app.config['EXPORT_CHUNK_SIZE'])
+
+
+def book_returning_columns():
+    """The columns ``serialize_book_row`` needs, for ``RETURNING`` from a books ``UPDATE``."""
+    def author_column(column):
+        return (db.select(column).where(AuthorModel.id == BookModel.author_id)
+                .correlate_except(AuthorModel).scalar_subquery())
+
+    return (BookModel.id, BookModel.title, BookModel.isbn, BookModel.publication_date, BookModel.author_id,
+            BookModel.version, author_column(AuthorModel.first_name).label('author_first_name'),
+            author_column(AuthorModel.last_name).label('author_last_name'))
+
+
+def serialize_book_row(row):
+    """Same output as ``book_schema.dump`` for a row of BooksExport's statement."""
+    author = None
+    if row.author_id is not None:
+        author = {'id': row.author_id, 'first_name': row.author_first_name, 'last_name': row.author_last_name}
+    return {'id': row.id, 'title': row.title, 'isbn': row.isbn,
+            'publication_date': isoformat(row.publication_date), 'author': author}
+
+
+def validate_book_authors(rows):
+    author_ids = {data['author_id'] for _, data in rows}
+    existing = set(db.session.scalars(db.select(AuthorModel.id).where(AuthorModel.id.in_(author_ids))))
+    return {line: {'author_id': ['Author id {} does not exist.'.format(data['author_id'])]}
+            for line, data in rows if data['author_id'] not in existing}
+
+
+def invalidate_author_books(books):
+    response_cache.invalidate(*{'author_books:{}'.format(book['author_id']) for book in books})
+
+
+def book_cache_tags(book):
+    author_ids = {book.author_id, *inspect(book).attrs.author_id.history.deleted}
+    return ['book:{}'.format(book.id)] + ['author_books:{}'.format(author_id)
+                                          for author_id in author_ids if author_id is not None]
+
+
+def book_counts():
+    return db.select(db.literal('books'), db.func.count()).select_from(BookModel)
+
+
+response_cache.tag_model(BookModel, book_cache_tags)
+counters.track(BookModel, lambda get: ['books'], book_counts)
+aggregates.track(AuthorModel, BookModel, BookModel.author_id, {
+    'book_count': (db.func.count, BookModel.id),
+    'first_publication_date': (db.func.min, BookModel.publication_date),
+    'last_publication_date': (db.func.max, BookModel.publication_date),
+})
+change_log.track(BookModel)
@@ -0,0 +1,10 @@
+from flask_jwt_extended import jwt_required
+from flask_restful import Resource
+
+from helpers.cache_helper import response_cache
+
+
+class CacheStats(Resource):
+    @jwt_required()
+    def get(self):
+        return response_cache.get_stats(), 200
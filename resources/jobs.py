@@ -0,0 +1,128 @@
+import os
+
+from flask import current_app, request, url_for
+from flask_jwt_extended import jwt_required
+from flask_restful import Resource
+from marshmallow import ValidationError
+
+from helpers.aggregate_helper import aggregates
+from helpers.import_helper import CSV_MIMETYPES, NDJSON_MIMETYPES, import_job, spool_records
+from helpers.job_helper import job_runner
+from helpers.request_helper import get_entity_or_404
+from models import Author as AuthorModel, Book as BookModel, Job as JobModel, db
+from resources.author_books import invalidate_books
+from resources.books import invalidate_author_books, validate_book_authors
+from schemas.author import author_import_schema
+from schemas.book import book_import_schema
+from schemas.job import delete_author_job_schema, job_request_schema, job_schema, rebuild_aggregates_job_schema
+
+
+class JobsList(Resource):
+    @jwt_required()
+    def post(self):
+        """Queue a job, e.g. ``{"kind": "delete_author", "params": {"author_id": 1}}``, and answer 202 at once."""
+        try:
+            data = job_request_schema.load(request.get_json(silent=True))
+        except ValidationError as e:
+            return {'message': 'Validation error', 'errors': e.messages}, 400
+        task = job_runner.tasks.get(data['kind'])
+        if task is None or task.params_schema is None:
+            return {'message': 'Validation error', 'errors': {'kind': ['Unknown job kind.']}}, 400
+        try:
+            params = task.params_schema.load(data['params'])
+        except ValidationError as e:
+            return {'message': 'Validation error', 'errors': {'params': e.messages}}, 400
+
+        total = task.total(db.session, params) if task.total is not None else None
+        return accepted(job_runner.enqueue(db.session, task.kind, params, total))
+
+
+class Job(Resource):
+    @jwt_required()
+    def get(self, id):
+        """Status, progress (``done`` of ``total`` units, if known) and, once finished, ``result`` or ``error``."""
+        return job_schema.dump(get_entity_or_404(db.session, JobModel, id)), 200
+
+
+class BooksBulkJob(Resource):
+    @jwt_required()
+    def post(self):
+        """Queue the import ``BooksBulk`` does, for bodies too large to import within a request."""
+        return enqueue_import('import_books')
+
+
+class AuthorsBulkJob(Resource):
+    @jwt_required()
+    def post(self):
+        """Queue the import ``AuthorsBulk`` does, for bodies too large to import within a request."""
+        return enqueue_import('import_authors')
+
+
+def accepted(job):
+    return job_schema.dump(job), 202, {'Location': url_for('job', id=job.id)}
+
+
+def enqueue_import(kind):
+    if request.mimetype not in CSV_MIMETYPES + NDJSON_MIMETYPES:
+        return {'message': 'Unsupported content type, send text/csv or application/x-ndjson'}, 415
+    name = spool_records(request.stream, spool_directory(), request.mimetype)
+    return accepted(job_runner.enqueue(db.session, kind, {'file': name, 'mimetype': request.mimetype}))
+
+
+def spool_directory():
+    return os.path.join(current_app.instance_path, 'jobs')
+
+
+def author_book_count(session, params):
+    return session.scalar(db.select(AuthorModel.book_count).where(AuthorModel.id == params['author_id']))
+
+
+@job_runner.task('delete_author', params_schema=delete_author_job_schema, total=author_book_count)
+def delete_author(session, params, state, chunk_size):
+    """Delete an author like ``DELETE /api/authors/<id>``, detaching its books a chunk at a time first.
+
+    Each chunk is one ``UPDATE`` of at most ``chunk_size`` books, so readers
+    and other writers get the database between chunks, where the ORM delete
+    would rewrite every book in one transaction.
+    """
+    author_id = params['author_id']
+    detached = state.get('detached', 0)
+    books = BookModel.__table__
+    while True:
+        chunk = db.select(books.c.id).where(books.c.author_id == author_id).limit(chunk_size).scalar_subquery()
+        statement = (books.update().where(books.c.id.in_(chunk))
+                     .values({'author_id': None, 'version': books.c.version + 1}).returning(books.c.id))
+        ids = session.scalars(statement).all()
+        if not ids:
+            break
+        aggregates.refresh(session, BookModel, {author_id})
+        invalidate_books(ids, {author_id})
+        detached += len(ids)
+        yield {'detached': detached}, len(ids)
+
+    author = session.get(AuthorModel, author_id)
+    if author is not None:
+        session.delete(author)
+    return {'author_id': author_id, 'deleted': author is not None, 'detached_books': detached}
+
+
+def author_count(session, params):
+    return session.scalar(db.select(db.func.count()).select_from(AuthorModel))
+
+
+@job_runner.task('rebuild_aggregates', params_schema=rebuild_aggregates_job_schema, total=author_count)
+def rebuild_aggregates(session, params, state, chunk_size):
+    """Recompute every author's book summary, like ``flask rebuild-aggregates`` but a chunk of authors at a time."""
+    yield from aggregates.rebuild_in_chunks(session, state, chunk_size)
+
+
+@job_runner.task('import_books')
+def import_books(session, params, state, chunk_size):
+    return (yield from import_job(session, spool_directory(), params, state, chunk_size, book_import_schema,
+                                  BookModel, validate_book_authors, invalidate_author_books))
+
+
+@job_runner.task('import_authors')
+def import_authors(session, params, state, chunk_size):
+    return (yield from import_job(session, spool_directory(), params, state, chunk_size, author_import_schema,
+                                  AuthorModel))
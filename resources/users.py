@@ -2,7 +2,7 @@ from flask import request, jsonify
 from flask_restful import Resource
 from flask_jwt_extended import create_access_token
 from marshmallow import ValidationError
-from werkzeug.security import generate_password_hash, check_password_hash
+from helpers.password_helper import HasherBusy, password_hasher
 from models import User as UserModel, db
 from schemas.user import user_schema
 
@@ -22,7 +22,10 @@ class UserSignUp(Resource):
         if UserModel.query.filter_by(username=username).first():
             return {"message": "Username already exists."}, 400
 
-        hashed_password = generate_password_hash(password)
+        try:
+            hashed_password = password_hasher.hash(password)
+        except HasherBusy:
+            return busy_response()
         new_user = UserModel(username=username, password=hashed_password)
         db.session.add(new_user)
         db.session.commit()
@@ -43,8 +46,22 @@ class UserLogin(Resource):
             return {'message': 'Validation error', 'errors': e.messages}, 400
 
         user = UserModel.query.filter_by(username=username).first()
-        if not user or not check_password_hash(user.password, password):
-            return {"message": "Bad username or password"}, 401
+        try:
+            if not user or not password_hasher.verify(user.password, password):
+                return {"message": "Bad username or password"}, 401
+        except HasherBusy:
+            return busy_response()
+
+        if password_hasher.needs_rehash(user.password):
+            try:
+                user.password = password_hasher.hash(password)
+                db.session.commit()
+            except HasherBusy:
+                pass  # The password is verified; upgrade its hash on a later login.
 
         access_token = create_access_token(identity=username)
-        return {"access_token": access_token}, 200
\ No newline at end of file
+        return {"access_token": access_token}, 200
+
+
+def busy_response():
+    return {"message": "Too many authentication requests, try again later."}, 429, {'Retry-After': '1'}
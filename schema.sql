@@ -1,24 +1,116 @@
+-- Reference schema, kept in line with models.py and the migrations in migrations/.
+-- The app creates and upgrades the database itself on startup.
+
 -- Define Authors table
-CREATE TABLE IF NOT EXISTS authors (
-    author_id INTEGER PRIMARY KEY,
-    first_name TEXT NOT NULL,
-    last_name TEXT NOT NULL,
+CREATE TABLE IF NOT EXISTS author (
+    id INTEGER PRIMARY KEY,
+    first_name VARCHAR(50) NOT NULL,
+    last_name VARCHAR(50) NOT NULL,
     birth_date DATE,
-    biography TEXT
+    biography TEXT,
+    book_count INTEGER NOT NULL,
+    first_publication_date DATE,
+    last_publication_date DATE,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    version INTEGER NOT NULL
 );
 
+CREATE INDEX IF NOT EXISTS ix_author_last_name ON author (last_name);
+CREATE INDEX IF NOT EXISTS ix_author_created_at ON author (created_at);
+CREATE INDEX IF NOT EXISTS ix_author_updated_at ON author (updated_at);
+
 -- Define Books table with foreign key reference to Authors table
 CREATE TABLE IF NOT EXISTS books (
     id INTEGER PRIMARY KEY,
-    title TEXT NOT NULL,
-    isbn TEXT NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    isbn VARCHAR(20) NOT NULL,
     publication_date DATE,
     author_id INTEGER,
-    FOREIGN KEY (author_id) REFERENCES authors(id)
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    version INTEGER NOT NULL,
+    FOREIGN KEY (author_id) REFERENCES author (id)
 );
 
+CREATE INDEX IF NOT EXISTS ix_books_author_id ON books (author_id);
+CREATE INDEX IF NOT EXISTS ix_books_isbn ON books (isbn);
+CREATE INDEX IF NOT EXISTS ix_books_title ON books (title);
+CREATE INDEX IF NOT EXISTS ix_books_publication_date ON books (publication_date);
+CREATE INDEX IF NOT EXISTS ix_books_created_at ON books (created_at);
+CREATE INDEX IF NOT EXISTS ix_books_updated_at ON books (updated_at);
+
 CREATE TABLE IF NOT EXISTS users (
     id INTEGER PRIMARY KEY,
-    username TEXT NOT NULL,
-    password TEXT NOT NULL
+    username VARCHAR(80) NOT NULL UNIQUE,
+    password VARCHAR(120) NOT NULL
+);
+
+-- Row counts behind list totals: books and authors
+CREATE TABLE IF NOT EXISTS counters (
+    name VARCHAR(100) PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+-- Ids of deleted authors and books, for the updated_since change feed
+CREATE TABLE IF NOT EXISTS tombstones (
+    id INTEGER PRIMARY KEY,
+    table_name VARCHAR(50) NOT NULL,
+    row_id INTEGER NOT NULL,
+    deleted_at DATETIME NOT NULL
 );
+
+CREATE INDEX IF NOT EXISTS ix_tombstones_table_name_deleted_at ON tombstones (table_name, deleted_at, row_id);
+
+-- Background jobs and their progress checkpoints
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    params JSON NOT NULL,
+    state JSON,
+    done INTEGER NOT NULL,
+    total INTEGER,
+    result JSON,
+    error TEXT,
+    owner VARCHAR(100),
+    heartbeat_at DATETIME,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    finished_at DATETIME
+);
+
+CREATE INDEX IF NOT EXISTS ix_jobs_status_id ON jobs (status, id);
+
+-- Applied migration versions
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    applied_at DATETIME NOT NULL
+);
+
+-- Full-text search indexes, kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS author_fts USING fts5(first_name, last_name, content='author', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3');
+CREATE TRIGGER IF NOT EXISTS author_fts_ai AFTER INSERT ON author BEGIN
+    INSERT INTO author_fts(rowid, first_name, last_name) VALUES (new.id, new.first_name, new.last_name);
+END;
+CREATE TRIGGER IF NOT EXISTS author_fts_ad AFTER DELETE ON author BEGIN
+    INSERT INTO author_fts(author_fts, rowid, first_name, last_name) VALUES ('delete', old.id, old.first_name, old.last_name);
+END;
+CREATE TRIGGER IF NOT EXISTS author_fts_au AFTER UPDATE OF first_name, last_name ON author BEGIN
+    INSERT INTO author_fts(author_fts, rowid, first_name, last_name) VALUES ('delete', old.id, old.first_name, old.last_name);
+    INSERT INTO author_fts(rowid, first_name, last_name) VALUES (new.id, new.first_name, new.last_name);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(title, isbn, content='books', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3');
+CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+    INSERT INTO books_fts(rowid, title, isbn) VALUES (new.id, new.title, new.isbn);
+END;
+CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+    INSERT INTO books_fts(books_fts, rowid, title, isbn) VALUES ('delete', old.id, old.title, old.isbn);
+END;
+CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, isbn ON books BEGIN
+    INSERT INTO books_fts(books_fts, rowid, title, isbn) VALUES ('delete', old.id, old.title, old.isbn);
+    INSERT INTO books_fts(rowid, title, isbn) VALUES (new.id, new.title, new.isbn);
+END;
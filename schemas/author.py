@@ -1,13 +1,22 @@
-from marshmallow import Schema, fields
+from marshmallow import fields
 
+from schemas.base import BaseSchema
+
+
+class AuthorSchema(BaseSchema):
+    optional_fields = ('book_count', 'first_publication_date', 'last_publication_date')
 
-class AuthorSchema(Schema):
     id = fields.Int()
     first_name = fields.Str(required=True)
     last_name = fields.Str(required=True)
     birth_date = fields.Date(required=False)
     biography = fields.Str(required=False)
+    book_count = fields.Int(dump_only=True)
+    first_publication_date = fields.Date(dump_only=True)
+    last_publication_date = fields.Date(dump_only=True)
 
 
 author_schema = AuthorSchema()
-authors_schema = AuthorSchema(many=True)
\ No newline at end of file
+authors_schema = AuthorSchema(many=True)
+author_import_schema = AuthorSchema(exclude=("id",))
+author_patch_schema = AuthorSchema(partial=True)
\ No newline at end of file
@@ -0,0 +1,31 @@
+from marshmallow import Schema
+
+from helpers.contract_helper import compile_loader
+from helpers.metrics_helper import request_metrics
+
+
+class BaseSchema(Schema):
+    """Schema whose load and dump time is reported in the request metrics.
+
+    Loads without per-call options go through a loader compiled from the
+    schema when it is built, see ``compile_loader``.
+    """
+
+    # Fields left out of dumps unless requested by name through ``only``, e.g. with a fields argument.
+    optional_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        if kwargs.get('only') is None and self.optional_fields:
+            kwargs['exclude'] = tuple(kwargs.get('exclude', ())) + tuple(self.optional_fields)
+        super(BaseSchema, self).__init__(*args, **kwargs)
+        self._loader = compile_loader(self)
+
+    def dump(self, obj, *, many=None):
+        with request_metrics.timer('serialize'):
+            return super(BaseSchema, self).dump(obj, many=many)
+
+    def load(self, data, *, many=None, partial=None, unknown=None):
+        with request_metrics.timer('deserialize'):
+            if self._loader is not None and many is None and partial is None and unknown is None:
+                return self._loader(data)
+            return super(BaseSchema, self).load(data, many=many, partial=partial, unknown=unknown)
@@ -1,27 +1,37 @@
-from marshmallow import Schema, fields, validate, ValidationError, validates
+from marshmallow import fields, validate, ValidationError
 from models import Author as AuthorModel, db
 from schemas.author import AuthorSchema
+from schemas.base import BaseSchema
 
+# Built once: putting the statement together costs more than running it.
+author_exists = db.select(db.exists().where(AuthorModel.id == db.bindparam('author_id')))
 
-class BookListSchema(Schema):
+
+def validate_author_exists(value):
+    if not db.session.scalar(author_exists, {'author_id': value}):
+        raise ValidationError('Author id {} does not exist.'.format(value))
+
+
+class BookListSchema(BaseSchema):
     id = fields.Int()
     title = fields.Str(required=True)
     isbn = fields.Str(required=True, validate=validate.Length(min=10, max=13))
     publication_date = fields.Date(required=True)
 
 
-class BookSchema(BookListSchema):
-    author = fields.Nested(AuthorSchema(only=("id", "first_name", "last_name",)), dump_only=True)
+class BookImportSchema(BookListSchema):
+    # Leaves checking author ids to the caller: in bulk for BooksBulk, within the UPDATE for PATCH.
     author_id = fields.Int(required=True, load_only=True)
 
-    @validates("author_id")
-    def validate_author_id(self, value):
-        author = db.session.get(AuthorModel, value)
-        if not author:
-            raise ValidationError('Author id {} does not exist.'.format(value))
+
+class BookSchema(BookImportSchema):
+    author_id = fields.Int(required=True, load_only=True, validate=validate_author_exists)
+    author = fields.Nested(AuthorSchema(only=("id", "first_name", "last_name",)), dump_only=True)
 
 
 book_schema = BookSchema()
 book_request_schema = BookSchema()
+book_import_schema = BookImportSchema(exclude=("id",))
+book_patch_schema = BookImportSchema(partial=True)
 book_list_schema = BookListSchema(many=True)
 books_schema = BookSchema(many=True)
\ No newline at end of file
@@ -0,0 +1,36 @@
+from marshmallow import fields
+from schemas.base import BaseSchema
+from schemas.book import validate_author_exists
+
+
+class JobSchema(BaseSchema):
+    id = fields.Int()
+    kind = fields.Str()
+    status = fields.Str()
+    params = fields.Dict()
+    done = fields.Int()
+    total = fields.Int()
+    result = fields.Raw()
+    error = fields.Str()
+    created_at = fields.DateTime()
+    updated_at = fields.DateTime()
+    finished_at = fields.DateTime()
+
+
+class JobRequestSchema(BaseSchema):
+    kind = fields.Str(required=True)
+    params = fields.Dict(load_default=dict)
+
+
+class DeleteAuthorJobSchema(BaseSchema):
+    author_id = fields.Int(required=True, validate=validate_author_exists)
+
+
+class RebuildAggregatesJobSchema(BaseSchema):
+    pass
+
+
+job_schema = JobSchema()
+job_request_schema = JobRequestSchema()
+delete_author_job_schema = DeleteAuthorJobSchema()
+rebuild_aggregates_job_schema = RebuildAggregatesJobSchema()
@@ -1,8 +1,9 @@
-from marshmallow import Schema, fields, validate, ValidationError, validates
+from marshmallow import fields, validate, ValidationError, validates
 from models import User as UserModel, db
+from schemas.base import BaseSchema
 
 
-class UserSchema(Schema):
+class UserSchema(BaseSchema):
     id = fields.Int()
     username = fields.Str(required=True, validate=validate.Length(min=3, max=15))
     password = fields.Str(required=True, validate=validate.Length(min=10, max=50))
@@ -0,0 +1,221 @@
+"""Production server: build the app once, then fork workers that share it.
+
+The parent imports everything and runs ``init_app`` (migrations included)
+once, opens the listening socket and forks ``SERVER_WORKERS`` workers. Each
+worker serves the inherited socket on a threaded WSGI server, with its own
+database connections. A worker exits gracefully after ``SERVER_MAX_REQUESTS``
+requests (plus up to ``SERVER_MAX_REQUESTS_JITTER``, so workers do not
+restart together) and the parent forks a fresh one. SIGTERM or SIGINT stop
+accepting connections, let in-flight requests finish for up to
+``SERVER_GRACEFUL_TIMEOUT_SECONDS`` and exit. Every worker runs background
+jobs too; a stopping one hands its running jobs back to the queue.
+
+Workers must agree on cached responses, recent writers and verified tokens,
+and /metrics must add up every worker's counts, so more than one worker
+requires ``SHARED_CACHE_PATH`` for every such store that is enabled.
+
+    python server.py --host 0.0.0.0 --port 8000
+"""
+import argparse
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from werkzeug.serving import make_server
+from werkzeug.wsgi import ClosingIterator
+
+from api import init_app
+from helpers.cache_helper import LRUCacheBackend, response_cache
+from helpers.job_helper import job_runner
+from helpers.metrics_helper import request_metrics
+from helpers.password_helper import password_hasher
+from helpers.replica_helper import replica_router
+from models import db
+
+STOP_SIGNALS = {signal.SIGTERM, signal.SIGINT}
+
+
+class PreforkServer:
+    def __init__(self, app, host, port):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = app.config['SERVER_WORKERS']
+        self.max_requests = app.config['SERVER_MAX_REQUESTS']
+        self.max_requests_jitter = app.config['SERVER_MAX_REQUESTS_JITTER']
+        self.graceful_timeout = app.config['SERVER_GRACEFUL_TIMEOUT_SECONDS']
+        self.socket = None
+        self.children = set()
+        self.stopping = False
+
+    def run(self):
+        local_caches = process_local_caches(self.app)
+        if self.workers > 1 and local_caches:
+            raise SystemExit('{} workers would each keep their own {}: set SHARED_CACHE_PATH or SERVER_WORKERS=1'
+                             .format(self.workers, ', '.join(local_caches)))
+        self.socket = socket.create_server((self.host, self.port), backlog=2048)
+        self.port = self.socket.getsockname()[1]
+        request_metrics.clear()
+        # Connections opened while building the app must not be shared with the workers.
+        dispose_engines(self.app)
+        dispose_caches(self.app)
+        for signum in STOP_SIGNALS:
+            signal.signal(signum, self.stop)
+        print('Listening on http://{}:{} with {} workers'.format(self.host, self.port, self.workers),
+              file=sys.stderr, flush=True)
+        for _ in range(self.workers):
+            self.spawn()
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            self.children.discard(pid)
+            if not self.stopping:
+                if os.waitstatus_to_exitcode(status) != 0:
+                    # Do not fork in a tight loop when workers keep failing.
+                    time.sleep(1)
+                self.spawn()
+        self.socket.close()
+
+    def spawn(self):
+        max_requests = self.max_requests
+        if max_requests:
+            max_requests += random.randint(0, self.max_requests_jitter)
+        # Held back until the child has its own handlers; the parent's would make it fork workers too.
+        signal.pthread_sigmask(signal.SIG_BLOCK, STOP_SIGNALS)
+        pid = os.fork()
+        if pid:
+            self.children.add(pid)
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+            return
+
+        code = 0
+        try:
+            for signum in STOP_SIGNALS:
+                signal.signal(signum, signal.SIG_DFL)
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, STOP_SIGNALS)
+            reset_after_fork(self.app)
+            Worker(self.app, self.socket, self.host, self.port, max_requests, self.graceful_timeout).run()
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+class Worker:
+    """Serves the shared socket until stopped or ``max_requests`` requests were handled."""
+
+    def __init__(self, app, listener, host, port, max_requests, graceful_timeout):
+        self.app = app
+        self.max_requests = max_requests
+        self.graceful_timeout = graceful_timeout
+        self.handled = 0
+        self.active = 0
+        self.stopping = False
+        self._condition = threading.Condition()
+        self.server = make_server(host, port, self, threaded=True, fd=listener.fileno())
+
+    def __call__(self, environ, start_response):
+        with self._condition:
+            self.active += 1
+            self.handled += 1
+            if self.max_requests and self.handled >= self.max_requests:
+                self.stop()
+        try:
+            iterable = self.app(environ, start_response)
+        except BaseException:
+            self._finished()
+            raise
+        return ClosingIterator(iterable, self._finished)
+
+    def _finished(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+    def stop(self, *args):
+        if not self.stopping:
+            self.stopping = True
+            # shutdown() waits for serve_forever to return, so it cannot run on a request thread.
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def run(self):
+        for signum in STOP_SIGNALS:
+            signal.signal(signum, self.stop)
+        job_runner.start()
+        self.server.serve_forever()
+        with self._condition:
+            self._condition.wait_for(lambda: self.active == 0, timeout=self.graceful_timeout)
+        # Running jobs commit their current chunk and go back to the queue for the other workers.
+        job_runner.stop(timeout=self.graceful_timeout)
+        request_metrics.flush()
+        self.server.server_close()
+
+
+def dispose_engines(app, close=True):
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=close)
+    for replica in replica_router.replicas:
+        replica.engine.dispose(close=close)
+
+
+def cache_backends(app):
+    backends = [response_cache.backend, replica_router.writers, app.extensions['flask-jwt-extended'].token_cache,
+                request_metrics.store]
+    return [backend for backend in backends if backend is not None]
+
+
+def process_local_caches(app):
+    """Names of the enabled caches of ``app`` that each worker would keep to itself."""
+    caches = [('response cache', response_cache.backend if response_cache.enabled else None),
+              ('replica writers', replica_router.writers if replica_router.replicas else None),
+              ('verified token cache', app.extensions['flask-jwt-extended'].token_cache),
+              ('request metrics', request_metrics.store)]
+    return [name for name, backend in caches if isinstance(backend, LRUCacheBackend)]
+
+
+def dispose_caches(app, close=True):
+    for backend in cache_backends(app):
+        backend.dispose(close=close)
+
+
+def reset_after_fork(app):
+    """Drop what a forked worker must not share with its parent: connections, caches, the hashing pool, job threads."""
+    # close=False leaves the parent's connections alone and only forgets them here.
+    dispose_engines(app, close=False)
+    dispose_caches(app, close=False)
+    password_hasher.after_fork()
+    job_runner.after_fork()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+
+    os.environ.setdefault('FLASK_ENV', 'dev')
+    PreforkServer(init_app(), args.host, args.port).run()
+
+
+if __name__ == '__main__':
+    main()
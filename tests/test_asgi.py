@@ -0,0 +1,123 @@
+import asyncio
+import datetime
+import json
+import os
+
+from flask_jwt_extended import create_access_token
+from flask_testing import TestCase
+from werkzeug.security import generate_password_hash
+
+from api import init_app
+from asgi import AsgiApp
+from models import Author, Book, User, db
+from tests.query_counter import QueryCounter
+
+
+class TestAsgiApp(TestCase):
+    def create_app(self):
+        os.environ['FLASK_ENV'] = 'test'
+        app = init_app()
+        return app
+
+    def setUp(self):
+        author = Author(first_name='Author1', last_name='Surname1', birth_date=datetime.date(1960, 1, 1))
+        db.session.add(author)
+        db.session.commit()
+        db.session.add_all([Book(title='Book {}'.format(i), isbn='a1a1a1a1a{:02d}'.format(i),
+                                 publication_date=datetime.date(2020, 1, 1), author_id=author.id)
+                            for i in range(1, 21)])
+        db.session.add(User(username='user1', password=generate_password_hash('passwordpassword')))
+        db.session.commit()
+        db.session.close()
+        self.headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity='user1'))}
+        self.asgi_app = AsgiApp(self.app)
+
+    def tearDown(self):
+        asyncio.run(self.asgi_app.engine.dispose())
+        self.asgi_app.executor.shutdown()
+        db.session.remove()
+        db.drop_all()
+
+    async def request(self, method, path, body=None, headers=None, receive=None):
+        path, _, query_string = path.partition('?')
+        raw_headers = [(name.lower().encode(), value.encode()) for name, value in {**self.headers, **(headers or {})}.items()]
+        if body is not None:
+            body = json.dumps(body).encode()
+            raw_headers.append((b'content-type', b'application/json'))
+        scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query_string.encode(),
+                 'headers': raw_headers, 'http_version': '1.1', 'scheme': 'http', 'root_path': '',
+                 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234)}
+        messages = iter([{'type': 'http.request', 'body': body or b'', 'more_body': False}])
+        sent = []
+
+        async def receive_body():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message)
+
+        await self.asgi_app(scope, receive or receive_body, send)
+        status = sent[0]['status']
+        data = b''.join(message.get('body', b'') for message in sent[1:])
+        return status, json.loads(data) if data else None
+
+    def test_reads_served_with_async_session(self):
+        async def run():
+            return await asyncio.gather(
+                self.request('GET', '/api/books?per_page=5&fields=id,title'),
+                self.request('GET', '/api/books/3'),
+                self.request('GET', '/api/authors/1/books?cursor=&per_page=2'),
+                self.request('GET', '/api/authors?ids=1,2'),
+                self.request('GET', '/api/books/99'),
+                *[self.request('GET', '/api/books/{}?fields=title'.format(i)) for i in range(1, 21)])
+
+        with QueryCounter(db.engine) as sync_counter, QueryCounter(self.asgi_app.engine.sync_engine) as counter:
+            results = asyncio.run(run())
+        self.assertEqual(sync_counter.count, 0)
+        self.assertGreaterEqual(counter.count, 25)
+        self.assertEqual(results[0], (200, [{'id': i, 'title': 'Book {}'.format(i)} for i in range(1, 6)]))
+        self.assertEqual(results[1][1]['author']['last_name'], 'Surname1')
+        self.assertEqual(len(results[2][1]['items']), 2)
+        self.assertEqual(results[3][1]['missing'], [2])
+        self.assertEqual(results[4][0], 404)
+        self.assertEqual([body['title'] for _, body in results[5:]], ['Book {}'.format(i) for i in range(1, 21)])
+
+    def test_writes_and_auth(self):
+        async def run():
+            status, body = await self.request('POST', '/api/login',
+                                              {'username': 'user1', 'password': 'passwordpassword'})
+            self.assertEqual(status, 200)
+            headers = {'Authorization': 'Bearer {}'.format(body['access_token'])}
+            status, body = await self.request('POST', '/api/authors', {'first_name': 'New', 'last_name': 'Author'},
+                                              headers=headers)
+            self.assertEqual(status, 201)
+            status, body = await self.request('GET', '/api/authors/{}'.format(body['id']), headers=headers)
+            self.assertEqual((status, body['last_name']), (200, 'Author'))
+            status, _ = await self.request('GET', '/api/books', headers={'Authorization': 'Bearer x'})
+            self.assertNotEqual(status, 200)
+
+        asyncio.run(run())
+        self.assertEqual(Author.query.filter_by(last_name='Author').count(), 1)
+
+    def test_bulk_import_reads_body_as_it_arrives(self):
+        self.app.config['BULK_IMPORT_BATCH_SIZE'] = 2
+        lines = ['{{"title": "Bulk {0}", "isbn": "b1b1b1b1b{0:02d}", "publication_date": "2001-01-01", '
+                 '"author_id": 1}}\n'.format(i).encode() for i in range(6)]
+        messages = iter(enumerate(lines, 1))
+        imported_before_last_line = []
+
+        def imported():
+            with db.engine.connect() as connection:
+                return connection.scalar(db.select(db.func.count()).where(Book.title.like('Bulk %')))
+
+        async def receive():
+            number, line = next(messages)
+            if number == len(lines):
+                imported_before_last_line.append(imported())
+            return {'type': 'http.request', 'body': line, 'more_body': number < len(lines)}
+
+        status, body = asyncio.run(self.request('POST', '/api/books/bulk', headers={
+            'Content-Type': 'application/x-ndjson'}, receive=receive))
+        self.assertEqual((status, body['inserted']), (200, 6))
+        # Batches were committed while the client was still sending the rest.
+        self.assertGreaterEqual(imported_before_last_line[0], 2)
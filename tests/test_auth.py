@@ -1,8 +1,14 @@
 import os
+import threading
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 from flask_testing import TestCase
+from werkzeug.security import generate_password_hash
+
 from api import init_app
-from models import db
+from helpers.password_helper import HasherBusy, password_hasher
+from models import User, db
 
 
 class TestAuth(TestCase):
@@ -65,5 +71,50 @@ class TestAuth(TestCase):
         self.assertEqual(response.status_code, 401)
         self.assertEqual(response.json['message'], "Bad username or password")
 
+    def test_login_rehashes_outdated_password(self):
+        old_hash = generate_password_hash('aaabbbcccddd', method='pbkdf2:sha256:1000')
+        db.session.add(User(username='user1', password=old_hash))
+        db.session.commit()
+
+        response = self.client.post('api/login', json={"username": "user1", "password": "aaabbbcccddd"})
+        self.assertEqual(response.status_code, 200)
+        user = db.session.scalars(db.select(User).filter_by(username='user1')).one()
+        self.assertTrue(user.password.startswith('scrypt:'))
+        self.assertFalse(password_hasher.needs_rehash(user.password))
+
+        response = self.client.post('api/login', json={"username": "user1", "password": "aaabbbcccddd"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_login_succeeds_when_rehash_is_busy(self):
+        old_hash = generate_password_hash('aaabbbcccddd', method='pbkdf2:sha256:1000')
+        db.session.add(User(username='user1', password=old_hash))
+        db.session.commit()
 
+        with mock.patch.object(password_hasher, 'hash', side_effect=HasherBusy):
+            response = self.client.post('api/login', json={"username": "user1", "password": "aaabbbcccddd"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue("access_token" in response.json)
+        user = db.session.scalars(db.select(User).filter_by(username='user1')).one()
+        self.assertEqual(user.password, old_hash)
+
+    def test_login_busy(self):
+        password_hasher._slots = threading.BoundedSemaphore(1)
+        password_hasher._slots.acquire()
+        req_data = {"username": "user1", "password": "aaabbbcccddd"}
+        response = self.client.post('api/signup', json=req_data)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '1')
 
+    def test_hash_timeout_keeps_slot_until_done(self):
+        release = threading.Event()
+        password_hasher.shutdown()
+        password_hasher._executor = ThreadPoolExecutor(1)
+        password_hasher._slots = threading.BoundedSemaphore(1)
+        password_hasher.timeout = 0.01
+        with self.assertRaises(HasherBusy):
+            password_hasher._run(release.wait, 10)
+        # The hash still runs in the pool, so its slot stays taken.
+        self.assertFalse(password_hasher._slots.acquire(blocking=False))
+        release.set()
+        password_hasher._executor.shutdown(wait=True)
+        self.assertTrue(password_hasher._slots.acquire(blocking=False))
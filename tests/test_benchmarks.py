@@ -0,0 +1,24 @@
+import os
+
+from flask_testing import TestCase
+
+from api import init_app
+from benchmarks.run import Scenarios, api_routes
+from models import db
+
+
+class TestBenchmarkScenarios(TestCase):
+    def create_app(self):
+        os.environ['FLASK_ENV'] = 'test'
+        app = init_app()
+        return app
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_every_route_has_a_scenario(self):
+        scenarios = Scenarios({'authors': 10, 'books': 10, 'users': 10})
+        missing = ['{} {}'.format(method, rule) for endpoint, method, rule in api_routes(self.app)
+                   if scenarios.build(endpoint, method, rule, 0) is None]
+        self.assertEqual(missing, [])
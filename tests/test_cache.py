@@ -0,0 +1,160 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from helpers.cache_helper import LRUCacheBackend, SQLiteCacheBackend
+from helpers.single_flight_helper import SingleFlight
+
+
+class TestLRUCacheBackend(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCacheBackend(max_size=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_expires_entries(self):
+        cache = LRUCacheBackend(max_size=2, ttl=0.01)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=0)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 2)
+
+
+class TestSQLiteCacheBackend(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.db')
+        self.backends = []
+
+    def tearDown(self):
+        for backend in self.backends:
+            backend.dispose()
+        shutil.rmtree(self.directory)
+
+    def backend(self, namespace, **kwargs):
+        backend = SQLiteCacheBackend(self.path, namespace, **kwargs)
+        self.backends.append(backend)
+        return backend
+
+    def test_shared_between_instances(self):
+        # Separate instances over one file stand in for separate processes.
+        first, second = self.backend('responses'), self.backend('responses')
+        other = self.backend('tokens')
+        first.set('a', {'body': b'1'})
+        self.assertEqual(second.get('a'), {'body': b'1'})
+        self.assertIsNone(other.get('a'))
+        second.delete('a')
+        self.assertIsNone(first.get('a'))
+
+        first.set(b'key', 1)
+        first.set('b', 2)
+        second.delete_matching(lambda value: value == 1)
+        self.assertEqual((first.get(b'key'), first.get('b')), (None, 2))
+        other.set('c', 3)
+        first.clear()
+        self.assertEqual((len(first), len(other)), (0, 1))
+
+    def test_expires_and_prunes_oldest(self):
+        cache = self.backend('responses', max_size=2, ttl=0.01)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=0)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 2)
+        for key in 'cd':
+            cache.set(key, key, ttl=0)
+        cache.prune()
+        self.assertEqual(len(cache), 2)
+        self.assertEqual([cache.get(key) for key in 'bcd'], [None, 'c', 'd'])
+
+    def test_concurrent_updates_are_not_lost(self):
+        def add(count):
+            cache = self.backend('metrics')
+            for _ in range(count):
+                cache.update('total', lambda value: (value or 0) + 1)
+
+        threads = [threading.Thread(target=add, args=(50,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.backend('metrics').get('total'), 200)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def run_concurrently(self, fn, followers=3, until='coalesced'):
+        results = []
+
+        def call():
+            try:
+                results.append(self.flights.do('key', fn))
+            except Exception as e:
+                results.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        self.started.wait(1)
+        threads = [threading.Thread(target=call) for _ in range(followers)]
+        for thread in threads:
+            thread.start()
+        while self.flights.get_stats()[until] < followers:
+            time.sleep(0.001)
+        self.release.set()
+        for thread in [leader] + threads:
+            thread.join()
+        return results
+
+    def blocking(self, result):
+        def fn():
+            self.started.set()
+            self.release.wait(1)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return fn
+
+    def test_shares_one_call(self):
+        calls = []
+        result = object()
+
+        def fn():
+            calls.append(1)
+            return self.blocking(result)()
+
+        self.assertEqual(self.run_concurrently(fn), [result] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.flights.get_stats(),
+                         {'leaders': 1, 'coalesced': 3, 'timeouts': 0, 'errors': 0, 'in_flight': 0})
+        self.assertEqual(self.flights.do('key', lambda: 'again'), 'again')
+
+    def test_propagates_errors(self):
+        error = ValueError('boom')
+        self.assertEqual(self.run_concurrently(self.blocking(error)), [error] * 4)
+        self.assertEqual(self.flights.get_stats()['errors'], 1)
+
+    def test_waiters_time_out(self):
+        self.flights.timeout = 0.01
+        calls = []
+
+        def fn():
+            calls.append(1)
+            if len(calls) == 1:
+                return self.blocking('slow')()
+            return 'own'
+
+        self.assertEqual(sorted(self.run_concurrently(fn, followers=2, until='timeouts')), ['own', 'own', 'slow'])
+        self.assertEqual(self.flights.get_stats()['timeouts'], 2)
@@ -0,0 +1,92 @@
+import datetime
+import os
+
+from flask_restful import inputs, reqparse
+from flask_testing import TestCase
+from marshmallow import Schema, ValidationError, fields, post_load
+from werkzeug.exceptions import HTTPException
+
+from api import init_app
+from helpers.contract_helper import ArgsContract, compile_loader
+from models import Author, db
+from resources.base_resource import list_parser
+from schemas.author import author_patch_schema, author_schema
+from schemas.base import BaseSchema
+from schemas.book import book_import_schema, book_patch_schema, book_schema
+from schemas.user import user_schema
+
+
+def outcome(function):
+    try:
+        return 'ok', function()
+    except ValidationError as error:
+        return 'invalid', error.messages, error.valid_data
+    except HTTPException as error:
+        return error.code, getattr(error, 'data', None)
+
+
+class TestContracts(TestCase):
+    def create_app(self):
+        os.environ['FLASK_ENV'] = 'test'
+        app = init_app()
+        return app
+
+    def setUp(self):
+        db.session.add(Author(first_name='Author1', last_name='Surname1', birth_date=datetime.date(1960, 1, 1)))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_args_match_reqparse(self):
+        contract = ArgsContract(list_parser)
+        self.assertIsNotNone(contract.arguments)
+        for query in ('', 'page=2&per_page=50&q=tolkien&sort=-title&envelope=true&count=exact',
+                      'page=3&page=x', 'per_page=0', 'per_page=1001', 'page=-1', 'count=all',
+                      'envelope=maybe', 'cursor=&fields=id,title&ids=1,2&updated_since='):
+            with self.app.test_request_context('/api/books?' + query):
+                self.assertEqual(outcome(contract.parse_args), outcome(list_parser.parse_args), query)
+
+    def test_unsupported_args_fall_back(self):
+        parser = reqparse.RequestParser()
+        parser.add_argument('tags', type=str, location='args', action='append')
+        contract = ArgsContract(parser)
+        self.assertIsNone(contract.arguments)
+        with self.app.test_request_context('/api/books?tags=a&tags=b'):
+            self.assertEqual(contract.parse_args(), {'tags': ['a', 'b']})
+
+        parser = reqparse.RequestParser()
+        parser.add_argument('since', type=inputs.date, location='args')
+        self.assertIsNone(ArgsContract(parser).arguments)
+
+    def test_load_matches_marshmallow(self):
+        book = {'title': 'Book', 'isbn': '1234567890', 'publication_date': '2020-03-03', 'author_id': 1}
+        for schema, data in (
+                (book_schema, book),
+                (book_schema, dict(book, author_id=222)),
+                (book_schema, {'author_id': 'x', 'isbn': '1', 'publication_date': 'soon', 'extra': True}),
+                (book_schema, dict(book, author={'id': 1})),
+                (book_schema, ['not', 'an', 'object']),
+                (book_import_schema, dict(book, id=5)),
+                (book_patch_schema, {'title': 'New title'}),
+                (book_patch_schema, {'title': None}),
+                (author_schema, {'first_name': 'A', 'last_name': 'B', 'birth_date': '1970-01-02'}),
+                (author_patch_schema, {'biography': 'About...'}),
+                (user_schema, {'username': 'someone', 'password': 'secret123'}),
+                (user_schema, {'username': ''})):
+            self.assertIsNotNone(schema._loader)
+            self.assertEqual(outcome(lambda: schema.load(data)),
+                             outcome(lambda: Schema.load(schema, data)), (schema, data))
+
+    def test_unsupported_schema(self):
+        class TitleSchema(BaseSchema):
+            title = fields.Str()
+
+            @post_load
+            def strip(self, data, **kwargs):
+                return {'title': data['title'].strip()}
+
+        self.assertIsNone(compile_loader(TitleSchema()))
+        self.assertEqual(TitleSchema().load({'title': ' Book '}), {'title': 'Book'})
+        self.assertIsNone(compile_loader(BaseSchema(many=True)))
@@ -1,12 +1,23 @@
 import datetime
+import gzip
+import json
 import os
+import threading
+import time
 import unittest
+import zlib
 from flask_testing import TestCase
+from werkzeug.http import http_date
 from werkzeug.security import generate_password_hash
 from flask_jwt_extended import create_access_token
+from sqlalchemy import event
 
 from api import init_app
+from helpers.compression_helper import response_compression
+from helpers.metrics_helper import request_metrics
+from helpers.single_flight_helper import single_flight
 from models import Author, Book, User, db
+from tests.query_counter import QueryCounter
 
 
 class TestEndpoints(TestCase):
@@ -63,6 +74,15 @@ class TestEndpoints(TestCase):
         db.session.remove()
         db.drop_all()
 
+    def assertStatementCount(self, expected, method, url, **kwargs):
+        with QueryCounter(db.engine) as counter:
+            response = getattr(self.client, method)(url, headers=self.headers, **kwargs)
+        self.assertEqual(counter.count, expected, '\n'.join(counter.statements))
+        return response
+
+    def wait_for_changes_to_settle(self):
+        time.sleep(self.app.config['CHANGE_FEED_SETTLE_SECONDS'])
+
     # Author endpoints
     def test_get_all_authors(self):
         response = self.client.get('api/authors', headers=self.headers)
@@ -219,4 +239,600 @@ class TestEndpoints(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertListEqual(response.json, [
             {'id': 1, 'title': 'Book 1', 'isbn': "a1a1a1a1a1a", 'publication_date': "2020-03-03",}
-        ])
\ No newline at end of file
+        ])
+
+    def test_get_all_books_cursor_pagination(self):
+        response = self.client.get('api/books?per_page=1&cursor=&sort=-publication_date', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book['id'] for book in response.json['items']], [2])
+        self.assertIsNotNone(response.json['next_cursor'])
+
+        next_cursor = response.json['next_cursor']
+        response = self.client.get(f'api/books?per_page=1&cursor={next_cursor}&sort=-publication_date',
+                                   headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book['id'] for book in response.json['items']], [1])
+        self.assertIsNone(response.json['next_cursor'])
+
+    def test_get_author_books_cursor_pagination(self):
+        response = self.client.get('api/authors/1/books?cursor=&sort=title', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {
+            'items': [{'id': 1, 'title': 'Book 1', 'isbn': "a1a1a1a1a1a", 'publication_date': "2020-03-03"}],
+            'next_cursor': None,
+            'has_next': False,
+            'next': None,
+        })
+
+    def test_pagination_envelope(self):
+        response = self.client.get('api/books?per_page=1&envelope=true', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book['id'] for book in response.json['items']], [1])
+        self.assertEqual(response.json['total'], 2)
+        self.assertEqual((response.json['page'], response.json['per_page']), (1, 1))
+        self.assertTrue(response.json['has_next'])
+        self.assertTrue(response.json['next'].endswith('/api/books?per_page=1&envelope=true&page=2'))
+
+        response = self.client.get('api/books?per_page=1&page=2&count=exact', headers=self.headers)
+        self.assertEqual([book['id'] for book in response.json['items']], [2])
+        self.assertEqual(response.json['total'], 2)
+        self.assertFalse(response.json['has_next'])
+        self.assertIsNone(response.json['next'])
+
+        response = self.client.get('api/authors/1/books?cursor=&count=approximate', headers=self.headers)
+        self.assertEqual(response.json['total'], 1)
+
+        response = self.client.get('api/books?q=book&envelope=true', headers=self.headers)
+        self.assertEqual(response.json['total'], 2)
+
+        response = self.client.get('api/books?count=some', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_author_aggregates(self):
+        fields = 'fields=id,book_count,first_publication_date,last_publication_date'
+
+        def summaries():
+            return self.client.get(f'api/authors?{fields}', headers=self.headers).json
+
+        self.assertEqual(summaries(), [
+            {'id': 1, 'book_count': 1, 'first_publication_date': '2020-03-03', 'last_publication_date': '2020-03-03'},
+            {'id': 2, 'book_count': 1, 'first_publication_date': '2020-06-06', 'last_publication_date': '2020-06-06'},
+        ])
+        self.assertEqual(self.client.get(f'api/authors/1?{fields}', headers=self.headers).json['book_count'], 1)
+
+        data = {'title': 'Book 3', 'isbn': "a1a1a1a1a1c", 'publication_date': "2019-09-09", "author_id": 1}
+        self.client.post('api/books', json=data, headers=self.headers)
+        self.assertEqual(summaries()[0], {'id': 1, 'book_count': 2, 'first_publication_date': '2019-09-09',
+                                          'last_publication_date': '2020-03-03'})
+        self.assertEqual(self.client.get(f'api/authors/1?{fields}', headers=self.headers).json['book_count'], 2)
+
+        self.client.put('api/books/3', json=dict(data, author_id=2), headers=self.headers)
+        self.assertEqual(summaries(), [
+            {'id': 1, 'book_count': 1, 'first_publication_date': '2020-03-03', 'last_publication_date': '2020-03-03'},
+            {'id': 2, 'book_count': 2, 'first_publication_date': '2019-09-09', 'last_publication_date': '2020-06-06'},
+        ])
+
+        self.client.delete('api/books/1', headers=self.headers)
+        self.client.delete('api/books/3', headers=self.headers)
+        self.assertEqual(summaries(), [
+            {'id': 1, 'book_count': 0, 'first_publication_date': None, 'last_publication_date': None},
+            {'id': 2, 'book_count': 1, 'first_publication_date': '2020-06-06', 'last_publication_date': '2020-06-06'},
+        ])
+
+        runner = self.app.test_cli_runner()
+        self.assertEqual(runner.invoke(args=['check-aggregates']).exit_code, 0)
+        db.session.execute(db.text("UPDATE author SET book_count = 5 WHERE id = 2"))
+        db.session.commit()
+        result = runner.invoke(args=['check-aggregates'])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('author 2: (5, ', result.output)
+        self.assertEqual(runner.invoke(args=['rebuild-aggregates']).exit_code, 0)
+        self.assertEqual(runner.invoke(args=['check-aggregates']).exit_code, 0)
+        self.assertEqual(summaries()[1]['book_count'], 1)
+
+    def test_counters(self):
+        def totals():
+            return [self.client.get(url, headers=self.headers).json['total']
+                    for url in ('api/books?envelope=true', 'api/authors?envelope=true',
+                                'api/authors/1/books?envelope=true', 'api/authors/2/books?envelope=true')]
+
+        self.assertEqual(totals(), [2, 2, 1, 1])
+        data = {'title': 'Book 3', 'isbn': "a1a1a1a1a1c", 'publication_date': "2020-09-09", "author_id": 1}
+        self.client.post('api/books', json=data, headers=self.headers)
+        self.assertEqual(totals(), [3, 2, 2, 1])
+        data = dict(data, author_id=2)
+        self.client.put('api/books/3', json=data, headers=self.headers)
+        self.assertEqual(totals(), [3, 2, 1, 2])
+        self.client.delete('api/books/3', headers=self.headers)
+        self.assertEqual(totals(), [2, 2, 1, 1])
+        line = '{"title": "Bulk", "isbn": "b1b1b1b1b1b", "publication_date": "2001-01-01", "author_id": 2}'
+        self.client.post('api/books/bulk', data=line, content_type='application/x-ndjson', headers=self.headers)
+        self.assertEqual(totals(), [3, 2, 1, 2])
+
+        db.session.execute(db.text("UPDATE counters SET value = 7 WHERE name = 'books'"))
+        db.session.execute(db.text("DELETE FROM counters WHERE name = 'authors'"))
+        db.session.commit()
+        result = self.app.test_cli_runner().invoke(args=['reconcile-counts'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(result.output.splitlines(),
+                         ['authors: 0 -> 2', 'books: 7 -> 3', '2 counters reconciled'])
+        self.assertEqual(totals(), [3, 2, 1, 2])
+
+    def test_change_feed(self):
+        self.wait_for_changes_to_settle()
+        response = self.client.get('api/books?updated_since=&per_page=1', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book['id'] for book in response.json['items']], [1])
+        self.assertEqual(response.json['deleted'], [])
+        self.assertTrue(response.json['has_next'])
+        response = self.client.get(response.json['next'], headers=self.headers)
+        self.assertEqual([book['id'] for book in response.json['items']], [2])
+        self.assertFalse(response.json['has_next'])
+        self.assertIsNone(response.json['next'])
+        cursor = response.json['next_cursor']
+
+        response = self.client.get(f'api/books?updated_since={cursor}', headers=self.headers)
+        self.assertEqual(response.json, {'items': [], 'deleted': [], 'next_cursor': cursor,
+                                         'has_next': False, 'next': None})
+
+        data = {'title': 'Book 1 revised', 'isbn': "a1a1a1a1a1a", 'publication_date': "2020-03-03", "author_id": 1}
+        self.client.put('api/books/1', json=data, headers=self.headers)
+        data = {'title': 'Book 3', 'isbn': "a1a1a1a1a1c", 'publication_date': "2020-09-09", "author_id": 2}
+        self.client.post('api/books', json=data, headers=self.headers)
+        self.client.delete('api/books/2', headers=self.headers)
+        response = self.client.get(f'api/books?updated_since={cursor}&fields=id,title', headers=self.headers)
+        self.assertEqual(response.json['items'], [])
+        self.wait_for_changes_to_settle()
+        response = self.client.get(f'api/books?updated_since={cursor}&fields=id,title', headers=self.headers)
+        self.assertEqual(response.json['items'], [{'id': 1, 'title': 'Book 1 revised'}, {'id': 3, 'title': 'Book 3'}])
+        self.assertEqual(response.json['deleted'], [2])
+
+        book = db.session.get(Book, 1)
+        self.assertGreater(book.updated_at, book.created_at)
+        since = book.updated_at.isoformat() + 'Z'
+        response = self.client.get(f'api/books?updated_since={since}', headers=self.headers)
+        self.assertEqual([book['id'] for book in response.json['items']], [1, 3])
+
+        response = self.client.get('api/authors?updated_since=', headers=self.headers)
+        self.assertEqual([author['id'] for author in response.json['items']], [1, 2])
+        response = self.client.get('api/authors?updated_since=garbage', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('api/authors/1/books?updated_since=', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+        os.environ['CHANGE_FEED_SETTLE_SECONDS'] = '0'
+        try:
+            with self.assertRaises(ValueError):
+                init_app()
+        finally:
+            del os.environ['CHANGE_FEED_SETTLE_SECONDS']
+
+    def test_get_all_authors_cursor_pagination_errors(self):
+        response = self.client.get('api/authors?cursor=garbage', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('api/authors?per_page=1&cursor=', headers=self.headers)
+        next_cursor = response.json['next_cursor']
+        response = self.client.get(f'api/authors?cursor={next_cursor}&sort=last_name', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('api/authors?sort=biography', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_argument_errors(self):
+        for query, name, message in (('per_page=0', 'per_page', 'Items per page, from 1 to 1000'),
+                                     ('per_page=1001', 'per_page', 'Items per page, from 1 to 1000'),
+                                     ('page=0', 'page', 'Page number'),
+                                     ('page=x', 'page', 'Page number'),
+                                     ('count=all', 'count', 'How to count the total'),
+                                     ('envelope=maybe', 'envelope', 'Wrap offset pages in an envelope with '
+                                                                    'pagination metadata')):
+            response = self.client.get('api/books?' + query, headers=self.headers)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertEqual(response.json, {'message': {name: message}})
+
+        response = self.client.get('api/books/export?format=xml', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json, {'message': {'format': 'Export format'}})
+
+    def test_search_books(self):
+        data = {'title': 'The Hobbit', 'isbn': "9780261102217", 'publication_date': "1937-09-21", "author_id": 2}
+        response = self.client.post('api/books', json=data, headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get('api/books?q=hobb', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([book['id'] for book in response.json], [3])
+
+        response = self.client.get('api/books?q=97802611', headers=self.headers)
+        self.assertEqual([book['id'] for book in response.json], [3])
+
+        response = self.client.get('api/books?q=book&sort=-id', headers=self.headers)
+        self.assertEqual([book['id'] for book in response.json], [2, 1])
+
+        response = self.client.get('api/authors/1/books?q=book', headers=self.headers)
+        self.assertEqual([book['id'] for book in response.json], [1])
+
+        data['title'] = 'The Silmarillion'
+        self.client.put('api/books/3', json=data, headers=self.headers)
+        response = self.client.get('api/books?q=hobbit', headers=self.headers)
+        self.assertEqual(response.json, [])
+        response = self.client.get('api/books?q=silmarillion&cursor=', headers=self.headers)
+        self.assertEqual([book['id'] for book in response.json['items']], [3])
+
+        self.client.delete('api/books/3', headers=self.headers)
+        response = self.client.get('api/books?q=silmarillion', headers=self.headers)
+        self.assertEqual(response.json, [])
+
+    def test_search_authors(self):
+        response = self.client.get('api/authors?q=surname2', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([author['id'] for author in response.json], [2])
+
+        response = self.client.get('api/authors?q=author surname', headers=self.headers)
+        self.assertEqual(len(response.json), 2)
+
+        response = self.client.get('api/authors?q=nobody', headers=self.headers)
+        self.assertEqual(response.json, [])
+
+    def test_statement_counts(self):
+        response = self.assertStatementCount(1, 'get', 'api/books')
+        self.assertEqual(response.json[1]['author'], {'id': 2, 'first_name': 'Author2', "last_name": "Surname2"})
+        self.assertStatementCount(1, 'get', 'api/books?cursor=&sort=title')
+        self.assertStatementCount(1, 'get', 'api/books?q=book')
+        response = self.assertStatementCount(1, 'get', 'api/books/1')
+        self.assertEqual(response.json['author'], {'id': 1, 'first_name': 'Author1', "last_name": "Surname1"})
+        self.assertStatementCount(1, 'get', 'api/authors')
+        self.assertStatementCount(2, 'get', 'api/authors/1/books')
+
+    def test_sparse_fieldsets(self):
+        with QueryCounter(db.engine) as counter:
+            response = self.client.get('api/books?fields=id,title', headers=self.headers)
+        self.assertEqual(response.json[0], {'id': 1, 'title': 'Book 1'})
+        self.assertNotIn('author', counter.statements[0])
+        self.assertNotIn('isbn', counter.statements[0])
+
+        response = self.client.get('api/books?fields=title&cursor=&per_page=1', headers=self.headers)
+        self.assertEqual(response.json['items'], [{'title': 'Book 1'}])
+        response = self.client.get('api/books?fields=title&per_page=1&cursor=' + response.json['next_cursor'],
+                                   headers=self.headers)
+        self.assertEqual(response.json['items'], [{'title': 'Book 2'}])
+
+        with QueryCounter(db.engine) as counter:
+            response = self.client.get('api/books/2?fields=title,author', headers=self.headers)
+        self.assertEqual(response.json, {'title': 'Book 2', 'author': {'id': 2, 'first_name': 'Author2',
+                                                                       'last_name': 'Surname2'}})
+        self.assertNotIn('isbn', counter.statements[0])
+        response = self.client.get('api/authors/1?fields=last_name', headers=self.headers)
+        self.assertEqual(response.json, {'last_name': 'Surname1'})
+        response = self.client.get('api/authors/1/books?fields=isbn', headers=self.headers)
+        self.assertEqual(response.json, [{'isbn': 'a1a1a1a1a1a'}])
+
+        response = self.client.get('api/books?fields=id,password', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('api/books/1?fields=author_id', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_get_books_by_ids(self):
+        response = self.assertStatementCount(1, 'get', 'api/books?ids=2,7,1')
+        self.assertEqual([item and item['title'] for item in response.json['items']], ['Book 2', None, 'Book 1'])
+        self.assertEqual(response.json['items'][0]['author']['last_name'], 'Surname2')
+        self.assertEqual(response.json['missing'], [7])
+
+        response = self.client.get('api/authors?ids=1&fields=last_name', headers=self.headers)
+        self.assertEqual(response.json, {'items': [{'last_name': 'Surname1'}], 'missing': []})
+
+        self.assertEqual(self.client.get('api/books?ids=1,x', headers=self.headers).status_code, 400)
+        too_many = ','.join(str(id) for id in range(self.app.config['BATCH_MAX_IDS'] + 1))
+        self.assertEqual(self.client.get('api/books?ids=' + too_many, headers=self.headers).status_code, 400)
+
+    def test_batch(self):
+        requests = ['/api/books?ids=1,2&fields=title', '/api/authors/2?fields=first_name', '/api/authors/9',
+                    '/api/authors/1/books', '/api/books/export', '/api/nowhere']
+        response = self.client.post('api/batch', headers=self.headers, json={'requests': requests})
+        self.assertEqual(response.status_code, 200)
+        responses = response.json['responses']
+        self.assertEqual(responses[0], {'status': 200, 'body': {'items': [{'title': 'Book 1'}, {'title': 'Book 2'}],
+                                                                'missing': []}})
+        self.assertEqual(responses[1], {'status': 200, 'body': {'first_name': 'Author2'}})
+        self.assertEqual(responses[2]['status'], 404)
+        self.assertEqual(responses[3]['body'][0]['title'], 'Book 1')
+        self.assertEqual([r['status'] for r in responses[4:]], [400, 404])
+
+        response = self.client.post('api/batch', headers=self.headers, json={'requests': '/api/books'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('api/batch', json={'requests': ['/api/books']})
+        self.assertNotEqual(response.status_code, 200)
+
+    def test_conditional_get(self):
+        response = self.client.get('api/books/1', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertIsNotNone(response.headers['Last-Modified'])
+
+        response = self.assertStatementCount(0, 'get', 'api/books/1')
+        self.assertEqual(response.headers['ETag'], etag)
+
+        response = self.client.get('api/books/1', headers={**self.headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get('api/cache/stats', headers=self.headers)
+        self.assertEqual(response.json['hits'], 2)
+        self.assertEqual(response.json['misses'], 1)
+        self.assertEqual(response.json['not_modified'], 1)
+
+    def test_if_modified_since_after_write_in_same_second(self):
+        last_modified = self.client.get('api/books/1', headers=self.headers).headers['Last-Modified']
+        response = self.client.patch('api/books/1', json={'title': 'Patched'}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get('api/books/1', headers={**self.headers, 'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['title'], 'Patched')
+
+        later = http_date(time.time() + 10)
+        response = self.client.get('api/books/1', headers={**self.headers, 'If-Modified-Since': later})
+        self.assertEqual(response.status_code, 304)
+
+    def test_patch_book(self):
+        etag = self.client.get('api/books/1', headers=self.headers).headers['ETag']
+        self.assertTrue(etag.startswith('"1-'))
+
+        response = self.assertStatementCount(1, 'patch', 'api/books/1', json={'title': 'Patched'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {'id': 1, 'title': 'Patched', 'isbn': "a1a1a1a1a1a",
+                                         'publication_date': "2020-03-03",
+                                         "author": {'id': 1, 'first_name': 'Author1', "last_name": "Surname1"}})
+        response = self.client.get('api/books/1', headers=self.headers)
+        self.assertEqual(response.json['title'], 'Patched')
+        self.assertTrue(response.headers['ETag'].startswith('"2-'))
+
+        response = self.client.patch('api/books/1', json={'title': 'Stale'}, headers={**self.headers, 'If-Match': etag})
+        self.assertEqual(response.status_code, 412)
+        response = self.client.patch('api/books/1', json={'title': 'Stale', 'version': 1}, headers=self.headers)
+        self.assertEqual(response.status_code, 409)
+        etag = self.client.get('api/books/1', headers=self.headers).headers['ETag']
+        response = self.client.patch('api/books/1', json={'title': 'Fresh'}, headers={**self.headers, 'If-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['ETag'].startswith('"3-'))
+
+        response = self.client.patch('api/books/1', json={'author_id': 2, 'version': 3}, headers=self.headers)
+        self.assertEqual(response.json['author']['id'], 2)
+        self.assertEqual(len(self.client.get('api/authors/2/books', headers=self.headers).json), 2)
+        response = self.client.get('api/authors/2?fields=id,book_count', headers=self.headers)
+        self.assertEqual(response.json, {'id': 2, 'book_count': 2})
+
+        response = self.client.patch('api/books/1', json={'author_id': 99}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json['errors'], {'author_id': ['Author id 99 does not exist.']})
+        response = self.client.patch('api/books/1', json={'isbn': 'short'}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch('api/books/444', json={'title': 'Missing'}, headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.put('api/books/1', json={'title': 'Put', 'isbn': "a1a1a1a1a1a", 'version': 1,
+                                                        'publication_date': "2020-03-03", "author_id": 2},
+                                   headers=self.headers)
+        self.assertEqual(response.status_code, 409)
+
+    def test_patch_author(self):
+        self.client.get('api/books/1', headers=self.headers)
+        response = self.assertStatementCount(1, 'patch', 'api/authors/1', json={'biography': 'Patched'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['biography'], 'Patched')
+        etag = response.headers['ETag']
+        response = self.client.get('api/authors/1', headers=self.headers)
+        self.assertEqual(response.json['biography'], 'Patched')
+        self.assertEqual(response.headers['ETag'], etag)
+
+        response = self.client.patch('api/authors/1', json={'first_name': 'Renamed'},
+                                     headers={**self.headers, 'If-Match': '"1-abc"'})
+        self.assertEqual(response.status_code, 412)
+        response = self.client.patch('api/authors/1', json={'first_name': 'Renamed'},
+                                     headers={**self.headers, 'If-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('api/books/1', headers=self.headers).json['author']['first_name'], 'Renamed')
+        response = self.client.patch('api/authors/1', json={}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_author_books_set_based_writes(self):
+        self.client.get('api/books/1', headers=self.headers)
+        self.client.get('api/authors/2/books', headers=self.headers)
+        response = self.client.patch('api/authors/1/books', json={'author_id': 2}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {'updated': 1})
+        self.assertEqual(self.client.get('api/books/1', headers=self.headers).json['author']['id'], 2)
+        self.assertEqual(len(self.client.get('api/authors/2/books', headers=self.headers).json), 2)
+        response = self.client.get('api/authors?fields=id,book_count', headers=self.headers)
+        self.assertEqual(response.json, [{'id': 1, 'book_count': 0}, {'id': 2, 'book_count': 2}])
+
+        response = self.assertStatementCount(5, 'delete', 'api/authors/2/books')
+        self.assertEqual(response.json, {'deleted': 2})
+        self.assertEqual(self.client.get('api/books/1', headers=self.headers).status_code, 404)
+        self.assertEqual(self.client.get('api/authors/2/books', headers=self.headers).json, [])
+        self.assertEqual(self.client.get('api/books?envelope=true', headers=self.headers).json['total'], 0)
+        self.wait_for_changes_to_settle()
+        response = self.client.get('api/books?updated_since=', headers=self.headers)
+        self.assertEqual(response.json['deleted'], [1, 2])
+        self.assertEqual(self.app.test_cli_runner().invoke(args=['check-aggregates']).exit_code, 0)
+
+        response = self.client.patch('api/authors/1/books', json={'author_id': 99}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.delete('api/authors/444/books', headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_cache_invalidation(self):
+        etag = self.client.get('api/books/1', headers=self.headers).headers['ETag']
+        self.client.get('api/authors/1', headers=self.headers)
+        self.client.get('api/authors/1/books', headers=self.headers)
+        self.client.get('api/authors/2/books', headers=self.headers)
+
+        data = {'first_name': 'Renamed', "last_name": "Surname1"}
+        self.client.put('api/authors/1', json=data, headers=self.headers)
+        response = self.client.get('api/books/1', headers={**self.headers, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['author']['first_name'], 'Renamed')
+        self.assertEqual(self.client.get('api/authors/1', headers=self.headers).json['first_name'], 'Renamed')
+
+        data = {'title': 'Book 1', 'isbn': "a1a1a1a1a1a", 'publication_date': "2020-03-03", "author_id": 2}
+        self.client.put('api/books/1', json=data, headers=self.headers)
+        self.assertEqual(self.client.get('api/authors/1/books', headers=self.headers).json, [])
+        self.assertEqual(len(self.client.get('api/authors/2/books', headers=self.headers).json), 2)
+
+        self.client.delete('api/books/2', headers=self.headers)
+        self.assertEqual(len(self.client.get('api/authors/2/books', headers=self.headers).json), 1)
+        self.assertEqual(self.client.get('api/books/2', headers=self.headers).status_code, 404)
+
+    def test_concurrent_reads_are_coalesced(self):
+        def slow_query(conn, cursor, statement, parameters, context, executemany):
+            time.sleep(0.2)
+
+        responses = []
+
+        def get(url):
+            with self.app.test_client() as client:
+                responses.append(client.get(url, headers=self.headers))
+
+        for url in ('api/books/1', 'api/books/99'):
+            responses.clear()
+            threads = [threading.Thread(target=get, args=(url,)) for _ in range(4)]
+            event.listen(db.engine, 'before_cursor_execute', slow_query)
+            try:
+                with QueryCounter(db.engine) as counter:
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', slow_query)
+            self.assertEqual(counter.count, 1, '\n'.join(counter.statements))
+            self.assertEqual(len({(response.status_code, response.data) for response in responses}), 1)
+
+        self.assertEqual(responses[0].status_code, 404)
+        stats = single_flight.get_stats()
+        self.assertEqual((stats['leaders'], stats['coalesced'], stats['errors']), (2, 6, 1))
+        self.assertIn('single_flight_coalesced_total 6', self.client.get('metrics').data.decode())
+
+    def test_compression(self):
+        identity = self.client.get('api/books', headers=self.headers)
+        response = self.client.get('api/books', headers={**self.headers, 'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.data, identity.data)
+
+        response_compression.min_size = 0
+        response = self.client.get('api/books', headers={**self.headers, 'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertEqual(gzip.decompress(response.data), identity.data)
+        response = self.client.get('api/books', headers={**self.headers, 'Accept-Encoding': 'gzip;q=0, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'deflate')
+        self.assertEqual(zlib.decompress(response.data), identity.data)
+        response = self.client.get('api/books', headers={**self.headers, 'Accept-Encoding': 'br'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+        response = self.client.get('api/books/1', headers={**self.headers, 'Accept-Encoding': 'gzip'})
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('W/"1-'))
+        response = self.client.get('api/books/1', headers={**self.headers, 'Accept-Encoding': 'gzip',
+                                                           'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        response = self.client.patch('api/books/1', json={'title': 'Zipped'},
+                                     headers={**self.headers, 'If-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+        identity = self.client.get('api/books/export?format=csv', headers=self.headers)
+        response = self.client.get('api/books/export?format=csv', headers={**self.headers, 'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response.headers)
+        self.assertEqual(gzip.decompress(response.data), identity.data)
+
+        metrics = self.client.get('metrics').data.decode()
+        self.assertIn('response_compression_responses_total 4', metrics)
+
+    def test_bulk_import_books_ndjson(self):
+        lines = [
+            '{"title": "Bulk 1", "isbn": "b1b1b1b1b1b", "publication_date": "2001-01-01", "author_id": 1}',
+            '{"title": "Bulk 2", "isbn": "short", "publication_date": "2001-01-01", "author_id": 1}',
+            '',
+            '{"title": "Bulk 3", "isbn": "b1b1b1b1b1c", "publication_date": "2001-01-01", "author_id": 99}',
+            'not json',
+            '{"title": "Bulk 4", "isbn": "b1b1b1b1b1d", "publication_date": "2001-01-01", "author_id": 2}',
+        ]
+        self.client.get('api/authors/1/books', headers=self.headers)
+        response = self.assertStatementCount(4, 'post', 'api/books/bulk', data='\n'.join(lines),
+                                             content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {'inserted': 2, 'failed': 3, 'errors': [
+            {'line': 2, 'errors': {'isbn': ['Length must be between 10 and 13.']}},
+            {'line': 5, 'errors': {'_schema': ['Invalid JSON.']}},
+            {'line': 4, 'errors': {'author_id': ['Author id 99 does not exist.']}},
+        ]})
+
+        response = self.client.get('api/authors/1/books', headers=self.headers)
+        self.assertEqual([book['title'] for book in response.json], ['Book 1', 'Bulk 1'])
+        response = self.client.get('api/books?q=bulk', headers=self.headers)
+        self.assertEqual(len(response.json), 2)
+
+    def test_bulk_import_authors_csv(self):
+        data = 'first_name,last_name,birth_date,biography\nAuthor3,Surname3,1970-01-01,\n,Surname4,,\n'
+        response = self.client.post('api/authors/bulk', data=data, content_type='text/csv', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {'inserted': 1, 'failed': 1, 'errors': [
+            {'line': 3, 'errors': {'first_name': ['Missing data for required field.']}},
+        ]})
+        response = self.client.get('api/authors/3', headers=self.headers)
+        self.assertEqual(response.json, {'id': 3, 'first_name': 'Author3', 'last_name': 'Surname3',
+                                         'birth_date': '1970-01-01', 'biography': None})
+
+        response = self.client.post('api/authors/bulk', data='{}', content_type='application/json',
+                                    headers=self.headers)
+        self.assertEqual(response.status_code, 415)
+
+    def test_export_books(self):
+        response = self.client.get('api/books/export', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        books = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(books, self.client.get('api/books', headers=self.headers).json)
+
+        response = self.client.get('api/books/export?format=csv', headers=self.headers)
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertEqual(response.data.decode().splitlines(), [
+            'id,title,isbn,publication_date,author_id,author_first_name,author_last_name',
+            '1,Book 1,a1a1a1a1a1a,2020-03-03,1,Author1,Surname1',
+            '2,Book 2,a1a1a1a1a1b,2020-06-06,2,Author2,Surname2',
+        ])
+
+        response = self.client.get('api/books/export?format=xml', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_authors(self):
+        response = self.client.get('api/authors/export', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        authors = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(authors, self.client.get('api/authors', headers=self.headers).json)
+
+    def test_server_timing_and_metrics(self):
+        response = self.client.get('api/books', headers=self.headers)
+        server_timing = response.headers['Server-Timing']
+        self.assertIn('sql;dur=', server_timing)
+        self.assertIn('desc="1 queries"', server_timing)
+        self.assertIn('serialize;dur=', server_timing)
+        self.assertIn('auth;dur=', server_timing)
+        self.assertIn('total;dur=', server_timing)
+
+        response = self.client.get('metrics')
+        self.assertEqual(response.status_code, 200)
+        metrics = response.data.decode()
+        self.assertIn('http_request_duration_seconds_count{endpoint="bookslist",method="GET"} 1', metrics)
+        self.assertIn('app_sql_statements_total{endpoint="bookslist",method="GET"} 1', metrics)
+        self.assertIn('response_cache_hits_total 0', metrics)
+
+    def test_metrics_sampling(self):
+        request_metrics.sample_rate = 0
+        response = self.client.get('api/books', headers=self.headers)
+        self.assertNotIn('Server-Timing', response.headers)
+        metrics = self.client.get('metrics').data.decode()
+        self.assertIn('http_request_duration_seconds_count{endpoint="bookslist",method="GET"} 1', metrics)
+        self.assertNotIn('app_sql_statements_total{endpoint="bookslist"', metrics)
@@ -0,0 +1,174 @@
+import datetime
+import json
+import os
+import threading
+import time
+
+from flask_jwt_extended import create_access_token
+from flask_testing import TestCase
+
+from api import init_app
+from helpers.job_helper import job_runner
+from models import Author, Book, Job, db
+
+
+class TestJobs(TestCase):
+    def create_app(self):
+        os.environ['FLASK_ENV'] = 'test'
+        app = init_app()
+        return app
+
+    def setUp(self):
+        author1 = Author(first_name='Author1', last_name='Surname1', birth_date=datetime.date(1960, 1, 1))
+        author2 = Author(first_name='Author2', last_name='Surname2', birth_date=datetime.date(1965, 5, 5))
+        db.session.add_all([author1, author2])
+        db.session.commit()
+        db.session.add_all([Book(title='Book {}'.format(i), isbn='a1a1a1a1a1{}'.format(i),
+                                 publication_date=datetime.date(2020, 1, i), author_id=author1.id)
+                            for i in range(1, 6)])
+        db.session.add(Book(title='Other', isbn='b1b1b1b1b1b', publication_date=None, author_id=author2.id))
+        db.session.commit()
+        self.headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity='test'))}
+        job_runner.start()
+
+    def tearDown(self):
+        job_runner.stop()
+        db.session.remove()
+        db.drop_all()
+
+    def wait_for(self, job_id, timeout=10):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            # Requests share the test's session; end its transaction so each poll reads the latest commit.
+            db.session.rollback()
+            response = self.client.get('api/jobs/{}'.format(job_id), headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            if response.json['status'] in ('succeeded', 'failed'):
+                return response.json
+            time.sleep(0.02)
+        self.fail('job {} did not finish'.format(job_id))
+
+    def test_delete_author(self):
+        response = self.client.post('api/jobs', json={'kind': 'delete_author', 'params': {'author_id': 1}},
+                                    headers=self.headers)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.headers['Location'], '/api/jobs/{}'.format(response.json['id']))
+        self.assertEqual(response.json['total'], 5)
+
+        job = self.wait_for(response.json['id'])
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['done'], 5)
+        self.assertEqual(job['result'], {'author_id': 1, 'deleted': True, 'detached_books': 5})
+        # JOB_CHUNK_SIZE is 2 in the test environment.
+        self.assertEqual(job_runner.get_stats()['chunks'], 4)
+
+        db.session.expire_all()
+        self.assertIsNone(db.session.get(Author, 1))
+        self.assertEqual(Book.query.filter(Book.author_id.is_(None)).count(), 5)
+        self.assertEqual(self.client.get('api/authors/1', headers=self.headers).status_code, 404)
+        self.assertEqual(self.client.get('api/books/1', headers=self.headers).json['author'], None)
+
+    def test_delete_author_with_many_books_runs_as_job(self):
+        # AUTHOR_DELETE_MAX_SYNC_BOOKS is 4 in the test environment; author 1 has 5 books, author 2 one.
+        response = self.client.delete('api/authors/1', headers=self.headers)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.headers['Location'], '/api/jobs/{}'.format(response.json['id']))
+        self.assertEqual((response.json['kind'], response.json['total']), ('delete_author', 5))
+
+        job = self.wait_for(response.json['id'])
+        self.assertEqual(job['result'], {'author_id': 1, 'deleted': True, 'detached_books': 5})
+        self.assertEqual(self.client.get('api/authors/1', headers=self.headers).status_code, 404)
+
+        self.assertEqual(self.client.delete('api/authors/2', headers=self.headers).status_code, 204)
+        self.assertEqual(self.client.get('api/authors/2', headers=self.headers).status_code, 404)
+
+    def test_enqueue_validation(self):
+        for body, errors in (({'kind': 'nothing'}, {'kind': ['Unknown job kind.']}),
+                             ({'kind': 'import_books'}, {'kind': ['Unknown job kind.']}),
+                             ({'kind': 'delete_author', 'params': {'author_id': 99}},
+                              {'params': {'author_id': ['Author id 99 does not exist.']}}),
+                             ({'kind': 'rebuild_aggregates', 'params': {'all': True}},
+                              {'params': {'all': ['Unknown field.']}})):
+            response = self.client.post('api/jobs', json=body, headers=self.headers)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json['errors'], errors)
+        self.assertEqual(self.client.get('api/jobs/99', headers=self.headers).status_code, 404)
+
+    def test_rebuild_aggregates(self):
+        db.session.execute(db.update(Author).values(book_count=0, first_publication_date=None))
+        db.session.commit()
+
+        response = self.client.post('api/jobs', json={'kind': 'rebuild_aggregates'}, headers=self.headers)
+        self.assertEqual(response.status_code, 202)
+        job = self.wait_for(response.json['id'])
+        self.assertEqual((job['status'], job['done'], job['total']), ('succeeded', 2, 2))
+        db.session.expire_all()
+        authors = Author.query.order_by(Author.id).all()
+        self.assertEqual([(author.book_count, author.first_publication_date) for author in authors],
+                         [(5, datetime.date(2020, 1, 1)), (1, None)])
+
+    def test_import_books(self):
+        books = [{'title': 'New {}'.format(i), 'isbn': '978000000000{}'.format(i), 'publication_date': '2021-01-01',
+                  'author_id': 2 if i < 3 else 99} for i in range(4)]
+        response = self.client.post('api/books/bulk/jobs', data='\n'.join(json.dumps(book) for book in books),
+                                    headers=self.headers, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 202)
+        job = self.wait_for(response.json['id'])
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual(job['done'], 4)
+        self.assertEqual(job['result']['inserted'], 3)
+        self.assertEqual(job['result']['errors'],
+                         [{'line': 4, 'errors': {'author_id': ['Author id 99 does not exist.']}}])
+        self.assertEqual(os.listdir(os.path.join(self.app.instance_path, 'jobs')), [])
+        self.assertEqual(self.client.get('api/authors/2?fields=book_count', headers=self.headers).json['book_count'], 4)
+
+        response = self.client.post('api/authors/bulk/jobs', data='first_name,last_name\nA,B\n',
+                                    headers=self.headers, content_type='text/csv')
+        self.assertEqual(self.wait_for(response.json['id'])['result'], {'inserted': 1, 'failed': 0, 'errors': []})
+        response = self.client.post('api/authors/bulk/jobs', data='{}', headers=self.headers)
+        self.assertEqual(response.status_code, 415)
+
+    def test_resume_after_restart(self):
+        # A job whose runner died after two chunks: its lease has run out, so it is claimed again.
+        db.session.add(Job(kind='delete_author', status='running', params={'author_id': 1}, state={'detached': 2},
+                           done=2, total=5, owner='gone', heartbeat_at=datetime.datetime(2000, 1, 1)))
+        db.session.execute(db.update(Book).where(Book.id.in_([1, 2])).values(author_id=None))
+        db.session.commit()
+
+        job = self.wait_for(1)
+        self.assertEqual((job['status'], job['done']), ('succeeded', 5))
+        self.assertEqual(job['result'], {'author_id': 1, 'deleted': True, 'detached_books': 5})
+
+    def test_stopped_jobs_are_released_and_resumed(self):
+        started, proceed = threading.Event(), threading.Event()
+        seen = []
+
+        @job_runner.task('test_steps')
+        def steps(session, params, state, chunk_size):
+            for step in range(state.get('step', 0), 3):
+                if step == 1 and not proceed.is_set():
+                    started.set()
+                    proceed.wait(10)
+                seen.append(step)
+                yield {'step': step + 1}, 1
+            return {'steps': 3}
+
+        job_id = job_runner.enqueue(db.session, 'test_steps').id
+        self.assertTrue(started.wait(10))
+        # Stop while the second chunk runs: it is committed, then the job goes back to the queue.
+        stopping = threading.Thread(target=job_runner.stop)
+        stopping.start()
+        while not job_runner._stopping:
+            time.sleep(0.001)
+        proceed.set()
+        stopping.join(10)
+        db.session.expire_all()
+        job = db.session.get(Job, job_id)
+        self.assertEqual((job.status, job.owner, job.state, job.done), ('queued', None, {'step': 2}, 2))
+        self.assertEqual(job_runner.get_stats()['released'], 1)
+
+        job_runner.start()
+        job = self.wait_for(job_id)
+        self.assertEqual((job['status'], job['done'], job['result']), ('succeeded', 3, {'steps': 3}))
+        self.assertEqual(seen, [0, 1, 2])
+        del job_runner.tasks['test_steps']
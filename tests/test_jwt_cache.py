@@ -0,0 +1,55 @@
+import os
+import time
+from datetime import timedelta
+from unittest import mock
+
+from flask import current_app
+from flask_jwt_extended import create_access_token, decode_token
+from flask_jwt_extended.tokens import _decode_jwt
+from flask_testing import TestCase
+
+from api import init_app
+from models import db
+
+
+class TestJWTCache(TestCase):
+    def create_app(self):
+        os.environ['FLASK_ENV'] = 'test'
+        app = init_app()
+        return app
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_token_verified_once(self):
+        jwt = current_app.extensions['flask-jwt-extended']
+        token = create_access_token(identity='user1')
+        headers = {'Authorization': f'Bearer {token}'}
+
+        self.assertEqual(self.client.get('api/authors', headers=headers).status_code, 200)
+        self.assertEqual(len(jwt.token_cache), 1)
+        self.assertEqual(self.client.get('api/authors', headers=headers).status_code, 200)
+        self.assertEqual(len(jwt.token_cache), 1)
+
+        jwt.revoke(jti=decode_token(token)['jti'])
+        self.assertEqual(len(jwt.token_cache), 0)
+
+        response = self.client.get('api/authors', headers={'Authorization': f'Bearer {token}x'})
+        self.assertNotEqual(response.status_code, 200)
+        self.assertEqual(len(jwt.token_cache), 0)
+
+    def test_expired_token_not_served_from_cache(self):
+        token = create_access_token(identity='user1', expires_delta=timedelta(seconds=1))
+        headers = {'Authorization': f'Bearer {token}'}
+        self.assertEqual(self.client.get('api/authors', headers=headers).status_code, 200)
+        time.sleep(1.1)
+        self.assertNotEqual(self.client.get('api/authors', headers=headers).status_code, 200)
+
+    def test_cached_token_skips_signature_verification(self):
+        headers = {'Authorization': 'Bearer {}'.format(create_access_token(identity='user1'))}
+        with mock.patch('flask_jwt_extended.jwt_manager._decode_jwt', wraps=_decode_jwt) as decode:
+            self.assertEqual(self.client.get('api/authors', headers=headers).status_code, 200)
+            self.assertEqual(decode.call_count, 1)
+            self.assertEqual(self.client.get('api/authors', headers=headers).status_code, 200)
+            self.assertEqual(decode.call_count, 1)
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+from sqlalchemy import create_engine, inspect, text
+
+from migrations import HEAD, get_version, upgrade
+from tests.query_counter import QueryCounter
+
+BASELINE_SCHEMA = [
+    "CREATE TABLE author (id INTEGER PRIMARY KEY, first_name VARCHAR(50) NOT NULL, "
+    "last_name VARCHAR(50) NOT NULL, birth_date DATE, biography TEXT)",
+    "CREATE TABLE books (id INTEGER PRIMARY KEY, title VARCHAR(255) NOT NULL, isbn VARCHAR(20) NOT NULL, "
+    "publication_date DATE, author_id INTEGER REFERENCES author (id))",
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, "
+    "password VARCHAR(120) NOT NULL)",
+    "INSERT INTO author (id, first_name, last_name) VALUES (1, 'Author1', 'Surname1')",
+    "INSERT INTO books (id, title, isbn, author_id) VALUES (1, 'Book 1', 'a1a1a1a1a1a', 1)",
+]
+
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        self.engine = create_engine('sqlite:///{}'.format(self.path))
+
+    def tearDown(self):
+        self.engine.dispose()
+        os.remove(self.path)
+
+    def test_upgrade_existing_database(self):
+        with self.engine.begin() as connection:
+            for statement in BASELINE_SCHEMA:
+                connection.execute(text(statement))
+
+        self.assertEqual(upgrade(self.engine), list(range(1, HEAD + 1)))
+        with QueryCounter(self.engine) as counter:
+            self.assertEqual(upgrade(self.engine), [])
+        self.assertEqual(counter.count, 1)
+
+        with self.engine.connect() as connection:
+            self.assertEqual(get_version(connection), HEAD)
+            indexes = {index['name'] for index in inspect(connection).get_indexes('books')}
+            self.assertTrue({'ix_books_author_id', 'ix_books_isbn'} <= indexes)
+            matches = connection.execute(text("SELECT rowid FROM books_fts WHERE books_fts MATCH 'book'")).all()
+            self.assertEqual(matches, [(1,)])
+            counts = dict(connection.execute(text("SELECT name, value FROM counters")).all())
+            self.assertEqual(counts, {'books': 1, 'authors': 1})
+            indexes = {index['name'] for index in inspect(connection).get_indexes('author')}
+            self.assertTrue({'ix_author_created_at', 'ix_author_updated_at'} <= indexes)
+            timestamps = connection.execute(text("SELECT created_at, updated_at FROM books")).one()
+            self.assertEqual(timestamps[0], timestamps[1])
+            self.assertTrue(inspect(connection).has_table('tombstones'))
+            aggregates = connection.execute(text("SELECT book_count, first_publication_date FROM author")).one()
+            self.assertEqual(tuple(aggregates), (1, None))
+            self.assertEqual(connection.scalar(text("SELECT version FROM books")), 1)
+
+    def test_create_fresh_database(self):
+        self.assertEqual(upgrade(self.engine), [])
+        with self.engine.connect() as connection:
+            self.assertEqual(get_version(connection), HEAD)
+            self.assertTrue(inspect(connection).has_table('books_fts'))
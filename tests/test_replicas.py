@@ -0,0 +1,93 @@
+import datetime
+import os
+import time
+
+from flask_jwt_extended import create_access_token
+from flask_testing import TestCase
+from sqlalchemy import create_engine
+
+from api import init_app
+from helpers.replica_helper import replica_router
+from models import Author, db
+
+
+class TestReplicaRouting(TestCase):
+    def create_app(self):
+        os.environ['FLASK_ENV'] = 'test'
+        os.environ['REPLICA_DATABASE_URIS'] = 'sqlite:///database_test_replica.db'
+        try:
+            app = init_app()
+        finally:
+            del os.environ['REPLICA_DATABASE_URIS']
+        return app
+
+    def setUp(self):
+        db.session.add(Author(first_name='Author1', last_name='Surname1', birth_date=datetime.date(1960, 1, 1)))
+        db.session.commit()
+        db.session.close()
+        self.replicate()
+        self.writer = {'Authorization': 'Bearer {}'.format(create_access_token(identity='writer'))}
+        self.reader = {'Authorization': 'Bearer {}'.format(create_access_token(identity='reader'))}
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        for replica in replica_router.replicas:
+            replica.engine.dispose()
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(replica.engine.url.database + suffix):
+                    os.remove(replica.engine.url.database + suffix)
+
+    def replicate(self):
+        result = self.app.test_cli_runner().invoke(args=['replicate'])
+        self.assertEqual(result.exit_code, 0, result.output)
+
+    def last_names(self, headers):
+        return [author['last_name'] for author in self.client.get('api/authors', headers=headers).json]
+
+    def test_reads_from_replica_and_sticks_to_primary_after_write(self):
+        response = self.client.post('api/authors', headers=self.writer,
+                                    json={'first_name': 'New', 'last_name': 'Author'})
+        self.assertEqual(response.status_code, 201)
+        new_id = response.json['id']
+
+        self.assertEqual(self.last_names(self.writer), ['Surname1', 'Author'])
+        self.assertEqual(self.last_names(self.reader), ['Surname1'])
+        # Statements run on the replica are timed like those on the primary.
+        self.assertIn('sql;', self.client.get('api/authors', headers=self.reader).headers['Server-Timing'])
+
+        replica_router.writers.clear()
+        self.assertEqual(self.last_names(self.writer), ['Surname1'])
+        # Cache fills read the primary, also once no client sticks to it, so the replica's lag is not cached.
+        self.assertEqual(self.client.get('api/authors/{}'.format(new_id), headers=self.reader).status_code, 200)
+
+        self.replicate()
+        self.assertEqual(self.last_names(self.reader), ['Surname1', 'Author'])
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        db.session.add(Author(first_name='New', last_name='Author'))
+        db.session.commit()
+        self.assertEqual(self.last_names(self.reader), ['Surname1'])
+
+        replica = replica_router.replicas[0]
+        engine, replica.engine = replica.engine, create_engine('sqlite:////nonexistent/replica.db')
+        replica.checked_at = float('-inf')
+        try:
+            self.assertEqual(self.last_names(self.reader), ['Surname1', 'Author'])
+            self.assertGreater(replica.down_until, 0)
+        finally:
+            replica.engine = engine
+
+    def test_failed_replica_query_retries_on_primary(self):
+        db.session.add(Author(first_name='New', last_name='Author'))
+        db.session.commit()
+
+        # The replica passed its last health check, but fails once the request queries it.
+        replica = replica_router.replicas[0]
+        engine, replica.engine = replica.engine, create_engine('sqlite:////nonexistent/replica.db')
+        replica.checked_at = time.monotonic()
+        try:
+            self.assertEqual(self.last_names(self.reader), ['Surname1', 'Author'])
+            self.assertGreater(replica.down_until, time.monotonic())
+        finally:
+            replica.engine = engine
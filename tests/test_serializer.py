@@ -0,0 +1,50 @@
+import datetime
+import os
+
+from flask_testing import TestCase
+from marshmallow import fields
+
+from api import init_app
+from helpers.serializer_helper import get_row_serializer
+from models import Author, Book, db
+from schemas.author import authors_schema
+from schemas.base import BaseSchema
+from schemas.book import book_list_schema, books_schema
+
+
+class TestRowSerializer(TestCase):
+    def create_app(self):
+        os.environ['FLASK_ENV'] = 'test'
+        app = init_app()
+        return app
+
+    def setUp(self):
+        author = Author(first_name='Author1', last_name='Surname1', birth_date=datetime.date(1960, 1, 1))
+        db.session.add(author)
+        db.session.commit()
+        db.session.add_all([
+            Book(title='Book 1', isbn='a1a1a1a1a1a', publication_date=datetime.date(2020, 3, 3), author_id=author.id),
+            Book(title='Book 2', isbn='a1a1a1a1a1b', publication_date=None, author_id=None),
+        ])
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_matches_schema_dump(self):
+        for model, schema in ((Book, books_schema), (Book, book_list_schema), (Author, authors_schema)):
+            serializer = get_row_serializer(model, schema)
+            self.assertIsNotNone(serializer)
+            rows = serializer.select(model.query).order_by(model.id).all()
+            self.assertEqual(serializer.dump(rows), schema.dump(model.query.order_by(model.id).all()))
+
+    def test_unsupported_schema(self):
+        class TitleSchema(BaseSchema):
+            id = fields.Int()
+            shout = fields.Method('get_shout')
+
+            def get_shout(self, book):
+                return book.title.upper()
+
+        self.assertIsNone(get_row_serializer(Book, TitleSchema(many=True)))
@@ -0,0 +1,94 @@
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import unittest
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENV = dict(os.environ, FLASK_ENV='test', DATABASE_URI='sqlite:///database_test_server.db', SERVER_WORKERS='2',
+           SHARED_CACHE_PATH='shared_cache_test_server.db', PASSWORD_HASH_WORKERS='0')
+
+
+class TestPreforkServer(unittest.TestCase):
+    def setUp(self):
+        self.process = None
+
+    def start(self, **env):
+        self.process = subprocess.Popen([sys.executable, 'server.py', '--port', '0'], cwd=ROOT, env=dict(ENV, **env),
+                                        stderr=subprocess.PIPE, text=True, start_new_session=True)
+        line = self.process.stderr.readline()
+        match = re.search(r'http://[\d.]+:\d+', line)
+        self.assertIsNotNone(match, line)
+        self.url = match.group(0)
+
+    def tearDown(self):
+        if self.process is not None:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            self.process.wait()
+            self.process.stderr.close()
+        for name in ('database_test_server.db', 'shared_cache_test_server.db'):
+            for suffix in ('', '-wal', '-shm'):
+                path = os.path.join(ROOT, 'instance', name + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = 'Bearer {}'.format(token)
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, headers=headers, method=method)
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read() or 'null')
+
+    def test_workers_restart_and_stop_gracefully(self):
+        self.start(SERVER_MAX_REQUESTS='3', SERVER_MAX_REQUESTS_JITTER='0')
+        # Twice as many requests as both workers may serve before they are replaced. Metrics add up every
+        # worker, replaced ones included; only the other live worker and one on its way out may not have
+        # flushed their counts yet.
+        counts = []
+        for served in range(12):
+            with urllib.request.urlopen(self.url + '/metrics', timeout=10) as response:
+                self.assertEqual(response.status, 200)
+                match = re.search(r'http_request_duration_seconds_count\{endpoint="metrics",method="GET"\} (\d+)',
+                                  response.read().decode())
+            counts.append(int(match.group(1)) if match else 0)
+            self.assertLessEqual(counts[-1], served)
+            self.assertGreaterEqual(counts[-1], served - 5)
+        self.assertEqual(counts, sorted(counts))
+
+        self.process.send_signal(signal.SIGTERM)
+        self.assertEqual(self.process.wait(timeout=10), 0)
+
+    def test_writes_invalidate_the_cache_of_every_worker(self):
+        self.start(SERVER_WORKERS='4', SERVER_MAX_REQUESTS='0')
+        credentials = {'username': 'user1', 'password': 'passwordpassword'}
+        self.assertEqual(self.request('POST', '/api/signup', credentials)[0], 201)
+        token = self.request('POST', '/api/login', credentials)[1]['access_token']
+        status, author = self.request('POST', '/api/authors', {'first_name': 'Old', 'last_name': 'Name'}, token)
+        self.assertEqual(status, 201)
+        path = '/api/authors/{}'.format(author['id'])
+        for _ in range(20):
+            self.request('GET', path, token=token)
+
+        self.request('PUT', path, {'first_name': 'New', 'last_name': 'Name'}, token)
+        names = [self.request('GET', path, token=token)[1]['first_name'] for _ in range(40)]
+        self.assertEqual(set(names), {'New'})
+
+    def test_refuses_several_workers_with_process_local_caches(self):
+        result = subprocess.run([sys.executable, 'server.py', '--port', '0'], cwd=ROOT,
+                                env=dict(ENV, SHARED_CACHE_PATH=''), capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 1)
+        self.assertIn('SHARED_CACHE_PATH', result.stderr)
+        result = subprocess.run([sys.executable, 'server.py', '--port', '0'], cwd=ROOT,
+                                env=dict(ENV, SHARED_CACHE_PATH='', RESPONSE_CACHE_ENABLED='false',
+                                         JWT_VERIFIED_TOKEN_CACHE_SIZE='0'),
+                                capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 1)
+        self.assertIn('request metrics', result.stderr)